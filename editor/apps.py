@@ -1,6 +1,27 @@
+import os
+import sys
+
 from django.apps import AppConfig
 
+# Management commands that serve requests and want the toolchains probed up front
+SERVER_COMMANDS = {'runserver', 'runner'}
+
+
+def is_management_command():
+    """True when running a management command other than the SERVER_COMMANDS."""
+    program = os.path.basename(sys.argv[0]) if sys.argv else ""
+    if program not in ('manage.py', 'django-admin', '__main__.py'):
+        return False  # A WSGI/ASGI server
+    return len(sys.argv) < 2 or sys.argv[1] not in SERVER_COMMANDS
+
 
 class EditorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'editor'
+
+    def ready(self):
+        if is_management_command():
+            return  # Probed on first use, if the command needs it at all
+        # Resolve compilers and record their versions in the background
+        from . import toolchains
+        toolchains.start_probe()
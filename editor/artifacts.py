@@ -0,0 +1,210 @@
+"""
+Short-lived store for the files a program creates.
+
+Rather than inlining every created file into the run response, finish_run
+moves them out of the work directory into ARTIFACT_ROOT/<run id>/ and the
+response only carries a manifest: name, size, sha256, whether the file looks
+binary, and the URL it can be downloaded from (/files/<run id>/<name>, which
+honours Range requests). ARTIFACT_LIMITS caps how many files are kept per run,
+how much of each one and how much in total; what doesn't fit is left out and
+counted in `files_omitted`. Stored runs expire after ARTIFACT_TTL seconds.
+
+ARTIFACT_ROOT defaults to a directory next to the work directories (see
+sandbox.py), so files are usually moved with a rename instead of copied.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.urls import reverse
+
+from .sandbox import get_root as get_sandbox_root
+
+DEFAULT_LIMITS = {
+    'max_files': 20,                    # Files kept per run
+    'max_file_bytes': 1024 * 1024,      # Bytes kept per file, the rest is cut off
+    'max_total_bytes': 4 * 1024 * 1024, # Bytes kept per run
+}
+DEFAULT_TTL = 300  # Seconds
+
+MANIFEST_NAME = 'manifest.json'
+FILES_DIR = 'files'
+
+# Bytes looked at to tell binary files from text
+SNIFF_BYTES = 8192
+
+# Expired runs are swept at most this often
+PRUNE_INTERVAL = 60  # Seconds
+
+CHUNK_SIZE = 65536
+
+RUN_ID = re.compile(r'[0-9a-f]{32}')
+
+
+def get_limits():
+    return {**DEFAULT_LIMITS, **getattr(settings, 'ARTIFACT_LIMITS', {})}
+
+
+def get_root():
+    return getattr(settings, 'ARTIFACT_ROOT', None) or os.path.join(get_sandbox_root(), 'webide-files')
+
+
+def looks_binary(data):
+    """Whether a file starting with `data` should be treated as binary rather than UTF-8 text."""
+    if b"\0" in data:
+        return True
+    try:
+        data.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off by the sample is still text
+        return e.start < len(data) - 3
+    return False
+
+
+def _store_file(src, dst, size, max_bytes):
+    """
+    Moves src to dst (copying only what fits when it's over max_bytes, or when
+    they're on different filesystems). Returns (sha256, stored bytes, first bytes).
+    """
+    if size <= max_bytes:
+        try:
+            os.rename(src, dst)
+            src = dst
+        except OSError:
+            pass
+    digest = hashlib.sha256()
+    stored = 0
+    head = b""
+    out = open(dst, 'wb') if src != dst else None
+    try:
+        with open(src, 'rb') as f:
+            while stored < max_bytes:
+                chunk = f.read(min(CHUNK_SIZE, max_bytes - stored))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                if len(head) < SNIFF_BYTES:
+                    head += chunk[:SNIFF_BYTES - len(head)]
+                if out is not None:
+                    out.write(chunk)
+                stored += len(chunk)
+    finally:
+        if out is not None:
+            out.close()
+    return digest.hexdigest(), stored, head
+
+
+class ArtifactStore:
+    def __init__(self, root=None):
+        self._root = root
+        self._last_prune = 0
+        self._lock = threading.Lock()
+
+    @property
+    def root(self):
+        return self._root or get_root()
+
+    def collect(self, work_dir, exclude):
+        """
+        Moves the files created in work_dir (top level, not in `exclude`) into
+        the store. Returns (manifest list, number of files left out).
+        """
+        self._maybe_prune()
+        limits = get_limits()
+        candidates = []
+        try:
+            with os.scandir(work_dir) as entries:
+                for entry in entries:
+                    if entry.name in exclude or not entry.is_file(follow_symlinks=False):
+                        continue  # Source, build artifacts, directories and links
+                    candidates.append((entry.name, entry.stat(follow_symlinks=False).st_size))
+        except OSError:
+            return [], 0
+        if not candidates:
+            return [], 0
+
+        candidates.sort()
+        run_id = uuid.uuid4().hex
+        files_dir = os.path.join(self.root, run_id, FILES_DIR)
+        os.makedirs(files_dir)
+        manifest = []
+        total = 0
+        for name, size in candidates:
+            room = limits['max_total_bytes'] - total
+            if len(manifest) >= limits['max_files'] or room <= 0:
+                break
+            try:
+                sha256, stored, head = _store_file(
+                    os.path.join(work_dir, name), os.path.join(files_dir, name),
+                    size, min(limits['max_file_bytes'], room)
+                )
+            except OSError:
+                continue  # Unreadable, skip it
+            total += stored
+            manifest.append({
+                'name': name,
+                'size': size,
+                'stored': stored,
+                'truncated': stored < size,
+                'binary': looks_binary(head),
+                'sha256': sha256,
+                'url': reverse('download_file', args=[run_id, name]),
+            })
+        with open(os.path.join(self.root, run_id, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        return manifest, len(candidates) - len(manifest)
+
+    def open(self, run_id, name):
+        """Returns (open binary file, manifest entry) for a stored file, or None if it's gone."""
+        if not RUN_ID.fullmatch(run_id):
+            return None
+        run_dir = os.path.join(self.root, run_id)
+        try:
+            if time.time() - os.path.getmtime(run_dir) > self._ttl():
+                return None
+            with open(os.path.join(run_dir, MANIFEST_NAME), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Only names from the manifest, never a path the client made up
+        entry = next((item for item in manifest if item['name'] == name), None)
+        if entry is None:
+            return None
+        try:
+            return open(os.path.join(run_dir, FILES_DIR, entry['name']), 'rb'), entry
+        except OSError:
+            return None
+
+    def prune(self):
+        """Deletes expired runs. Returns how many were removed."""
+        removed = 0
+        cutoff = time.time() - self._ttl()
+        try:
+            with os.scandir(self.root) as entries:
+                expired = [entry.path for entry in entries if entry.stat().st_mtime < cutoff]
+        except FileNotFoundError:
+            return 0
+        for path in expired:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+        return removed
+
+    def _maybe_prune(self):
+        with self._lock:
+            now = time.time()
+            if now - self._last_prune < PRUNE_INTERVAL:
+                return
+            self._last_prune = now
+        self.prune()
+
+    def _ttl(self):
+        return getattr(settings, 'ARTIFACT_TTL', DEFAULT_TTL)
+
+
+artifact_store = ArtifactStore()
@@ -0,0 +1,254 @@
+"""
+asyncio flavour of execute_code, used by the ASGI endpoint /run/async/.
+
+Waiting on the program is the long part of a run, so it happens on the event
+loop: the child's pipes are read without blocking into the same capped
+captures as execute_code (see output.py), its exit is awaited through a pidfd
+and the timeout is an asyncio one. One server process can therefore keep
+hundreds of runs in flight instead of one per worker thread.
+Writing the source and compiling (which waits on the compile-cache locks) stay
+synchronous and run in a worker thread via asyncio.to_thread.
+"""
+import asyncio
+import os
+import subprocess
+import time
+
+import psutil
+from django.conf import settings
+
+from . import limits, metrics
+from .inputs import StoredInput
+from .jvm_worker import JVM_LANGUAGES, jvm_pool
+from .output import CHUNK_SIZE, stderr_capture, stdout_capture
+from .sandbox import sandbox_pool
+from .utils import (
+    cached_result, collect_run, failed_run, finish_check, prepare_execution, result_cache_key, store_result
+)
+
+HAS_PIDFD = limits.HAS_RLIMITS and hasattr(os, 'pidfd_open')
+
+
+async def _sample_memory(pid, usage):
+    """Like utils.monitor_memory, but as a task on the event loop instead of a thread."""
+    try:
+        p = psutil.Process(pid)
+        while True:
+            mem = p.memory_info().rss / 1024  # KB
+            if mem > usage['peak']:
+                usage['peak'] = mem
+            await asyncio.sleep(0.1)
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        pass
+
+
+async def _pump(reader, capture):
+    """Async counterpart of output.pump."""
+    while True:
+        data = await reader.read(CHUNK_SIZE)
+        if not data:
+            break
+        capture.feed(data)
+
+
+async def _feed_stdin(writer, data):
+    try:
+        writer.write(data)
+        await writer.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        pass  # The program exited without reading all of its input
+    finally:
+        writer.close()
+
+
+async def _connect_pipes(process):
+    """Wraps a Popen's binary pipes in asyncio streams."""
+    loop = asyncio.get_running_loop()
+    stdout = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(stdout), process.stdout)
+    stderr = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(stderr), process.stderr)
+    stdin = None
+    if process.stdin is not None:
+        transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, process.stdin)
+        stdin = asyncio.StreamWriter(transport, protocol, None, loop)
+    return stdin, stdout, stderr
+
+
+async def _wait(process, usage, extra):
+    """
+    Waits for the process to exit. With pidfds (Linux) the event loop is told
+    when that happens and the child is reaped with wait4 for its rusage;
+    elsewhere this polls and psutil samples the memory.
+    """
+    if HAS_PIDFD:
+        loop = asyncio.get_running_loop()
+        pidfd = os.pidfd_open(process.pid)
+        exited = loop.create_future()
+        loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+        try:
+            await exited
+        finally:
+            loop.remove_reader(pidfd)
+            os.close(pidfd)
+        usage['peak'], cpu_time = process.reap()  # Exited, doesn't block
+        extra['cpu_time'] = round(cpu_time, 3)
+        return
+    sampler = asyncio.create_task(_sample_memory(process.pid, usage))
+    try:
+        while process.poll() is None:
+            await asyncio.sleep(0.01)
+    finally:
+        sampler.cancel()
+
+
+async def _settle(future):
+    """
+    Waits for `future` to finish even if the current task is cancelled
+    meanwhile. Returns whether it was, so the caller can re-raise once done.
+    """
+    cancelled = False
+    while not future.done():
+        try:
+            await asyncio.wait([future])
+        except asyncio.CancelledError:
+            cancelled = True
+    if not future.cancelled():
+        future.exception()  # Retrieved, so asyncio doesn't log it as lost
+    return cancelled
+
+
+async def _in_thread(func, *args):
+    """
+    asyncio.to_thread for steps that work in the sandbox: if the run is
+    cancelled, the step still finishes before the cancellation goes on, so the
+    work directory is never released while a thread is writing into it.
+    """
+    task = asyncio.ensure_future(asyncio.to_thread(func, *args))
+    if await _settle(task):
+        raise asyncio.CancelledError()
+    return task.result()
+
+
+async def run_process_async(cmd, temp_dir, language, input_data, timeout, extra, checker=None):
+    """
+    Runs the program without blocking the event loop.
+    Returns (stdout, stderr, returncode, duration, peak_memory_kb); returncode is None on timeout.
+    """
+    start_time = time.perf_counter()
+    usage = {'peak': 0}
+    # A stored input is the program's stdin itself (see inputs.py)
+    stdin_file = input_data.open() if isinstance(input_data, StoredInput) else None
+    # Spawned with Popen rather than create_subprocess_exec so the child isn't
+    # reaped behind our back and wait4 can report its resource usage
+    try:
+        process = limits.LimitedPopen(
+            cmd,
+            language,
+            timeout,
+            cwd=temp_dir,
+            stdin=stdin_file or subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+    finally:
+        if stdin_file is not None:
+            stdin_file.close()
+    stdin_writer, stdout_reader, stderr_reader = await _connect_pipes(process)
+
+    stdout = stdout_capture(on_limit=process.kill, checker=checker)
+    stderr = stderr_capture(on_limit=process.kill)
+    io = [_pump(stdout_reader, stdout), _pump(stderr_reader, stderr)]
+    if stdin_writer is not None:
+        io.append(_feed_stdin(stdin_writer, input_data.encode('utf-8')))
+    io_tasks = asyncio.gather(*io)
+    timed_out = False
+    exit_task = asyncio.ensure_future(_wait(process, usage, extra))
+    try:
+        try:
+            # shield: on timeout the wait goes on and reaps the killed child
+            await asyncio.wait_for(asyncio.shield(exit_task), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await exit_task
+            timed_out = True
+        try:
+            # Pipes stay open only if the program left children behind, don't wait for those
+            await asyncio.wait_for(io_tasks, 1)
+        except (asyncio.TimeoutError, OSError):
+            pass
+    except BaseException:
+        # Cancelled (e.g. the client went away): the program must be gone and
+        # reaped before the caller hands its work directory to another run
+        process.kill()
+        await _settle(exit_task)
+        io_tasks.cancel()
+        await _settle(io_tasks)
+        stdout.close()
+        raise
+
+    duration = time.perf_counter() - start_time
+    # Checking may still be catching up, not counted in the duration
+    await asyncio.to_thread(stdout.close)
+    metrics.OUTPUT_BYTES.inc(stdout.total, language=language, stream='stdout')
+    metrics.OUTPUT_BYTES.inc(stderr.total, language=language, stream='stderr')
+    if timed_out:
+        return "", "", None, timeout, usage['peak']
+    if stdout.limit_exceeded or stderr.limit_exceeded:
+        extra['output_limit_exceeded'] = True
+    return stdout.text(), stderr.text(), process.returncode, duration, usage['peak']
+
+
+async def execute_code_async(code, language, input_data="", checker=None, use_cache=True, timings=False,
+                             profile=False):
+    """
+    Async equivalent of utils.execute_code, with the same return value. The
+    steps before and after the program runs are execute_code's, in a thread.
+    """
+    timer = metrics.RunTimer(language)
+    cache_key = result_cache_key(code, language, input_data, checker, use_cache, profile)
+    if cache_key is not None:
+        cached = await asyncio.to_thread(cached_result, cache_key, language, timer, timings)
+        if cached is not None:
+            return cached
+
+    timeout = getattr(settings, 'EXECUTION_TIMEOUT', 5)
+    extra = {}
+    result = None
+
+    with timer.phase('sandbox'):
+        # Not in a thread: a cancellation there could lose the directory, and
+        # acquiring only pops the pool or makes one directory
+        temp_dir = sandbox_pool.acquire()
+    try:
+        filename, cmd, artifacts, error = await _in_thread(
+            prepare_execution, code, language, temp_dir, extra, timeout, timer, profile
+        )
+        if error:
+            final, outcome = failed_run(error, extra), 'compile_error'
+        else:
+            try:
+                with timer.phase('execute'):
+                    if language in JVM_LANGUAGES and not profile:
+                        # The JVM workers are synchronous, keep them off the event loop
+                        result = await _in_thread(jvm_pool.run, language, temp_dir, input_data, timeout, extra, checker)
+                        if result is not None:
+                            extra['pooled'] = True
+                    if result is None:
+                        result = await run_process_async(cmd, temp_dir, language, input_data, timeout, extra, checker)
+            except Exception as e:
+                final, outcome = failed_run(f"Execution Error: {str(e)}", extra), 'internal_error'
+            else:
+                finish_check(checker, result, extra)
+                final, outcome = await _in_thread(
+                    collect_run, result, language, temp_dir, filename, cmd, artifacts, timeout, extra, timer, profile
+                )
+    finally:
+        with timer.phase('cleanup'):
+            await asyncio.to_thread(sandbox_pool.release, temp_dir)
+    metrics.record_run(language, outcome, extra)
+
+    await asyncio.to_thread(store_result, cache_key, result, final)
+    if timings:
+        extra['timings'] = timer.timings
+    return final
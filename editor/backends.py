@@ -0,0 +1,288 @@
+"""
+Where runs are executed, chosen by EXECUTION_BACKEND.
+
+"local" (the default) runs them in this process with execute_code. "remote"
+sends them to the runner daemons listed in RUNNER_NODES (see runner.py). A
+dotted path to a class with the same methods as LocalBackend plugs in
+another backend.
+
+The remote backend sends each run to the healthy runner with the least load
+per worker: the runs this process has in flight there, plus the ones other
+web processes had there at its last health check. Runners are checked every
+RUNNER_HEALTH_INTERVAL seconds in the background. A runner that can't be
+reached is skipped until a check finds it answering again, and a run that
+couldn't be handed to a runner is handed to the next one. A run that a runner
+accepted but never answered fails instead of being retried, so a program is
+never run twice.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from . import toolchains
+from .async_executor import execute_code_async
+from .batch import run_batch
+from .inputs import StoredInput
+from .runner import ProtocolError, checker_to_dict, connect, recv_message, send_message
+from .utils import execute_code
+
+DEFAULT_HEALTH_INTERVAL = 5  # Seconds
+DEFAULT_RUNNER_TIMEOUT = 120  # Seconds a runner may take to answer a run
+CONNECT_TIMEOUT = 2  # Seconds, also the timeout of health checks
+
+
+class RunnerUnavailable(Exception):
+    pass
+
+
+def toolchain_health():
+    """Health of this process's toolchains (see toolchains.py), None while they're probed."""
+    probes = toolchains.get_toolchains(timeout=0)
+    if probes is None:
+        return None
+    available = [probe['available'] for probe in probes.values()]
+    if all(available):
+        status = 'ok'
+    elif any(available):
+        status = 'degraded'
+    else:
+        status = 'down'
+    return {'status': status, 'languages': probes}
+
+
+class LocalBackend:
+    def execute(self, code, language, input_data="", on_output=None, **options):
+        return execute_code(code, language, input_data, on_output, **options)
+
+    async def execute_async(self, code, language, input_data="", **options):
+        return await execute_code_async(code, language, input_data, **options)
+
+    def run_batch(self, code, language, cases, checker_options=None, workers=None):
+        return run_batch(code, language, cases, checker_options, workers)
+
+    def capacity(self):
+        """Runs worth executing at once."""
+        return os.cpu_count() or 1
+
+    def available_languages(self):
+        return toolchains.available_languages()
+
+    def health(self):
+        """{"status": "ok" / "degraded" / "down", ...}, None while starting up."""
+        return toolchain_health()
+
+
+class RunnerNode:
+    def __init__(self, address):
+        self.address = address
+        self.healthy = True  # Until a check or a run finds otherwise
+        self.workers = 1
+        self.load = 0  # Requests from other processes at the last check
+        self.inflight = 0  # Requests from this process
+        self.languages = []
+        self.error = None
+        self.checked = None
+
+    def score(self):
+        return (self.load + self.inflight) / max(self.workers, 1)
+
+    def status(self):
+        return {
+            'address': self.address,
+            'healthy': self.healthy,
+            'workers': self.workers,
+            'load': self.load + self.inflight,
+            'languages': self.languages,
+            'error': self.error,
+            'checked': self.checked,
+        }
+
+
+class RemoteBackend:
+    def __init__(self, addresses=None):
+        addresses = addresses if addresses is not None else getattr(settings, 'RUNNER_NODES', [])
+        self.nodes = [RunnerNode(address) for address in addresses]
+        self._lock = threading.Lock()
+        self._started = False
+
+    def _start(self):
+        """Checks every runner once, then keeps checking them in the background."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.check_all()
+        threading.Thread(target=self._check_forever, daemon=True).start()
+
+    def _check_forever(self):
+        interval = getattr(settings, 'RUNNER_HEALTH_INTERVAL', DEFAULT_HEALTH_INTERVAL)
+        while True:
+            time.sleep(interval)
+            self.check_all()
+
+    def check_all(self):
+        if self.nodes:
+            with ThreadPoolExecutor(max_workers=len(self.nodes)) as pool:
+                list(pool.map(self.check, self.nodes))
+
+    def check(self, node):
+        try:
+            with connect(node.address, CONNECT_TIMEOUT) as sock:
+                send_message(sock, {'op': 'health'})
+                reply = recv_message(sock)
+        except (OSError, ValueError, ProtocolError) as e:
+            with self._lock:
+                node.healthy = False
+                node.error = str(e) or type(e).__name__
+                node.checked = time.time()
+            return
+        with self._lock:
+            node.healthy = True
+            node.error = None
+            node.checked = time.time()
+            node.workers = reply.get('workers', 1)
+            # The runner's load includes our own requests, which we count live
+            node.load = max(0, reply.get('load', 0) - node.inflight)
+            node.languages = reply.get('languages', [])
+
+    def _pick(self, tried):
+        """The least loaded runner not in `tried`, healthy ones first, counted as in flight."""
+        with self._lock:
+            candidates = [node for node in self.nodes if node not in tried]
+            healthy = [node for node in candidates if node.healthy]
+            # With every runner down, try them anyway: one may be back already
+            candidates = healthy or candidates
+            if not candidates:
+                return None
+            node = min(candidates, key=RunnerNode.score)
+            node.inflight += 1
+            return node
+
+    def _mark_down(self, node, error):
+        with self._lock:
+            node.healthy = False
+            node.error = str(error) or type(error).__name__
+
+    def _request(self, message, on_output=None):
+        """Sends `message` to a runner and returns the "result" of its answer."""
+        self._start()
+        timeout = getattr(settings, 'RUNNER_TIMEOUT', DEFAULT_RUNNER_TIMEOUT)
+        tried = []
+        while True:
+            node = self._pick(tried)
+            if node is None:
+                raise RunnerUnavailable("No runner is available, please try again shortly.")
+            tried.append(node)
+            try:
+                sock = None
+                try:
+                    sock = connect(node.address, CONNECT_TIMEOUT)
+                    send_message(sock, message)
+                except (OSError, ValueError) as e:
+                    if sock is not None:
+                        sock.close()
+                    self._mark_down(node, e)
+                    continue  # Never got the request: next runner
+                with sock:
+                    sock.settimeout(timeout)
+                    try:
+                        while True:
+                            reply = recv_message(sock)
+                            if reply.get('event') == 'output':
+                                if on_output is not None:
+                                    on_output(reply['stream'], reply['text'])
+                                continue
+                            break
+                    except (OSError, ProtocolError) as e:
+                        self._mark_down(node, e)
+                        raise RunnerUnavailable(f"Runner {node.address} failed: {e}")
+            finally:
+                with self._lock:
+                    node.inflight -= 1
+            if reply.get('event') == 'error':
+                raise RuntimeError(reply.get('error', "Runner error"))
+            return reply['result']
+
+    def execute(self, code, language, input_data="", on_output=None, checker=None, use_cache=True, timings=False,
+                profile=False):
+        stored = isinstance(input_data, StoredInput)
+        result = self._request({
+            'op': 'run',
+            'code': code,
+            'language': language,
+            'input': "" if stored else input_data,
+            'input_hash': input_data.digest if stored else None,
+            'checker': checker_to_dict(checker),
+            'use_cache': use_cache,
+            'timings': timings,
+            'profile': profile,
+            'stream': on_output is not None,
+        }, on_output)
+        return tuple(result)
+
+    async def execute_async(self, code, language, input_data="", **options):
+        # Waiting on the socket holds a thread, like the local backend's compile step
+        return await asyncio.to_thread(self.execute, code, language, input_data, **options)
+
+    def run_batch(self, code, language, cases, checker_options=None, workers=None):
+        return self._request({
+            'op': 'batch',
+            'code': code,
+            'language': language,
+            'cases': cases,
+            'checker_options': checker_options,
+            'workers': workers,
+        })
+
+    def capacity(self):
+        self._start()
+        with self._lock:
+            return sum(node.workers for node in self.nodes if node.healthy) or len(self.nodes) or 1
+
+    def available_languages(self):
+        """Languages at least one healthy runner can run, in the order the runners list them."""
+        self._start()
+        languages = []
+        with self._lock:
+            for node in self.nodes:
+                if node.healthy:
+                    languages.extend(lang for lang in node.languages if lang not in languages)
+        return languages
+
+    def health(self):
+        self._start()
+        with self._lock:
+            runners = [node.status() for node in self.nodes]
+        healthy = [runner['healthy'] for runner in runners]
+        if healthy and all(healthy):
+            status = 'ok'
+        elif any(healthy):
+            status = 'degraded'
+        else:
+            status = 'down'
+        return {'status': status, 'runners': runners}
+
+
+BACKENDS = {
+    'local': LocalBackend,
+    'remote': RemoteBackend,
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend():
+    """The EXECUTION_BACKEND instance, created on first use."""
+    name = getattr(settings, 'EXECUTION_BACKEND', 'local')
+    with _backends_lock:
+        backend = _backends.get(name)
+        if backend is None:
+            backend_class = BACKENDS[name] if name in BACKENDS else import_string(name)
+            backend = _backends[name] = backend_class()
+        return backend
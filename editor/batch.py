@@ -0,0 +1,164 @@
+"""
+Batch runs: one program against many test inputs.
+
+The source is written and compiled once (through the compile cache as usual),
+then each case gets its own work directory (see sandbox.py) with read-only
+links to the compile cache's build artifacts, or copies of the source for
+interpreted languages, so files one case creates or rewrites can't leak into
+another. Cases run in parallel, BATCH_WORKERS at a time (default: one per CPU
+core), and a queued batch takes that many of the run queue's workers (see
+jobs.py). Every case is its own child process; the pool threads only feed and
+wait on them.
+
+Expected outputs are judged with checker.py as the output streams (mode and
+tolerance from the request's "checker" and "tolerance" fields), and a case
+is stopped at its first wrong token. Each case gets a verdict:
+    AC   output matches the expected output
+    WA   output differs from the expected output
+    OK   ran successfully, no expected output given
+    TLE  killed by the timeout or the CPU time limit
+    RE   non-zero exit status
+    OLE  wrote more than OUTPUT_LIMIT bytes
+
+A case's input is its "input" string, or the stored input named by its
+"input_hash" (see inputs.py), which is how big test data is best passed.
+"""
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from . import checker as checkers
+from . import limits, metrics
+from .compile_cache import copy_artifacts
+from .inputs import input_store
+from .sandbox import sandbox_pool
+from .utils import get_language_config, prepare_run, run_prepared
+
+DEFAULT_MAX_CASES = 100
+
+PASSING_VERDICTS = ("AC", "OK")
+
+
+def max_cases():
+    return getattr(settings, 'BATCH_MAX_CASES', DEFAULT_MAX_CASES)
+
+
+def worker_count():
+    return getattr(settings, 'BATCH_WORKERS', None) or os.cpu_count() or 1
+
+
+def get_verdict(returncode, checker, extra):
+    if checker is not None and checker.stopped_early:
+        return "WA"  # Killed for it, whatever the exit status says
+    if returncode is None or limits.limit_message(returncode) == "CPU Time Limit Exceeded":
+        return "TLE"
+    if extra.get('output_limit_exceeded'):
+        return "OLE"
+    if returncode != 0:
+        return "RE"
+    if checker is None:
+        return "OK"
+    return "AC" if checker.passed else "WA"
+
+
+def _copy_sources(build_dir, case_dir, names):
+    """Copies, not links: a case that rewrites its source mustn't change it for the others."""
+    for name in names:
+        src = os.path.join(build_dir, name)
+        if os.path.isdir(src):
+            shutil.copytree(src, os.path.join(case_dir, name))
+        else:
+            shutil.copy(src, os.path.join(case_dir, name))
+
+
+def _run_case(language, build_dir, filename, artifacts, case, checker_options, timeout):
+    case_dir = sandbox_pool.acquire()
+    extra = {}
+    checker = checkers.from_request(checker_options, case.get('expected'))
+    try:
+        input_data = case.get('input', '')
+        if case.get('input_hash'):
+            input_data = input_store.get(case['input_hash'])
+            if input_data is None:
+                raise ValueError("Input not found (expired?)")
+        # Same command as for the build dir, pointing into this case's dir
+        _, compile_cmd, cmd, _ = get_language_config(language, case_dir)
+        # Compiled programs only need their artifacts, interpreted ones their source
+        if compile_cmd:
+            copy_artifacts(build_dir, case_dir, artifacts or [filename])
+        else:
+            _copy_sources(build_dir, case_dir, artifacts or [filename])
+        with metrics.RunTimer(language).phase('execute'):
+            stdout, stderr, returncode, duration, peak_memory_kb = run_prepared(
+                language, case_dir, filename, cmd, input_data, timeout, extra, checker=checker
+            )
+    except Exception as e:
+        metrics.RUNS.inc(language=language, outcome='internal_error')
+        return {'verdict': 'RE', 'stdout': '', 'stderr': f"Execution Error: {str(e)}", 'time': 0, 'memory': 0}
+    finally:
+        sandbox_pool.release(case_dir)
+    metrics.record_run(language, metrics.outcome(returncode, extra), extra)
+
+    verdict = get_verdict(returncode, checker, extra)
+    if verdict == "WA":
+        stderr += "\nWrong Answer: " + checker.message
+    elif verdict == "TLE" and returncode is None:
+        stdout, stderr, duration = "", "Execution Timed Out", timeout
+    elif verdict == "OLE":
+        stderr += "\nOutput Limit Exceeded"
+    elif limits.limit_message(returncode):
+        stderr += "\n" + limits.limit_message(returncode)
+    result = {
+        'verdict': verdict,
+        'stdout': stdout,
+        'stderr': stderr,
+        'time': round(duration, 3),
+        'memory': round(peak_memory_kb, 0),
+    }
+    if 'cpu_time' in extra:
+        result['cpu_time'] = extra['cpu_time']
+    return result
+
+
+def run_batch(code, language, cases, checker_options=None, workers=None):
+    """
+    Compiles `code` once and runs it on every case ({'input' or 'input_hash': ...,
+    'expected': ...}, expected optional). checker_options holds the request's "checker" and
+    "tolerance" fields. Runs `workers` cases at a time (default: worker_count()).
+    Returns the /run/batch/ JSON payload.
+    """
+    checker_options = checker_options or {}
+    timeout = getattr(settings, 'EXECUTION_TIMEOUT', 5)
+    start_time = time.perf_counter()
+    extra = {}
+
+    with sandbox_pool.workdir() as build_dir:
+        filename, cmd, artifacts, error = prepare_run(code, language, build_dir, extra)
+        metrics.record_compile(language, extra)
+        if error:
+            metrics.RUNS.inc(language=language, outcome='compile_error')
+            return {'success': False, 'stderr': error, 'cases': [], 'summary': {}, **extra}
+
+        with ThreadPoolExecutor(max_workers=max(1, min(workers or worker_count(), len(cases)))) as pool:
+            futures = [
+                pool.submit(_run_case, language, build_dir, filename, artifacts, case, checker_options, timeout)
+                for case in cases
+            ]
+            results = [future.result() for future in futures]
+
+    summary = {'total': len(results), 'passed': 0}
+    for result in results:
+        summary[result['verdict']] = summary.get(result['verdict'], 0) + 1
+        if result['verdict'] in PASSING_VERDICTS:
+            summary['passed'] += 1
+    return {
+        'success': summary['passed'] == summary['total'],
+        'stderr': '',
+        'cases': results,
+        'summary': summary,
+        'duration': round(time.perf_counter() - start_time, 3),
+        **extra
+    }
@@ -0,0 +1,190 @@
+"""
+Streaming comparison of a program's stdout against an expected output.
+
+A Checker is fed stdout as the program produces it (see output.OutputCapture)
+and keeps only a cursor into the expected output plus at most one partial
+token, so outputs far beyond MAX_OUTPUT_SIZE can be judged without buffering
+them. At the first mismatch feed() returns False and the program is killed.
+
+Modes:
+    exact       output must equal the expected output character for character
+    whitespace  same whitespace-separated tokens (spacing and line breaks ignored)
+    float       like whitespace, but numeric tokens may differ by `tolerance`
+                (absolute, or relative for values above 1)
+"""
+import math
+import re
+
+MODES = ("exact", "whitespace", "float")
+DEFAULT_MODE = "whitespace"
+DEFAULT_TOLERANCE = 1e-6
+
+# Longest partial token kept in float mode, where "1.000000..." may legitimately
+# be longer than the expected token
+MAX_NUMBER_LENGTH = 1024
+
+# Characters of the expected output split into tokens at a time
+EXPECTED_CHUNK = 65536
+
+WHITESPACE = re.compile(r'\s')
+
+
+def _shorten(token, length=40):
+    return token if len(token) <= length else token[:length] + "..."
+
+
+def _numbers_match(got, expected, tolerance):
+    try:
+        a = float(got)
+        b = float(expected)
+    except ValueError:
+        return got == expected
+    if math.isnan(a) or math.isnan(b):
+        return math.isnan(a) and math.isnan(b)
+    if math.isinf(a) or math.isinf(b):
+        return a == b
+    return abs(a - b) <= tolerance * max(1.0, abs(b))
+
+
+class Checker:
+    def __init__(self, expected, mode=DEFAULT_MODE, tolerance=DEFAULT_TOLERANCE):
+        if mode not in MODES:
+            raise ValueError(f'Unknown checker mode "{mode}"')
+        self.expected = expected
+        self.expected_size = len(expected)
+        self.mode = mode
+        self.tolerance = tolerance
+        self.passed = None  # None while running, then True / False
+        self.message = ""
+        self.stopped_early = False  # Failed before the output ended (the program is killed)
+        self._ended = False
+        # exact mode: characters matched so far
+        self._pos = 0
+        # token modes: expected tokens split ahead of the output (up to
+        # _split_pos), and an output token that may continue in the next chunk
+        self._split_pos = 0
+        self._ahead = []
+        self._count = 0
+        self._partial = ""
+
+    def feed(self, text):
+        """Checks the next chunk of output. Returns False once the output is known to be wrong."""
+        if self.passed is False:
+            return False
+        if self.mode == "exact":
+            self._feed_exact(text)
+        else:
+            self._feed_tokens(text)
+        return self.passed is not False
+
+    def finish(self):
+        """Call when the output has ended. Returns whether it matched."""
+        self._ended = True
+        if self.passed is not None:
+            return self.passed
+        if self.mode == "exact":
+            if self._pos < len(self.expected):
+                self._fail(f"Output ended early at line {self._line(self._pos)}")
+        else:
+            if self._partial:
+                self._compare(self._partial)
+                self._partial = ""
+            if self.passed is None and self._peek() is not None:
+                self._fail(f"Output ended early: expected {_shorten(self._peek())!r} as token {self._count + 1}")
+        if self.passed is None:
+            self.passed = True
+        return self.passed
+
+    def result(self):
+        return {'mode': self.mode, 'passed': self.passed, 'message': self.message}
+
+    def _fail(self, message):
+        self.passed = False
+        self.message = message
+        self.stopped_early = not self._ended
+
+    def _line(self, pos):
+        return self.expected.count("\n", 0, pos) + 1
+
+    def _feed_exact(self, text):
+        end = self._pos + len(text)
+        if self.expected[self._pos:end] == text:
+            self._pos = end
+            return
+        for i, char in enumerate(text):
+            if self._pos + i >= len(self.expected):
+                self._fail(f"Extra output after line {self._line(max(len(self.expected) - 1, 0))}")
+                return
+            if self.expected[self._pos + i] != char:
+                pos = self._pos + i
+                column = pos - self.expected.rfind("\n", 0, pos)
+                self._fail(f"Differs at line {self._line(pos)}, column {column}")
+                return
+
+    def _upcoming(self, n):
+        """The next n expected tokens (fewer near the end), without consuming them."""
+        while len(self._ahead) < n and self._split_pos < len(self.expected):
+            # Split up to a whitespace, so that no token is cut in two
+            match = WHITESPACE.search(self.expected, self._split_pos + EXPECTED_CHUNK)
+            end = match.start() if match else len(self.expected)
+            self._ahead.extend(self.expected[self._split_pos:end].split())
+            self._split_pos = end
+        return self._ahead[:n]
+
+    def _peek(self):
+        upcoming = self._upcoming(1)
+        return upcoming[0] if upcoming else None
+
+    def _feed_tokens(self, text):
+        data = self._partial + text
+        tokens = data.split()
+        # A token touching the end of the chunk may continue in the next one
+        self._partial = tokens.pop() if tokens and not data[-1].isspace() else ""
+        if tokens and tokens == self._upcoming(len(tokens)):
+            # The usual case, a whole chunk of matching tokens: one list comparison
+            del self._ahead[:len(tokens)]
+            self._count += len(tokens)
+        else:
+            for token in tokens:
+                if not self._compare(token):
+                    return
+        if self._partial:
+            limit = len(self._peek() or "")
+            if self.mode == "float":
+                limit = max(limit, MAX_NUMBER_LENGTH)
+            if len(self._partial) > limit:
+                # Already longer than any token that could match
+                self._compare(self._partial)
+                self._partial = ""
+
+    def _compare(self, token):
+        self._count += 1
+        expected = self._peek()
+        if expected is None:
+            self._fail(f"Extra output: {_shorten(token)!r} as token {self._count}")
+            return False
+        if self.mode == "float":
+            ok = _numbers_match(token, expected, self.tolerance)
+        else:
+            ok = token == expected
+        if not ok:
+            self._fail(f"Token {self._count}: expected {_shorten(expected)!r}, got {_shorten(token)!r}")
+            return False
+        del self._ahead[0]
+        return True
+
+
+def from_request(data, expected):
+    """
+    Builds a Checker from the request fields "checker" (mode) and "tolerance".
+    Returns None if there's no expected output. Raises ValueError on bad options.
+    """
+    if expected is None:
+        return None
+    if not isinstance(expected, str):
+        raise ValueError('"expected" must be a string')
+    try:
+        tolerance = float(data.get('tolerance', DEFAULT_TOLERANCE))
+    except (TypeError, ValueError):
+        raise ValueError('"tolerance" must be a number')
+    return Checker(expected, data.get('checker', DEFAULT_MODE), tolerance)
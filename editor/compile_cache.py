@@ -0,0 +1,397 @@
+"""
+Size-aware LRU cache for compiled artifacts.
+
+Each entry is a directory holding whatever a build produced (a binary, a jar,
+a tree of .class files...). Entries live in sharded subdirectories of
+CACHE_DIR (``ab/ab12.../``) so no single directory grows huge, and a small
+SQLite index next to them keeps
+each entry's size, hit count and last-hit time. Every insert trims the cache
+back under COMPILE_CACHE_MAX_BYTES / COMPILE_CACHE_MAX_ENTRIES by evicting the
+least recently used entries. Lookups don't write to the index: hits are
+counted in memory and written with the next write, or at the latest
+HIT_FLUSH_INTERVAL seconds later, so cache hits don't queue up on the index's
+write lock.
+
+Publishing is atomic (link or copy to a temp directory, then rename) and lock() provides a
+cross-process lock per key, so concurrent identical submissions compile once
+and never see a half-written binary.
+"""
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+CACHE_DIR = getattr(settings, 'COMPILE_CACHE_DIR', os.path.join(settings.BASE_DIR, 'compilation_cache'))
+if not os.path.exists(CACHE_DIR):
+    os.makedirs(CACHE_DIR)
+
+INDEX_NAME = 'index.sqlite3'
+
+# Bumped whenever the on-disk layout changes; older entries are discarded.
+# 1: single <key>.exe files, 2: one directory of artifacts per key.
+INDEX_VERSION = 2
+
+# Defaults used when the settings don't define a budget
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024  # 1GB
+DEFAULT_MAX_ENTRIES = 5000
+
+# Keys are mapped onto a fixed set of lock files (first N hex chars of the key)
+# so the lock directory stays small: 3 chars -> at most 4096 lock files.
+LOCK_STRIPE_CHARS = 3
+
+# Seconds a process may hold on to hits it hasn't written to the index
+HIT_FLUSH_INTERVAL = 5
+
+
+def _try_lock(f):
+    """Takes an exclusive, non-blocking lock on an open file. Raises OSError if busy."""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+
+
+def _unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _tree_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for name in filenames:
+            total += os.path.getsize(os.path.join(dirpath, name))
+    return total
+
+
+def link_or_copy(src, dst):
+    """Hard-links the file src to dst, or copies it when they're on different filesystems."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy(src, dst)
+    return dst
+
+
+def copy_artifacts(entry_path, dest_dir, names=None):
+    """
+    Puts the artifacts stored in a cache entry (or just `names`) into dest_dir,
+    hard-linked when possible. Cached files are read-only, so a program can't
+    change the entry through its link.
+    """
+    for name in names if names is not None else os.listdir(entry_path):
+        src = os.path.join(entry_path, name)
+        if os.path.isdir(src):
+            shutil.copytree(src, os.path.join(dest_dir, name), copy_function=link_or_copy, dirs_exist_ok=True)
+        else:
+            link_or_copy(src, os.path.join(dest_dir, name))
+
+
+def _make_read_only(path):
+    if os.name == 'nt':
+        return  # Read-only files couldn't be evicted there
+    for dirpath, dirnames, filenames in os.walk(path):
+        for name in filenames:
+            file_path = os.path.join(dirpath, name)
+            os.chmod(file_path, os.stat(file_path).st_mode & ~0o222)
+
+
+class CompileCache:
+    def __init__(self, root=CACHE_DIR, max_bytes=None, max_entries=None):
+        self.root = str(root)
+        self.index_path = os.path.join(self.root, INDEX_NAME)
+        if max_bytes is None:
+            max_bytes = getattr(settings, 'COMPILE_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+        if max_entries is None:
+            max_entries = getattr(settings, 'COMPILE_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._ready = False
+        self._hits = {}  # key -> (last hit, hits) not yet in the index
+        self._hits_lock = threading.Lock()
+        self._hits_flushed = time.monotonic()
+
+    @contextmanager
+    def _connect(self, write=True):
+        """
+        Opens the index, creating it (and adopting existing files) on first use.
+        A write transaction also stores the pending hits, so evictions see them;
+        without `write`, the transaction only takes the write lock if it writes.
+        """
+        conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+        try:
+            write = write or not self._ready
+            conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            if not self._ready:
+                self._ensure_schema(conn)
+                self._ready = True
+            if write:
+                self._flush_hits(conn)
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _ensure_schema(self, conn):
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version == INDEX_VERSION:
+            return
+        # Entries from an older layout are keyed differently and can't be reused
+        conn.execute("DROP TABLE IF EXISTS entries")
+        self._remove_legacy_files()
+        conn.execute(
+            "CREATE TABLE entries ("
+            " key TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_hit REAL NOT NULL,"
+            " hits INTEGER NOT NULL DEFAULT 0)"
+        )
+        conn.execute("CREATE INDEX entries_last_hit ON entries (last_hit)")
+        conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        self._adopt_files(conn)
+
+    def path_for(self, key):
+        """Returns the sharded directory where the artifacts for `key` live."""
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key):
+        """Returns the entry directory for `key` (recording the hit) or None."""
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            with self._connect(write=False) as conn:
+                if conn.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone():
+                    # File removed behind our back, drop the stale row
+                    conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            return None
+        with self._hits_lock:
+            hits = self._hits.get(key, (0, 0))[1]
+            self._hits[key] = (time.time(), hits + 1)
+            due = time.monotonic() - self._hits_flushed >= HIT_FLUSH_INTERVAL
+        if due:
+            with self._connect():
+                pass  # Stores the hits
+        return path
+
+    def put(self, key, src_dir, names):
+        """
+        Atomically publishes the artifacts `names` (files or directories,
+        relative to src_dir) under `key` and enforces the budget.
+        """
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Readers only ever see no entry or the complete new one
+        tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(tmp_path)
+            for name in names:
+                src = os.path.join(src_dir, name)
+                if os.path.isdir(src):
+                    shutil.copytree(src, os.path.join(tmp_path, name), copy_function=link_or_copy)
+                else:
+                    link_or_copy(src, os.path.join(tmp_path, name))
+            _make_read_only(tmp_path)
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            os.rename(tmp_path, path)
+        except OSError:
+            # Lost a race with another publisher of the same key, keep theirs
+            if not os.path.isdir(path):
+                raise
+        finally:
+            if os.path.exists(tmp_path):
+                shutil.rmtree(tmp_path, ignore_errors=True)
+        with self._connect() as conn:
+            self._record(conn, key, path)
+            self._evict(conn, self.max_bytes, self.max_entries)
+        return path
+
+    @contextmanager
+    def lock(self, key, timeout=None):
+        """
+        Holds a cross-process lock for `key` (shared with other gunicorn workers).
+        Yields True once acquired, or False if `timeout` seconds passed first, in
+        which case the caller should carry on without the lock.
+        """
+        lock_dir = os.path.join(self.root, 'locks')
+        os.makedirs(lock_dir, exist_ok=True)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        acquired = False
+        with open(os.path.join(lock_dir, key[:LOCK_STRIPE_CHARS] + '.lock'), 'a+b') as f:
+            try:
+                while True:
+                    try:
+                        _try_lock(f)
+                        acquired = True
+                        break
+                    except OSError:
+                        if deadline is not None and time.monotonic() >= deadline:
+                            break
+                        time.sleep(0.05)
+                yield acquired
+            finally:
+                if acquired:
+                    _unlock(f)
+
+    def remove(self, key):
+        with self._connect() as conn:
+            self._delete(conn, key)
+
+    def prune(self, max_bytes=None, max_entries=None, older_than=None):
+        """
+        Evicts least recently used entries until the cache fits the given budget
+        (defaults to the configured one). `older_than` additionally drops entries
+        not hit for that many seconds. Returns (removed_entries, freed_bytes).
+        """
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        if max_entries is None:
+            max_entries = self.max_entries
+        removed, freed = 0, 0
+        with self._connect() as conn:
+            if older_than is not None:
+                cutoff = time.time() - older_than
+                rows = conn.execute(
+                    "SELECT key, size FROM entries WHERE last_hit < ?", (cutoff,)
+                ).fetchall()
+                for key, size in rows:
+                    self._delete(conn, key)
+                    removed += 1
+                    freed += size
+            evicted, evicted_bytes = self._evict(conn, max_bytes, max_entries)
+        return removed + evicted, freed + evicted_bytes
+
+    def clear(self):
+        return self.prune(max_bytes=0, max_entries=0)
+
+    def stats(self):
+        with self._connect() as conn:
+            count, total, hits = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0) FROM entries"
+            ).fetchone()
+        return {
+            'entries': count,
+            'bytes': total,
+            'hits': hits,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+        }
+
+    def entries(self, limit=None):
+        """Returns index rows, most recently used first."""
+        query = "SELECT key, size, created, last_hit, hits FROM entries ORDER BY last_hit DESC"
+        params = ()
+        if limit:
+            query += " LIMIT ?"
+            params = (limit,)
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [
+            {'key': key, 'size': size, 'created': created, 'last_hit': last_hit, 'hits': hits}
+            for key, size, created, last_hit, hits in rows
+        ]
+
+    def rebuild_index(self):
+        """Re-scans the cache directory, dropping rows for missing files and adopting unknown ones."""
+        with self._connect() as conn:
+            for (key,) in conn.execute("SELECT key FROM entries").fetchall():
+                if not os.path.exists(self.path_for(key)):
+                    conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._adopt_files(conn)
+            self._evict(conn, self.max_bytes, self.max_entries)
+
+    # Internal helpers
+
+    def _flush_hits(self, conn):
+        with self._hits_lock:
+            pending, self._hits = self._hits, {}
+            self._hits_flushed = time.monotonic()
+        for key, (last_hit, hits) in pending.items():
+            cur = conn.execute(
+                "UPDATE entries SET last_hit = MAX(last_hit, ?), hits = hits + ? WHERE key = ?",
+                (last_hit, hits, key)
+            )
+            path = self.path_for(key)
+            if cur.rowcount == 0 and os.path.exists(path):
+                # On disk but not indexed yet
+                self._record(conn, key, path)
+                conn.execute("UPDATE entries SET hits = ? WHERE key = ?", (hits, key))
+
+    def _record(self, conn, key, path):
+        now = time.time()
+        conn.execute(
+            "INSERT INTO entries (key, size, created, last_hit, hits) VALUES (?, ?, ?, ?, 0) "
+            "ON CONFLICT(key) DO UPDATE SET size = excluded.size, last_hit = excluded.last_hit",
+            (key, _tree_size(path), now, now)
+        )
+
+    def _delete(self, conn, key):
+        shutil.rmtree(self.path_for(key), ignore_errors=True)
+        conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def _evict(self, conn, max_bytes, max_entries):
+        count, total = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        removed, freed = 0, 0
+        if count <= max_entries and total <= max_bytes:
+            return removed, freed
+        for key, size in conn.execute(
+            "SELECT key, size FROM entries ORDER BY last_hit ASC"
+        ).fetchall():
+            if count <= max_entries and total <= max_bytes:
+                break
+            self._delete(conn, key)
+            count -= 1
+            total -= size
+            removed += 1
+            freed += size
+        return removed, freed
+
+    def _adopt_files(self, conn):
+        """Indexes entries that exist on disk but not in the index."""
+        for shard in os.listdir(self.root):
+            shard_path = os.path.join(self.root, shard)
+            if not (os.path.isdir(shard_path) and len(shard) == 2):
+                continue
+            for key in os.listdir(shard_path):
+                entry_path = os.path.join(shard_path, key)
+                if key.endswith('.tmp') or not os.path.isdir(entry_path):
+                    continue
+                exists = conn.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone()
+                if not exists:
+                    self._record(conn, key, entry_path)
+
+    def _remove_legacy_files(self):
+        """Deletes single-file binaries left by the old flat and sharded layouts."""
+        for item in os.listdir(self.root):
+            item_path = os.path.join(self.root, item)
+            if os.path.isfile(item_path) and item.endswith('.exe'):
+                os.remove(item_path)
+            elif os.path.isdir(item_path) and len(item) == 2:
+                for name in os.listdir(item_path):
+                    if name.endswith('.exe'):
+                        os.remove(os.path.join(item_path, name))
+
+
+compile_cache = CompileCache()
@@ -0,0 +1,167 @@
+"""
+Content-addressed store for program input.
+
+A big input sent as the "input" string of a JSON request is copied several
+times (request body, parsed string, UTF-8 encoding for the pipe) and sent
+again for every run. Instead clients can upload it once, raw (POST /inputs/
+with the bytes as the body) or as the "input" file of a multipart /run/
+request. The upload is streamed to disk while being hashed and stored under
+INPUT_ROOT by its sha256. Runs refer to it with "input_hash", and the program
+gets the stored file itself as its stdin, so the input is never held in
+memory and bytes reach the program unchanged.
+
+An input expires INPUT_TTL seconds after it was last uploaded or used. Inputs
+over INPUT_MAX_BYTES are refused.
+
+Inputs are private to the server's user: the store's directories are created
+0o700 and the files 0o400. It lives in the compile cache directory by default,
+away from the work directories that programs run in.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+from .compile_cache import CACHE_DIR
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_TTL = 3600  # Seconds
+
+# Expired inputs are swept at most this often
+PRUNE_INTERVAL = 60  # Seconds
+
+CHUNK_SIZE = 65536
+
+DIGEST = re.compile(r'[0-9a-f]{64}')
+
+UPLOAD_PREFIX = '.upload-'
+
+
+class InputTooLarge(Exception):
+    pass
+
+
+class StoredInput:
+    """An input in the store, passed to programs as a file instead of a string."""
+
+    def __init__(self, digest, path, size):
+        self.digest = digest
+        self.path = path
+        self.size = size
+
+    def open(self):
+        return open(self.path, 'rb')
+
+    def __repr__(self):
+        return f"StoredInput({self.digest[:12]}, {self.size} bytes)"
+
+
+def get_root():
+    return getattr(settings, 'INPUT_ROOT', None) or os.path.join(CACHE_DIR, 'inputs')
+
+
+def max_bytes():
+    return getattr(settings, 'INPUT_MAX_BYTES', DEFAULT_MAX_BYTES)
+
+
+def input_digest(input_data):
+    """sha256 of an input, the same for a string and for the stored upload of its UTF-8 bytes."""
+    if isinstance(input_data, StoredInput):
+        return input_data.digest
+    return hashlib.sha256(input_data.encode('utf-8')).hexdigest()
+
+
+class InputStore:
+    def __init__(self, root=None):
+        self._root = root
+        self._last_prune = 0
+        self._lock = threading.Lock()
+
+    @property
+    def root(self):
+        return self._root or get_root()
+
+    def path_for(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, chunks):
+        """
+        Stores the bytes from the iterable `chunks` and returns the StoredInput.
+        Raises InputTooLarge past INPUT_MAX_BYTES.
+        """
+        self._maybe_prune()
+        limit = max_bytes()
+        os.makedirs(self.root, mode=0o700, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=UPLOAD_PREFIX)
+        try:
+            digest = hashlib.sha256()
+            size = 0
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if size > limit:
+                        raise InputTooLarge(f"Input is larger than {limit} bytes")
+                    digest.update(chunk)
+                    f.write(chunk)
+            digest = digest.hexdigest()
+            path = self.path_for(digest)
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+            # Programs only read it, and sandboxes may hard-link it
+            os.chmod(tmp_path, 0o400)
+            # Same content if it was already there, and runs using it keep their open file
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return StoredInput(digest, path, size)
+
+    def get(self, digest):
+        """The StoredInput with this sha256, None if unknown or expired. Counts as a use."""
+        if not isinstance(digest, str) or not DIGEST.fullmatch(digest):
+            return None
+        path = self.path_for(digest)
+        try:
+            os.utime(path)
+            return StoredInput(digest, path, os.path.getsize(path))
+        except FileNotFoundError:
+            return None
+
+    def prune(self):
+        """Deletes inputs unused for INPUT_TTL seconds, and abandoned uploads. Returns how many."""
+        cutoff = time.time() - getattr(settings, 'INPUT_TTL', DEFAULT_TTL)
+        removed = 0
+        try:
+            shards = os.listdir(self.root)
+        except FileNotFoundError:
+            return 0
+        for shard in shards:
+            shard_path = os.path.join(self.root, shard)
+            paths = [shard_path] if shard.startswith(UPLOAD_PREFIX) else []
+            if not paths and os.path.isdir(shard_path):
+                paths = [os.path.join(shard_path, name) for name in os.listdir(shard_path)]
+            for path in paths:
+                try:
+                    if os.stat(path).st_mtime < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    def _maybe_prune(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_prune < PRUNE_INTERVAL:
+                return
+            self._last_prune = now
+        self.prune()
+
+
+input_store = InputStore()
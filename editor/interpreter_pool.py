@@ -0,0 +1,172 @@
+"""
+Pool of pre-spawned interpreter processes for Python, PyPy and Node.
+
+Each worker is an interpreter that has already started up and imported the
+commonly used modules, and is now blocked reading a one-line JSON header
+({"cwd": ..., "file": ...}) from stdin. execute_code hands it a submission by
+writing that header followed by the program's input; the worker chdirs into
+the run directory and executes the file as __main__. A worker serves exactly
+one submission and exits with it, and the pool spawns a replacement in the
+background.
+
+The pool is disabled unless INTERPRETER_POOL_SIZE sets a size for a language.
+When no idle worker is available execute_code just starts the interpreter
+normally.
+"""
+import atexit
+import collections
+import json
+import subprocess
+import tempfile
+import threading
+
+from django.conf import settings
+
+from . import limits
+
+# The header is read one byte at a time straight from fd 0 so nothing past the
+# newline is buffered away from the program (which may use sys.stdin.buffer or
+# os.read directly).
+PYTHON_BOOTSTRAP = """
+import os, sys, traceback
+for _name in ("collections", "itertools", "functools", "math", "heapq", "bisect", "re", "random", "string", "json"):
+    try:
+        __import__(_name)
+    except ImportError:
+        pass
+_header = b""
+while not _header.endswith(b"\\n"):
+    _byte = os.read(0, 1)
+    if not _byte:
+        sys.exit(0)
+    _header += _byte
+_request = __import__("json").loads(_header)
+os.chdir(_request["cwd"])
+sys.argv = [_request["file"]]
+sys.path[0] = _request["cwd"]
+with open(_request["file"], "rb") as _f:
+    _code = compile(_f.read(), _request["file"], "exec")
+try:
+    exec(_code, {"__name__": "__main__", "__file__": _request["file"], "__builtins__": __builtins__})
+except SystemExit:
+    raise
+except BaseException as _e:
+    # Hide this bootstrap frame so the traceback looks like a normal run
+    traceback.print_exception(type(_e), _e, _e.__traceback__.tb_next)
+    sys.exit(1)
+"""
+
+NODE_BOOTSTRAP = """
+const fs = require('fs');
+const path = require('path');
+['util', 'os', 'readline', 'events'].forEach((name) => require(name));
+const byte = Buffer.alloc(1);
+let header = '';
+for (;;) {
+    let n;
+    try {
+        n = fs.readSync(0, byte, 0, 1, null);
+    } catch (e) {
+        if (e.code === 'EAGAIN') continue;
+        throw e;
+    }
+    if (n === 0) process.exit(0);
+    const ch = byte.toString('latin1');
+    if (ch === '\\n') break;
+    header += ch;
+}
+const request = JSON.parse(header);
+process.chdir(request.cwd);
+process.argv[1] = path.join(request.cwd, request.file);
+require('module').runMain();
+"""
+
+POOLED_LANGUAGES = ["python", "pypy", "javascript"]
+
+
+def _worker_command(language):
+    compiler_paths = getattr(settings, 'COMPILER_PATHS', {})
+    if language == "python":
+        return [compiler_paths.get("python", "python"), "-c", PYTHON_BOOTSTRAP]
+    if language == "pypy":
+        return [compiler_paths.get("pypy", "pypy"), "-c", PYTHON_BOOTSTRAP]
+    if language == "javascript":
+        return [compiler_paths.get("javascript", "node"), "-e", NODE_BOOTSTRAP]
+    return None
+
+
+def make_header(cwd, filename):
+    """First line to write to a pooled worker's stdin, before the program input."""
+    return json.dumps({'cwd': cwd, 'file': filename}) + "\n"
+
+
+class InterpreterPool:
+    def __init__(self):
+        self._idle = collections.defaultdict(collections.deque)
+        self._spawning = collections.Counter()
+        self._lock = threading.Lock()
+
+    def size_for(self, language):
+        return getattr(settings, 'INTERPRETER_POOL_SIZE', {}).get(language, 0)
+
+    def acquire(self, language):
+        """
+        Returns an idle worker (a LimitedPopen with binary pipes) for `language`, or
+        None if the pool is disabled or exhausted. The caller owns the process.
+        """
+        if language not in POOLED_LANGUAGES or self.size_for(language) <= 0:
+            return None
+        worker = None
+        with self._lock:
+            idle = self._idle[language]
+            while idle:
+                candidate = idle.popleft()
+                if candidate.poll() is None:
+                    worker = candidate
+                    break
+        self._refill(language)
+        return worker
+
+    def shutdown(self):
+        with self._lock:
+            workers = [w for idle in self._idle.values() for w in idle]
+            self._idle.clear()
+        for worker in workers:
+            try:
+                worker.kill()
+                worker.wait(timeout=1)
+            except Exception:
+                pass
+
+    def _refill(self, language):
+        with self._lock:
+            missing = self.size_for(language) - len(self._idle[language]) - self._spawning[language]
+            if missing <= 0:
+                return
+            self._spawning[language] += missing
+        threading.Thread(target=self._spawn, args=(language, missing), daemon=True).start()
+
+    def _spawn(self, language, count):
+        for _ in range(count):
+            worker = None
+            try:
+                # Limits are set now, the CPU clock only counts the short warm-up on top
+                worker = limits.LimitedPopen(
+                    _worker_command(language),
+                    language,
+                    getattr(settings, 'EXECUTION_TIMEOUT', 5),
+                    cwd=tempfile.gettempdir(),
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE
+                )
+            except Exception:
+                pass  # Interpreter missing or broken, runs fall back to a normal start
+            with self._lock:
+                self._spawning[language] -= 1
+                if worker is not None:
+                    self._idle[language].append(worker)
+
+
+interpreter_pool = InterpreterPool()
+atexit.register(interpreter_pool.shutdown)
@@ -0,0 +1,254 @@
+"""
+Bounded job queue in front of the execution backend (see backends.py).
+
+Runs are queued and picked up by a fixed number of worker threads (RUN_WORKERS,
+default: one per CPU core, or the workers of all runners with the remote
+backend), so a burst of submissions waits its turn instead of
+forking compilers and programs all at once. When RUN_QUEUE_SIZE jobs are already
+waiting, submit() raises QueueFull and the views answer 429.
+
+Runs submitted on behalf of a client are charged to it (see scheduler.py):
+submit() raises RateLimited when one of its token buckets is empty, and a
+waiting run isn't started while its client is at a concurrency cap. Waiting
+runs are kept in one line per client (its session, or IP) and workers take
+from the lines in turn, so a client queueing many runs only delays the others
+by one run per turn.
+
+The scheduler's bookkeeping is SQLite I/O, so it happens outside the queue's
+lock: a worker claims the job at the head of a line, checks its client's caps
+unlocked, and either starts it or leaves it for RETRY_INTERVAL (caps held by
+other processes are released without telling us).
+
+Jobs and their results live in this process's memory and are dropped
+RUN_RESULT_TTL seconds after finishing. Poll from the same server process that
+accepted the job (single-process deployments, or sticky routing).
+"""
+import collections
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+from . import metrics
+from .backends import get_backend
+from .batch import worker_count as batch_worker_count
+from .scheduler import RETRY_INTERVAL, scheduler
+from .utils import result_to_dict
+
+DEFAULT_QUEUE_SIZE = 100
+DEFAULT_RESULT_TTL = 300  # Seconds
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, target, client=(), slots=1):
+        self.id = uuid.uuid4().hex
+        self.target = target  # Called by a worker, returns the result dict
+        self.slots = slots  # Workers' worth of runs it executes at once
+        self.client = list(client)  # Scheduler keys the run is charged to
+        self.owner = self.client[0] if self.client else None  # Its line in the queue
+        self.claimed = False  # A worker is checking its client's caps
+        self.retry_at = 0  # time.monotonic() before which it's at a cap
+        self.status = 'queued'  # queued -> running -> done / failed
+        self.result = None
+        self.created = time.time()
+        self.finished = None
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        """Blocks until the job has finished. Returns False on timeout."""
+        return self._done.wait(timeout)
+
+
+class JobQueue:
+    def __init__(self):
+        self._pending = collections.OrderedDict()  # owner -> deque of jobs, in serving order
+        self._queued = 0
+        self._jobs = {}
+        self._running = 0
+        self._busy = 0  # Slots of the running jobs, at most worker_count()
+        self._workers = []
+        self._cond = threading.Condition()
+
+    def worker_count(self):
+        return getattr(settings, 'RUN_WORKERS', None) or get_backend().capacity()
+
+    def submit(self, code, language, input_data="", on_output=None, client=(), **options):
+        """
+        Queues a run and returns its Job. Raises QueueFull when the queue is
+        full, RateLimited when `client` (see scheduler.client_keys) is out of
+        runs; runs without a client aren't limited.
+        on_output and options (checker, use_cache, timings, profile) are passed
+        on to execute_code, on_output is called from the worker thread.
+        """
+        backend = get_backend()
+        return self._enqueue(Job(
+            lambda: result_to_dict(backend.execute(code, language, input_data, on_output, **options)),
+            client
+        ))
+
+    def submit_batch(self, code, language, cases, checker_options=None, client=()):
+        """
+        Queues a batch run (see batch.py). Its cases run in parallel, so it
+        counts as that many workers: it waits until they are all free, and
+        holds them while it runs.
+        """
+        backend = get_backend()
+        slots = max(1, min(batch_worker_count(), len(cases), self.worker_count()))
+        return self._enqueue(Job(
+            lambda: backend.run_batch(code, language, cases, checker_options, workers=slots),
+            client,
+            slots
+        ))
+
+    def _enqueue(self, job):
+        with self._cond:
+            self._purge()
+            self._check_size()
+        scheduler.admit(job.client)
+        with self._cond:
+            self._check_size()  # Others may have queued meanwhile
+            self._jobs[job.id] = job
+            self._pending.setdefault(job.owner, collections.deque()).append(job)
+            self._queued += 1
+            self._start_workers()
+            self._cond.notify()
+        return job
+
+    def _check_size(self):
+        if self._queued >= getattr(settings, 'RUN_QUEUE_SIZE', DEFAULT_QUEUE_SIZE):
+            raise QueueFull()
+
+    def get(self, job_id):
+        with self._cond:
+            self._purge()
+            return self._jobs.get(job_id)
+
+    def position(self, job):
+        """
+        1-based position among waiting jobs, 0 once the job has started.
+        Assumes lines are served in turn without waiting on concurrency caps.
+        """
+        with self._cond:
+            line = self._pending.get(job.owner)
+            if job.status != 'queued' or line is None or job not in line:
+                return 0
+            turn = line.index(job)
+            ahead = 0
+            served_first = True  # Lines before job's are served first in each turn
+            for owner, other in self._pending.items():
+                if owner == job.owner:
+                    served_first = False
+                    ahead += turn
+                else:
+                    ahead += min(len(other), turn) + (1 if served_first and len(other) > turn else 0)
+            return ahead + 1
+
+    def stats(self):
+        with self._cond:
+            return {
+                'queued': self._queued,
+                'clients': len(self._pending),
+                'running': self._running,
+                'workers': self.worker_count(),
+            }
+
+    def _start_workers(self):
+        while len(self._workers) < self.worker_count():
+            worker = threading.Thread(target=self._work, daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _purge(self):
+        ttl = getattr(settings, 'RUN_RESULT_TTL', DEFAULT_RESULT_TTL)
+        cutoff = time.time() - ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished is not None and job.finished < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _claim(self):
+        """
+        Claims the first job of the first line that isn't already claimed or
+        waiting on a cap, reserving its workers. None if there's no such job,
+        or the next one needs more workers than are free.
+        """
+        now = time.monotonic()
+        for line in self._pending.values():
+            job = line[0]
+            if job.claimed or job.retry_at > now:
+                continue
+            if self._busy + job.slots > self.worker_count():
+                # Keep the free workers for it, rather than letting smaller jobs overtake it forever
+                return None
+            job.claimed = True
+            self._busy += job.slots
+            return job
+        return None
+
+    def _wait_time(self):
+        """Seconds until a job at a cap is due for another try, None if there's none."""
+        now = time.monotonic()
+        due = [line[0].retry_at - now for line in self._pending.values()
+               if not line[0].claimed and line[0].retry_at > now]
+        return min(due, default=None)
+
+    def _next_job(self):
+        """
+        Takes the first job of the first line whose client may start a run,
+        and moves that line to the back. Blocks until there is one.
+        """
+        while True:
+            with self._cond:
+                job = self._claim()
+                while job is None:
+                    self._cond.wait(self._wait_time())
+                    job = self._claim()
+            acquired = scheduler.try_acquire(job.id, job.client)
+            with self._cond:
+                job.claimed = False
+                if not acquired:
+                    job.retry_at = time.monotonic() + RETRY_INTERVAL
+                    self._busy -= job.slots
+                    self._cond.notify_all()  # Its workers are free for other lines
+                    continue
+                line = self._pending.pop(job.owner)
+                line.popleft()
+                if line:
+                    self._pending[job.owner] = line
+                self._queued -= 1
+                job.status = 'running'
+                self._running += 1
+                return job
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+            metrics.QUEUE_WAIT_SECONDS.observe(time.time() - job.created)
+            try:
+                job.result = job.target()
+                job.status = 'done'
+            except Exception as e:
+                job.result = {'error': str(e)}
+                job.status = 'failed'
+            finally:
+                if job.client:
+                    scheduler.release(job.id)
+                with self._cond:
+                    self._running -= 1
+                    self._busy -= job.slots
+                    job.finished = time.time()
+                    self._cond.notify_all()  # Its client may be under its cap again
+                job._done.set()
+
+
+job_queue = JobQueue()
+
+metrics.Gauge(
+    'webide_run_queue_jobs', "Jobs waiting in or being run by the run queue.", ['state'],
+    collect=lambda: {(state,): job_queue.stats()[state] for state in ('queued', 'running')}
+)
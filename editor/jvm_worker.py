@@ -0,0 +1,317 @@
+"""
+Persistent JVM workers for Java and Kotlin runs.
+
+Starting a JVM per run costs more than most exercises take to execute. With
+JVM_WORKERS > 0, runs are instead handed to long-lived JVMs running
+runners/JvmRunner.java, which loads each submission's classes in a fresh class
+loader with its own stdin/stdout/stderr files and a timeout.
+
+Isolation: a worker is thrown away after a timeout, after System.exit(), when
+the submission leaves threads running, and after JVM_WORKER_MAX_RUNS runs.
+Workers run under the EXECUTION_LIMITS of Java runs; the CPU limit is moved
+forward before each run so that every submission gets the full allowance.
+Every run gets an empty working directory (the JVM's cwd), whose contents are
+moved into the run directory afterwards so created files are reported as usual.
+"""
+import atexit
+import collections
+import hashlib
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+import psutil
+from django.conf import settings
+
+from . import limits
+from .compile_cache import CACHE_DIR, compile_cache, link_or_copy
+from .inputs import StoredInput
+from .output import CHUNK_SIZE, stderr_capture, stdout_capture
+
+RUNNER_SOURCE = os.path.join(os.path.dirname(__file__), 'runners', 'JvmRunner.java')
+RUNNER_DIR = os.path.join(CACHE_DIR, 'jvm-runner')
+
+# Language -> (classpath inside the run dir, main class; empty = jar Main-Class)
+JVM_TARGETS = {
+    "java": ("classes", "Main"),
+    "kotlin": ("main.jar", ""),
+}
+JVM_LANGUAGES = list(JVM_TARGETS)
+
+DEFAULT_MAX_RUNS = 100
+
+
+def _ensure_runner():
+    """Compiles JvmRunner.java (once per source and javac) and returns its classpath."""
+    javac = getattr(settings, 'COMPILER_PATHS', {}).get("java", "javac")
+    with open(RUNNER_SOURCE, 'rb') as f:
+        digest = hashlib.sha256(f.read() + javac.encode('utf-8')).hexdigest()
+    target = os.path.join(RUNNER_DIR, digest[:16])
+    if os.path.exists(os.path.join(target, 'JvmRunner.class')):
+        return target
+    with compile_cache.lock(digest, timeout=60):
+        if os.path.exists(os.path.join(target, 'JvmRunner.class')):
+            return target
+        os.makedirs(RUNNER_DIR, exist_ok=True)
+        build_dir = tempfile.mkdtemp(dir=RUNNER_DIR)
+        try:
+            subprocess.run(
+                [javac, "-d", build_dir, RUNNER_SOURCE],
+                capture_output=True,
+                timeout=60,
+                check=True
+            )
+            os.rename(build_dir, target)
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
+    return target
+
+
+def _clear_dir(path):
+    for item in os.listdir(path):
+        item_path = os.path.join(path, item)
+        if os.path.isdir(item_path) and not os.path.islink(item_path):
+            shutil.rmtree(item_path, ignore_errors=True)
+        else:
+            os.remove(item_path)
+
+
+class JvmWorker:
+    def __init__(self, runner_dir):
+        self.work_dir = tempfile.mkdtemp(prefix='jvm-worker-')
+        self.cwd = os.path.join(self.work_dir, 'cwd')
+        self.io_dir = os.path.join(self.work_dir, 'io')
+        os.makedirs(self.cwd)
+        os.makedirs(self.io_dir)
+        self.proc = subprocess.Popen(
+            self.command(runner_dir),
+            cwd=self.cwd,
+            preexec_fn=limits.preexec_for("java", 0, cpu=False),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding='utf-8',
+            bufsize=1
+        )
+        self.replies = queue.Queue()
+        threading.Thread(target=self._read_replies, daemon=True).start()
+        self.runs = 0
+        self.reusable = True
+
+    def command(self, runner_dir):
+        java = getattr(settings, 'COMPILER_PATHS', {}).get("java_run", "java")
+        return [java, *getattr(settings, 'JVM_WORKER_OPTIONS', []), "-cp", runner_dir, "JvmRunner"]
+
+    def _read_replies(self):
+        for line in self.proc.stdout:
+            self.replies.put(line.rstrip('\n'))
+        self.replies.put(None)  # JVM exited
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def run(self, classpath, main_class, run_dir, input_data, timeout, extra, checker=None):
+        """
+        Runs one submission. Returns (stdout, stderr, returncode, duration, peak_memory_kb)
+        like execute_code's process runner; returncode is None on timeout.
+        Raises OSError only if the submission never reached the JVM.
+        """
+        stdin_path = os.path.join(self.io_dir, 'stdin')
+        stdout_path = os.path.join(self.io_dir, 'stdout')
+        stderr_path = os.path.join(self.io_dir, 'stderr')
+        # Never written in place: it may be a hard link to a stored input
+        try:
+            os.remove(stdin_path)
+        except FileNotFoundError:
+            pass
+        if isinstance(input_data, StoredInput):
+            link_or_copy(input_data.path, stdin_path)
+        else:
+            with open(stdin_path, 'w', encoding='utf-8') as f:
+                f.write(input_data)
+
+        usage = {'peak': 0, 'cpu_start': None, 'cpu_end': None}
+        done = threading.Event()
+
+        try:
+            usage['cpu_start'] = sum(psutil.Process(self.proc.pid).cpu_times()[:2])
+            limits.limit_cpu(self.proc.pid, "java", timeout, usage['cpu_start'])
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+
+        def sample_memory():
+            # The JVM outlives the run so there's no rusage for it, poll instead
+            try:
+                p = psutil.Process(self.proc.pid)
+                while not done.is_set():
+                    usage['peak'] = max(usage['peak'], p.memory_info().rss / 1024)
+                    done.wait(0.1)
+                usage['cpu_end'] = sum(p.cpu_times()[:2])
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+
+        stdout = stdout_capture(checker=checker)
+        stderr = stderr_capture()
+
+        sampler = threading.Thread(target=sample_memory)
+        sampler.start()
+        self.runs += 1
+        start_time = time.perf_counter()
+        try:
+            self.proc.stdin.write("\t".join([
+                classpath, main_class, stdin_path, stdout_path, stderr_path,
+                str(int(timeout * 1000)), str(stdout.limit)
+            ]) + "\n")
+            self.proc.stdin.flush()
+        except BaseException:
+            # Never reached the JVM: nothing ran, the caller may run it another way
+            done.set()
+            sampler.join()
+            stdout.close()
+            raise
+        try:
+            try:
+                reply = self.replies.get(timeout=timeout + 2)
+            except queue.Empty:
+                reply = "TIMEOUT\t-1"  # Same as the runner's own timeout reply
+            done.set()
+            sampler.join()
+            duration = time.perf_counter() - start_time
+            if usage['cpu_start'] is not None and usage['cpu_end'] is not None:
+                # Includes the JVM's own JIT and GC threads
+                extra['cpu_time'] = round(usage['cpu_end'] - usage['cpu_start'], 3)
+
+            if reply is None:
+                # System.exit() from the submission (or its CPU limit) took the JVM down with it
+                self.reusable = False
+                returncode = self.proc.wait(timeout=5)
+            else:
+                status, code = reply.split("\t")[:2]
+                if status == "TIMEOUT":
+                    self.reusable = False
+                    returncode = None
+                elif status == "LIMIT":
+                    # The runner halts itself once the program writes past OUTPUT_LIMIT
+                    self.reusable = False
+                    returncode = int(code)
+                    extra['output_limit_exceeded'] = True
+                else:
+                    returncode = int(code)
+                    duration = int(reply.split("\t")[2]) / 1000
+                    if status == "DIRTY":
+                        self.reusable = False
+            if self.runs >= getattr(settings, 'JVM_WORKER_MAX_RUNS', DEFAULT_MAX_RUNS):
+                self.reusable = False
+
+            if returncode is not None:
+                for path, capture in ((stdout_path, stdout), (stderr_path, stderr)):
+                    if not os.path.exists(path):
+                        continue
+                    with open(path, 'rb') as f:
+                        # Stop reading once nothing more would be kept or checked
+                        while capture.wants_more():
+                            data = f.read(CHUNK_SIZE)
+                            if not data:
+                                break
+                            capture.feed(data)
+                        capture.total = max(capture.total, os.path.getsize(path))
+            stdout.close()
+
+            # Hand over files the program created in the JVM's cwd
+            for item in os.listdir(self.cwd):
+                shutil.move(os.path.join(self.cwd, item), os.path.join(run_dir, item))
+            _clear_dir(self.io_dir)
+            return stdout.text(), stderr.text(), returncode, duration, usage['peak']
+        except (OSError, ValueError, subprocess.SubprocessError) as e:
+            # The submission has run, at least partly: report the failure rather than run it twice
+            self.reusable = False
+            done.set()
+            sampler.join()
+            stdout.close()
+            return "", f"Internal error: the JVM worker failed ({e}).", 1, time.perf_counter() - start_time, \
+                usage['peak']
+
+    def close(self):
+        try:
+            self.proc.kill()
+            self.proc.wait(timeout=5)
+        except Exception:
+            pass
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+class JvmWorkerPool:
+    def __init__(self):
+        self._idle = collections.deque()
+        self._total = 0
+        self._lock = threading.Lock()
+        self._unavailable = False
+
+    def size(self):
+        return getattr(settings, 'JVM_WORKERS', 0)
+
+    def run(self, language, run_dir, input_data, timeout, extra, checker=None):
+        """
+        Runs the compiled submission in run_dir on a pooled JVM. Returns the
+        result tuple, or None when the pool is disabled or busy and the caller
+        should launch `java` itself.
+        """
+        if language not in JVM_TARGETS or self.size() <= 0 or self._unavailable:
+            return None
+        worker = self._checkout()
+        if worker is None:
+            return None
+        classpath, main_class = JVM_TARGETS[language]
+        try:
+            return worker.run(os.path.join(run_dir, classpath), main_class, run_dir, input_data, timeout, extra, checker)
+        except OSError:
+            # Broken pipe before the request was sent: drop the worker, run it the normal way
+            worker.reusable = False
+            return None
+        finally:
+            self._checkin(worker)
+
+    def shutdown(self):
+        with self._lock:
+            workers = list(self._idle)
+            self._idle.clear()
+        for worker in workers:
+            worker.close()
+
+    def _checkout(self):
+        with self._lock:
+            while self._idle:
+                worker = self._idle.popleft()
+                if worker.alive():
+                    return worker
+                worker.close()
+                self._total -= 1
+            if self._total >= self.size():
+                return None
+            self._total += 1
+        try:
+            return JvmWorker(_ensure_runner())
+        except Exception:
+            # No JDK (or the runner doesn't build): stop trying
+            with self._lock:
+                self._total -= 1
+                self._unavailable = True
+            return None
+
+    def _checkin(self, worker):
+        if worker.reusable and worker.alive():
+            with self._lock:
+                self._idle.append(worker)
+        else:
+            worker.close()
+            with self._lock:
+                self._total -= 1
+
+
+jvm_pool = JvmWorkerPool()
+atexit.register(jvm_pool.shutdown)
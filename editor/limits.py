@@ -0,0 +1,264 @@
+"""
+Resource limits and accounting for submitted programs.
+
+On POSIX systems programs are started through runners/launcher.c, a small C
+supervisor built on first use with the configured C compiler. It applies the
+limits with setrlimit, reaps the program with wait4 and reports its rusage:
+ru_maxrss catches the real peak even for runs far shorter than any polling
+interval, and user + system time gives the CPU time. Forking from the launcher
+rather than from the server matters, because ru_maxrss carries over across
+exec and would otherwise never drop below the server's own RSS.
+
+Without a C compiler, limits are applied in a preexec_fn and the program is
+reaped with wait4 directly (memory figures then have that floor). Windows has
+neither, so there the runners fall back to polling with psutil.
+
+Limits are configured with EXECUTION_LIMITS; a value of None disables that limit.
+"""
+import hashlib
+import math
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+
+from django.conf import settings
+
+from .compile_cache import CACHE_DIR, compile_cache
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+HAS_RLIMITS = resource is not None and hasattr(os, 'wait4')
+
+LAUNCHER_SOURCE = os.path.join(os.path.dirname(__file__), 'runners', 'launcher.c')
+LAUNCHER_DIR = os.path.join(CACHE_DIR, 'launcher')
+
+DEFAULT_LIMITS = {
+    'memory_mb': 512,      # RLIMIT_AS
+    'cpu_seconds': None,   # RLIMIT_CPU, None = EXECUTION_TIMEOUT rounded up
+    'file_size_mb': 16,    # RLIMIT_FSIZE, per file the program writes
+    'processes': None,     # RLIMIT_NPROC
+}
+
+# These runtimes reserve large virtual address ranges at startup (heap, GC,
+# JIT), so an address space limit makes them fail before running any code
+NO_ADDRESS_SPACE_LIMIT = {"java", "kotlin", "go", "javascript", "dart"}
+
+LIMIT_SIGNALS = {}
+if hasattr(signal, 'SIGXCPU'):
+    LIMIT_SIGNALS[-signal.SIGXCPU] = "CPU Time Limit Exceeded"
+    LIMIT_SIGNALS[-signal.SIGXFSZ] = "File Size Limit Exceeded"
+
+_launcher = {'path': None, 'failed': False}
+_launcher_lock = threading.Lock()
+
+
+def get_limits():
+    return {**DEFAULT_LIMITS, **getattr(settings, 'EXECUTION_LIMITS', {})}
+
+
+def _rlimits(language, timeout):
+    """(address space bytes, CPU seconds, file size bytes, processes), 0 = no limit."""
+    limits = get_limits()
+    memory = 0
+    if limits['memory_mb'] and language not in NO_ADDRESS_SPACE_LIMIT:
+        memory = limits['memory_mb'] * 1024 * 1024
+    cpu_seconds = limits['cpu_seconds'] or math.ceil(timeout)
+    file_size = (limits['file_size_mb'] or 0) * 1024 * 1024
+    return memory, cpu_seconds, file_size, limits['processes'] or 0
+
+
+def preexec_for(language, timeout, cpu=True):
+    """
+    Returns a preexec_fn applying the configured limits for `language`, or
+    None when there's nothing to apply (or no setrlimit on this platform).
+    Without cpu, RLIMIT_CPU is left to limit_cpu().
+    """
+    if not HAS_RLIMITS:
+        return None
+    memory, cpu_seconds, file_size, processes = _rlimits(language, timeout)
+    rlimits = []
+    if memory:
+        rlimits.append((resource.RLIMIT_AS, (memory, memory)))
+    if cpu_seconds and cpu:
+        # SIGXCPU at the soft limit, SIGKILL a second later if it's ignored
+        rlimits.append((resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1)))
+    if file_size:
+        rlimits.append((resource.RLIMIT_FSIZE, (file_size, file_size)))
+    if processes and hasattr(resource, 'RLIMIT_NPROC'):
+        # Counts every process (and on Linux, thread) of the user the server runs as
+        rlimits.append((resource.RLIMIT_NPROC, (processes, processes)))
+    if not rlimits:
+        return None
+
+    def apply_limits():
+        # Runs in the forked child: no imports or allocations beyond the calls themselves
+        for which, value in rlimits:
+            try:
+                resource.setrlimit(which, value)
+            except (ValueError, OSError):
+                pass  # Can't go above an existing hard limit, keep that one
+    return apply_limits
+
+
+def limit_cpu(pid, language, timeout, used):
+    """
+    For a long-lived process running one program after another (a JVM
+    worker): moves its RLIMIT_CPU soft limit to the configured CPU seconds on
+    top of the `used` seconds it has spent so far. Does nothing where prlimit
+    isn't available.
+    """
+    if not HAS_RLIMITS or not hasattr(resource, 'prlimit'):
+        return
+    cpu_seconds = _rlimits(language, timeout)[1]
+    if not cpu_seconds:
+        return
+    try:
+        # Only the soft limit: an unprivileged process can't raise a hard limit again
+        _, hard = resource.prlimit(pid, resource.RLIMIT_CPU)
+        soft = math.ceil(used) + cpu_seconds
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.prlimit(pid, resource.RLIMIT_CPU, (soft, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def get_launcher():
+    """Path to the compiled launcher, building it if needed. None if it can't be built."""
+    if not HAS_RLIMITS:
+        return None
+    with _launcher_lock:
+        if _launcher['path'] is None and not _launcher['failed']:
+            try:
+                _launcher['path'] = _build_launcher()
+            except Exception:
+                _launcher['failed'] = True  # No C compiler: use preexec_fn
+        return _launcher['path']
+
+
+def _build_launcher():
+    cc = getattr(settings, 'COMPILER_PATHS', {}).get("c", "gcc")
+    with open(LAUNCHER_SOURCE, 'rb') as f:
+        digest = hashlib.sha256(f.read() + cc.encode('utf-8')).hexdigest()
+    target = os.path.join(LAUNCHER_DIR, digest[:16])
+    binary = os.path.join(target, 'launcher')
+    if os.path.exists(binary):
+        return binary
+    with compile_cache.lock(digest, timeout=60):
+        if os.path.exists(binary):
+            return binary
+        os.makedirs(LAUNCHER_DIR, exist_ok=True)
+        build_dir = tempfile.mkdtemp(dir=LAUNCHER_DIR)
+        try:
+            subprocess.run(
+                [cc, "-O2", "-o", os.path.join(build_dir, 'launcher'), LAUNCHER_SOURCE],
+                capture_output=True,
+                timeout=60,
+                check=True
+            )
+            os.rename(build_dir, target)
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
+    return binary
+
+
+def _maxrss_kb(maxrss):
+    return maxrss / 1024 if sys.platform == 'darwin' else maxrss  # Bytes there, KB on Linux
+
+
+class LimitedPopen(subprocess.Popen):
+    """
+    Popen running `cmd` under the configured limits (through the launcher when
+    available). Reap it with reap() instead of wait() to get its usage; kill()
+    takes the program's whole process group down. Whatever the program leaves
+    running is killed once it exits (by the launcher, or here by reap() for its
+    session), so nothing outlives the run in its work directory.
+    """
+
+    def __init__(self, cmd, language, timeout, **kwargs):
+        self._report = None
+        self._killed = False
+        self._cpu_seconds = _rlimits(language, timeout)[1] if HAS_RLIMITS else 0
+        launcher = get_launcher()
+        if launcher is None:
+            super().__init__(cmd, preexec_fn=preexec_for(language, timeout), start_new_session=HAS_RLIMITS,
+                             **kwargs)
+            return
+        read_fd, write_fd = os.pipe()
+        argv = [launcher, str(write_fd), *map(str, _rlimits(language, timeout)), *cmd]
+        try:
+            super().__init__(argv, pass_fds=(write_fd,), **kwargs)
+        except BaseException:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+        self._report = read_fd
+
+    def kill(self):
+        # Not send_signal(): its poll() could reap the child before reap() gets its rusage.
+        # Until reap() the pid stays ours, even once the process has exited.
+        if self.returncode is not None:
+            return
+        self._killed = True
+        try:
+            if self._report is not None:
+                # The launcher kills the program's process group, then reports as usual
+                os.kill(self.pid, signal.SIGTERM)
+            elif HAS_RLIMITS:
+                os.killpg(self.pid, signal.SIGKILL)
+            else:
+                os.kill(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def reap(self):
+        """
+        Waits for the program (blocking unless it has already exited), sets
+        returncode and returns (peak_memory_kb, cpu_seconds).
+        """
+        peak_memory_kb, cpu_seconds = self._reap()
+        if (self.returncode == -signal.SIGKILL and not self._killed
+                and self._cpu_seconds and cpu_seconds >= self._cpu_seconds):
+            # Ignored SIGXCPU and got the SIGKILL of the hard CPU limit: still the CPU limit
+            self.returncode = -signal.SIGXCPU
+        return peak_memory_kb, cpu_seconds
+
+    def _reap(self):
+        if self._report is None and hasattr(os, 'waitid'):
+            # Without the launcher: once the program has exited, but before its
+            # pid (its session's id) can be reused, kill what it left behind
+            try:
+                os.waitid(os.P_PID, self.pid, os.WEXITED | os.WNOWAIT)
+                os.killpg(self.pid, signal.SIGKILL)
+            except (ChildProcessError, ProcessLookupError, PermissionError):
+                pass
+        try:
+            _, status, rusage = os.wait4(self.pid, 0)
+            self.returncode = os.waitstatus_to_exitcode(status)
+            usage = (_maxrss_kb(rusage.ru_maxrss), rusage.ru_utime + rusage.ru_stime)
+        except ChildProcessError:
+            self.wait()  # Already reaped through the Popen API, its usage is lost
+            usage = (0, 0)
+        if self._report is None:
+            return usage
+        with os.fdopen(self._report) as f:
+            report = f.read().split()
+        self._report = None
+        if len(report) != 4:
+            return usage  # The launcher itself failed
+        status, user_us, sys_us, maxrss = map(int, report)
+        self.returncode = os.waitstatus_to_exitcode(status)
+        return _maxrss_kb(maxrss), (user_us + sys_us) / 1e6
+
+
+def limit_message(returncode):
+    """The message for a program killed by one of its rlimits, or None."""
+    return LIMIT_SIGNALS.get(returncode)
@@ -0,0 +1,276 @@
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from editor.utils import execute_code, result_to_dict
+
+# Line comment per language, used to make each source unique for cache misses
+COMMENTS = {
+    'python': '#', 'pypy': '#', 'asm': '#',
+    'c': '//', 'cpp': '//', 'javascript': '//', 'java': '//', 'go': '//',
+    'kotlin': '//', 'dart': '//', 'pascal': '//',
+}
+
+OUTPUT_LINES = 100000
+
+# Programs per language: hello (startup cost), cpu (a few hundred ms of work),
+# output (OUTPUT_LINES lines) and, for compiled languages, compile (a slow build)
+CORPUS = {
+    'python': {
+        'hello': 'print("Hello, World!")\n',
+        'cpu': 's = 0\nfor i in range(3000000):\n    s += i * i % 7\nprint(s)\n',
+        'output': f'import sys\nsys.stdout.write("".join(f"{{i}}\\n" for i in range({OUTPUT_LINES})))\n',
+    },
+    'javascript': {
+        'hello': 'console.log("Hello, World!");\n',
+        'cpu': 'let s = 0;\nfor (let i = 0; i < 30000000; i++) s += i * i % 7;\nconsole.log(s);\n',
+        'output': f'let out = [];\nfor (let i = 0; i < {OUTPUT_LINES}; i++) out.push(i);\nconsole.log(out.join("\\n"));\n',
+    },
+    'c': {
+        'hello': '#include <stdio.h>\nint main() { printf("Hello, World!\\n"); return 0; }\n',
+        'cpu': ('#include <stdio.h>\nint main() { long long s = 0;\n'
+                '    for (long long i = 0; i < 50000000; i++) s += i * i % 7;\n'
+                '    printf("%lld\\n", s); return 0; }\n'),
+        'output': ('#include <stdio.h>\nint main() {\n'
+                   f'    for (int i = 0; i < {OUTPUT_LINES}; i++) printf("%d\\n", i);\n    return 0; }}\n'),
+        'compile': ('#include <stdio.h>\n'
+                    + ''.join(f'int f{i}(int x) {{ return x * {i} + {i % 7}; }}\n' for i in range(3000))
+                    + 'int main() { printf("%d\\n", f2999(1)); return 0; }\n'),
+    },
+    'cpp': {
+        'hello': '#include <iostream>\nint main() { std::cout << "Hello, World!" << std::endl; return 0; }\n',
+        'cpu': ('#include <iostream>\nint main() { long long s = 0;\n'
+                '    for (long long i = 0; i < 50000000; i++) s += i * i % 7;\n'
+                '    std::cout << s << "\\n"; return 0; }\n'),
+        'output': ('#include <cstdio>\nint main() {\n'
+                   f'    for (int i = 0; i < {OUTPUT_LINES}; i++) printf("%d\\n", i);\n    return 0; }}\n'),
+        'compile': ('#include <bits/stdc++.h>\nusing namespace std;\n'
+                    'int main() { map<string, vector<int>> m; m["a"].push_back(1);\n'
+                    '    set<pair<int, string>> s{{1, "a"}}; cout << m.size() + s.size() << "\\n"; return 0; }\n'),
+    },
+    'go': {
+        'hello': 'package main\nimport "fmt"\nfunc main() { fmt.Println("Hello, World!") }\n',
+        'cpu': ('package main\nimport "fmt"\nfunc main() {\n    s := 0\n'
+                '    for i := 0; i < 50000000; i++ { s += i * i % 7 }\n    fmt.Println(s)\n}\n'),
+        'output': ('package main\nimport ("bufio"; "fmt"; "os")\nfunc main() {\n'
+                   '    w := bufio.NewWriter(os.Stdout)\n    defer w.Flush()\n'
+                   f'    for i := 0; i < {OUTPUT_LINES}; i++ {{ fmt.Fprintln(w, i) }}\n}}\n'),
+    },
+    'java': {
+        'hello': 'public class Main { public static void main(String[] a) { System.out.println("Hello, World!"); } }\n',
+        'cpu': ('public class Main { public static void main(String[] a) { long s = 0;\n'
+                '    for (long i = 0; i < 50000000L; i++) s += i * i % 7;\n    System.out.println(s); } }\n'),
+        'output': ('public class Main { public static void main(String[] a) {\n'
+                   '    StringBuilder sb = new StringBuilder();\n'
+                   f'    for (int i = 0; i < {OUTPUT_LINES}; i++) sb.append(i).append(\'\\n\');\n'
+                   '    System.out.print(sb); } }\n'),
+    },
+    'pascal': {
+        'hello': "begin\n  writeln('Hello, World!');\nend.\n",
+        'cpu': 'var i, s: int64;\nbegin\n  s := 0;\n  for i := 0 to 49999999 do s := s + i * i mod 7;\n  writeln(s);\nend.\n',
+        'output': f'var i: longint;\nbegin\n  for i := 0 to {OUTPUT_LINES - 1} do writeln(i);\nend.\n',
+    },
+}
+
+CACHE_MODES = ('hit', 'miss')
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(samples, wall_time):
+    latencies = sorted(sample['latency'] for sample in samples if sample['ok'])
+    summary = {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if not sample['ok']),
+        'throughput': round(len(samples) / wall_time, 2) if wall_time else None,
+        'compile_cache_hits': sum(1 for sample in samples if sample['compile_cached']),
+        'result_cache_hits': sum(1 for sample in samples if sample['result_cached']),
+    }
+    for name, pct in (('p50', 50), ('p95', 95), ('p99', 99)):
+        value = percentile(latencies, pct)
+        summary[name] = round(value, 4) if value is not None else None
+    summary['mean'] = round(statistics.fmean(latencies), 4) if latencies else None
+    summary['max'] = round(latencies[-1], 4) if latencies else None
+    return summary
+
+
+class HttpRunner:
+    """
+    POSTs to /run/ of a running server, with the CSRF cookie and session the
+    editor page sets. All the runs are one client to the server's RUN_LIMITS,
+    so a 429 stops the benchmark rather than being measured.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+        self.opener.open(self.base_url + '/', timeout=30).read()
+        self.csrf_token = next((c.value for c in self.cookies if c.name == 'csrftoken'), '')
+
+    def __call__(self, code, language):
+        request = urllib.request.Request(
+            self.base_url + '/run/',
+            data=json.dumps({'code': code, 'language': language}).encode('utf-8'),
+            headers={'Content-Type': 'application/json', 'X-CSRFToken': self.csrf_token,
+                     'Referer': self.base_url + '/'},
+        )
+        try:
+            with self.opener.open(request, timeout=120) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as e:
+            if e.code == 429:
+                raise CommandError(
+                    f"The server rate-limited the benchmark (HTTP 429, Retry-After: {e.headers.get('Retry-After')}s). "
+                    "Benchmark a server with RUN_LIMITS raised or off, e.g. RUN_LIMITS = {'session': None, 'ip': None}."
+                )
+            return {'error': f"HTTP {e.code}"}
+
+
+def run_execute(code, language):
+    return result_to_dict(execute_code(code, language))
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark runs: latency percentiles and throughput per language, program and cache path. "
+        "With --target http every run comes from one session and IP, so the server must run with "
+        "RUN_LIMITS raised or off (e.g. {'session': None, 'ip': None}); a 429 stops the benchmark."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=['execute', 'http'], default='execute',
+                            help="Call execute_code in this process, or POST to /run/ of a server (--url) "
+                                 "whose RUN_LIMITS are raised or off.")
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="Server for --target http.")
+        parser.add_argument('--languages', nargs='+', help="Default: every configured language with a corpus.")
+        parser.add_argument('--programs', nargs='+', choices=['hello', 'cpu', 'output', 'compile'],
+                            default=['hello', 'cpu', 'output', 'compile'])
+        parser.add_argument('--cache', nargs='+', choices=CACHE_MODES, default=list(CACHE_MODES),
+                            help="hit: the same source every time (after a warm-up run), miss: a unique source per run.")
+        parser.add_argument('--concurrency', type=int, default=4, help="Runs in flight at once.")
+        parser.add_argument('--requests', type=int, default=20, help="Runs per language, program and cache mode.")
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+        parser.add_argument('--compare', help="Earlier results (JSON) to compare against.")
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError("--concurrency and --requests must be at least 1.")
+        languages = options['languages'] or [
+            lang for lang in getattr(settings, 'COMPILER_PATHS', {}) if lang in CORPUS
+        ]
+        unknown = [lang for lang in languages if lang not in CORPUS]
+        if unknown:
+            raise CommandError(f"No benchmark programs for: {', '.join(unknown)}")
+        run = HttpRunner(options['url']) if options['target'] == 'http' else run_execute
+
+        results = []
+        for language in languages:
+            for program in options['programs']:
+                code = CORPUS[language].get(program)
+                if code is None:
+                    continue  # No compile-heavy program for interpreted languages
+                for mode in options['cache']:
+                    result = self.bench(run, language, program, code, mode,
+                                        options['concurrency'], options['requests'])
+                    results.append(result)
+                    self.report(result)
+
+        report = {'meta': self.meta(options), 'results': results}
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                self.compare(json.load(f), report)
+
+    def bench(self, run, language, program, code, mode, concurrency, requests):
+        comment = COMMENTS.get(language, '//')
+        if mode == 'hit':
+            run(code, language)  # Warm-up: fills the compile (and result) cache
+            sources = [code] * requests
+        else:
+            # The comment changes the cache keys, not the program
+            sources = [f"{code}\n{comment} bench {uuid.uuid4().hex}\n" for _ in range(requests)]
+
+        def one(source):
+            start = time.perf_counter()
+            data = run(source, language)
+            latency = time.perf_counter() - start
+            return {
+                'latency': latency,
+                'ok': 'error' not in data and data.get('success', False),
+                'compile_cached': bool(data.get('compile', {}).get('cached')),
+                'result_cached': bool(data.get('cached')),
+            }
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(one, sources))
+        wall_time = time.perf_counter() - start
+        return {'language': language, 'program': program, 'cache': mode, **summarize(samples, wall_time)}
+
+    def report(self, result):
+        line = (f"{result['language']:<11} {result['program']:<8} {result['cache']:<5}"
+                f" {result['throughput']:>8} req/s"
+                f"  p50 {result['p50']}s  p95 {result['p95']}s  p99 {result['p99']}s")
+        if result['errors']:
+            self.stdout.write(self.style.ERROR(f"{line}  errors {result['errors']}/{result['requests']}"))
+        else:
+            self.stdout.write(line)
+
+    def meta(self, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, timeout=5
+            ).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            commit = None
+        return {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'commit': commit,
+            'host': platform.node(),
+            'cpus': os.cpu_count(),
+            'target': options['target'],
+            'concurrency': options['concurrency'],
+            'requests': options['requests'],
+            'settings': {
+                name: getattr(settings, name, None)
+                for name in ('EXECUTION_TIMEOUT', 'RUN_WORKERS', 'RUN_QUEUE_SIZE',
+                             'RESULT_CACHE_ENABLED', 'SANDBOX_ROOT', 'COMPILER_FLAGS')
+            },
+        }
+
+    def compare(self, before, after):
+        """Prints p50/p95 and throughput changes for the scenarios both runs have."""
+        previous = {(r['language'], r['program'], r['cache']): r for r in before.get('results', [])}
+        self.stdout.write(f"\nCompared with {before.get('meta', {}).get('commit') or 'earlier run'}:")
+        for result in after['results']:
+            old = previous.get((result['language'], result['program'], result['cache']))
+            if old is None:
+                continue
+            changes = []
+            for name in ('p50', 'p95', 'throughput'):
+                if old.get(name) and result.get(name) is not None:
+                    changes.append(f"{name} {(result[name] - old[name]) / old[name]:+.1%}")
+            self.stdout.write(f"{result['language']:<11} {result['program']:<8} {result['cache']:<5} {'  '.join(changes)}")
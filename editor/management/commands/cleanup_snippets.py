@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from editor.models import Snippet
+
+
+class Command(BaseCommand):
+    help = "Delete shared snippets that haven't been shared for SNIPPET_RETENTION_DAYS days."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, help="Retention in days (default: SNIPPET_RETENTION_DAYS).")
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be deleted.")
+
+    def handle(self, *args, **options):
+        days = options['days']
+        if days is None:
+            days = getattr(settings, 'SNIPPET_RETENTION_DAYS', None)
+        if days is None:
+            raise CommandError("No retention configured, set SNIPPET_RETENTION_DAYS or pass --days.")
+
+        # created_at is indexed, and bumped each time the same code is shared again
+        expired = Snippet.objects.filter(created_at__lt=timezone.now() - timedelta(days=days))
+        if options['dry_run']:
+            self.stdout.write(f"{expired.count()} snippets would be deleted.")
+            return
+
+        ids = list(expired.values_list('id', flat=True))
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            Snippet.objects.filter(id__in=batch).delete()
+            # Deleted snippets' pages are never served again (see views.get_snippet),
+            # this only frees them early where this process's cache backend can reach
+            cache.delete_many([Snippet.page_cache_key(snippet_id) for snippet_id in batch])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {len(ids)} snippets."))
@@ -0,0 +1,114 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from editor.compile_cache import compile_cache
+from editor.utils import CACHEABLE_LANGUAGES, build_precompiled_headers, compile_to_cache
+
+# Source extension -> language, used when warming from files
+EXTENSION_LANGUAGES = {
+    '.c': 'c',
+    '.cpp': 'cpp',
+    '.cc': 'cpp',
+    '.pas': 'pascal',
+    '.go': 'go',
+    '.java': 'java',
+    '.kt': 'kotlin',
+    '.s': 'asm',
+}
+
+
+def format_size(num_bytes):
+    size = float(num_bytes)
+    for unit in ['B', 'KB', 'MB']:
+        if size < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+
+class Command(BaseCommand):
+    help = "Inspect, prune or warm the compilation cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'action',
+            nargs='?',
+            default='stats',
+            choices=['stats', 'list', 'prune', 'clear', 'rebuild', 'warm'],
+        )
+        parser.add_argument('files', nargs='*', help="Source files to compile when warming.")
+        parser.add_argument('--limit', type=int, default=20, help="Rows to show for 'list'.")
+        parser.add_argument('--max-bytes', type=int, help="Byte budget for 'prune'.")
+        parser.add_argument('--max-entries', type=int, help="Entry budget for 'prune'.")
+        parser.add_argument('--older-than', type=float, help="For 'prune': also drop entries idle for this many days.")
+        parser.add_argument('--language', help="Language of the files given to 'warm' (default: from extension).")
+
+    def handle(self, *args, **options):
+        action = options['action']
+
+        if action == 'stats':
+            stats = compile_cache.stats()
+            self.stdout.write(f"Cache directory: {compile_cache.root}")
+            self.stdout.write(f"Entries: {stats['entries']} / {stats['max_entries']}")
+            self.stdout.write(f"Size:    {format_size(stats['bytes'])} / {format_size(stats['max_bytes'])}")
+            self.stdout.write(f"Hits:    {stats['hits']}")
+
+        elif action == 'list':
+            for entry in compile_cache.entries(limit=options['limit']):
+                self.stdout.write(
+                    f"{entry['key']}  {format_size(entry['size']):>9}  hits={entry['hits']}"
+                )
+
+        elif action == 'prune':
+            older_than = options['older_than']
+            removed, freed = compile_cache.prune(
+                max_bytes=options['max_bytes'],
+                max_entries=options['max_entries'],
+                older_than=older_than * 86400 if older_than is not None else None,
+            )
+            self.stdout.write(self.style.SUCCESS(f"Removed {removed} entries ({format_size(freed)})."))
+
+        elif action == 'clear':
+            removed, freed = compile_cache.clear()
+            self.stdout.write(self.style.SUCCESS(f"Removed {removed} entries ({format_size(freed)})."))
+
+        elif action == 'rebuild':
+            compile_cache.rebuild_index()
+            self.stdout.write(self.style.SUCCESS(f"Index rebuilt: {compile_cache.stats()['entries']} entries."))
+
+        elif action == 'warm':
+            self.warm(options['files'], options['language'])
+
+    def warm(self, files, language=None):
+        for lang, header, meta in build_precompiled_headers():
+            if meta is None:
+                self.stdout.write(self.style.ERROR(f"<{header}> ({lang}): cannot be precompiled"))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"<{header}> ({lang}): precompiled, saves ~{meta['saved']}s per compile"
+                ))
+
+        sources = []
+        if files:
+            for path in files:
+                lang = language or EXTENSION_LANGUAGES.get(os.path.splitext(path)[1].lower())
+                if lang is None:
+                    raise CommandError(f"Cannot infer language of {path}, use --language.")
+                with open(path, encoding='utf-8') as f:
+                    sources.append((path, lang, f.read()))
+        else:
+            # Default templates shown in the editor are the most common submissions
+            for lang, code in getattr(settings, 'CODE_SNIPPETS', {}).items():
+                if lang in CACHEABLE_LANGUAGES:
+                    sources.append((f"<{lang} snippet>", lang, code))
+
+        if not sources:
+            self.stdout.write("Nothing to warm.")
+            return
+
+        for name, lang, code in sources:
+            ok, message = compile_to_cache(code, lang)
+            style = self.style.SUCCESS if ok else self.style.ERROR
+            self.stdout.write(style(f"{name}: {message}"))
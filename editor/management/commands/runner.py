@@ -0,0 +1,35 @@
+import os
+import socket
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from editor.runner import make_server, parse_address
+
+
+class Command(BaseCommand):
+    help = "Run a runner daemon executing runs for web processes using EXECUTION_BACKEND = 'remote'."
+
+    def add_arguments(self, parser):
+        parser.add_argument('address', help="unix:/path/to/socket or host:port to listen on.")
+        parser.add_argument('--workers', type=int,
+                            help="Runs executed at once (default: RUNNER_WORKERS, or one per CPU core).")
+
+    def handle(self, *args, **options):
+        workers = options['workers'] or getattr(settings, 'RUNNER_WORKERS', None) or os.cpu_count() or 1
+        address = options['address']
+        try:
+            family, target = parse_address(address)
+            server = make_server(address, workers)
+        except (ValueError, OSError) as e:
+            raise CommandError(f"Can't listen on {address}: {e}")
+
+        self.stdout.write(f"Runner listening on {address} with {workers} workers (pid {os.getpid()}).")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if family == socket.AF_UNIX and os.path.exists(target):
+                os.remove(target)
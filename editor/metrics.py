@@ -0,0 +1,191 @@
+"""
+Counters and histograms for the execution pipeline, exposed at /metrics in
+the Prometheus text format.
+
+execute_code (and the async and batch paths) time each phase of a run with a
+RunTimer: cache_lookup, sandbox (getting a work directory), prepare (writing
+the source and compiling, or linking the cached build), execute, collect
+(created files) and cleanup. Timings go into webide_phase_seconds per
+language and, when a request asks for "timings", into the response.
+
+Metrics live in the memory of each server process; with several worker
+processes, each one reports its own (scrape them individually or run one
+process). Recording is a dict update under a lock, cheap enough to stay on
+for every run.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from . import limits
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(labels[name] for name in self.labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(Metric):
+    """A value read when metrics are rendered: collect() returns {label values tuple: value}."""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), collect=None):
+        super().__init__(name, documentation, labels)
+        self.collect = collect
+
+    def _samples(self):
+        values = self.collect() if self.collect is not None else {}
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+                for key, value in sorted(values.items())]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=TIME_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # One count per bucket plus +Inf, then the sum
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def _samples(self):
+        with self._lock:
+            values = sorted((key, list(counts)) for key, counts in self._values.items())
+        lines = []
+        for key, counts in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                le = (('le', bound if bound == '+Inf' else _format_value(bound)),)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(round(counts[-1], 6))}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+RUNS = Counter('webide_runs_total', "Runs by language and outcome.", ['language', 'outcome'])
+PHASE_SECONDS = Histogram('webide_phase_seconds', "Wall-clock time per phase of a run.", ['language', 'phase'])
+CPU_SECONDS = Histogram('webide_cpu_seconds', "CPU time used by programs.", ['language'])
+COMPILE_SECONDS = Histogram('webide_compile_seconds', "Time spent in the compiler (compile cache misses).", ['language'])
+COMPILE_CACHE = Counter('webide_compile_cache_total', "Compile cache lookups.", ['language', 'result'])
+RESULT_CACHE = Counter('webide_result_cache_total', "Result cache lookups.", ['language', 'result'])
+OUTPUT_BYTES = Counter('webide_output_bytes_total', "Bytes programs wrote, including dropped output.", ['language', 'stream'])
+QUEUE_WAIT_SECONDS = Histogram('webide_queue_wait_seconds', "Time jobs waited in the run queue.")
+RUNS_THROTTLED = Counter('webide_runs_throttled_total', "Runs refused by a rate limit (see scheduler.py).", ['limit'])
+
+
+def outcome(returncode, extra):
+    """Outcome label of a run that got as far as executing (returncode None = timeout)."""
+    if returncode is None:
+        return 'timeout'
+    if extra.get('output_limit_exceeded'):
+        return 'output_limit'
+    if limits.limit_message(returncode):
+        return 'resource_limit'
+    if extra.get('check', {}).get('passed') is False:
+        return 'wrong_answer'
+    return 'ok' if returncode == 0 else 'runtime_error'
+
+
+class RunTimer:
+    """Times the phases of one run."""
+
+    def __init__(self, language):
+        self.language = language
+        self.timings = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        self.timings[name] = round(self.timings.get(name, 0) + seconds, 4)
+        PHASE_SECONDS.observe(seconds, language=self.language, phase=name)
+
+
+def record_compile(language, extra):
+    """Counts the compile step described by extra['compile'], if there was one."""
+    compile_info = extra.get('compile')
+    if compile_info is None:
+        return
+    COMPILE_CACHE.inc(language=language, result='hit' if compile_info['cached'] else 'miss')
+    if not compile_info['cached']:
+        COMPILE_SECONDS.observe(compile_info['time'], language=language)
+
+
+def record_run(language, run_outcome, extra):
+    """Counts a finished run and what execute_code left in `extra` (compile info, CPU time)."""
+    RUNS.inc(language=language, outcome=run_outcome)
+    record_compile(language, extra)
+    if 'cpu_time' in extra:
+        CPU_SECONDS.observe(extra['cpu_time'], language=language)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,60 @@
+import hashlib
+import zlib
+
+from django.db import migrations, models
+
+
+def compress_code(apps, schema_editor):
+    Snippet = apps.get_model('editor', 'Snippet')
+    for snippet in Snippet.objects.all().iterator():
+        snippet.compressed_code = zlib.compress(snippet.code.encode('utf-8'), 6)
+        snippet.content_hash = hashlib.sha256(
+            f"{snippet.language}\0{snippet.code}".encode('utf-8')
+        ).hexdigest()
+        snippet.save(update_fields=['compressed_code', 'content_hash'])
+
+
+def decompress_code(apps, schema_editor):
+    Snippet = apps.get_model('editor', 'Snippet')
+    for snippet in Snippet.objects.all().iterator():
+        snippet.code = zlib.decompress(bytes(snippet.compressed_code)).decode('utf-8')
+        snippet.save(update_fields=['code'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('editor', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='snippet',
+            name='compressed_code',
+            field=models.BinaryField(default=b''),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='snippet',
+            name='content_hash',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=64),
+            preserve_default=False,
+        ),
+        # Lets the removal below be reversed on a table with rows
+        migrations.AlterField(
+            model_name='snippet',
+            name='code',
+            field=models.TextField(default=''),
+        ),
+        # Existing rows keep their ids (they are live share links), duplicates included
+        migrations.RunPython(compress_code, decompress_code),
+        migrations.RemoveField(
+            model_name='snippet',
+            name='code',
+        ),
+        migrations.AlterField(
+            model_name='snippet',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
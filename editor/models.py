@@ -1,11 +1,42 @@
 from django.db import models
+import hashlib
 import uuid
+import zlib
 
 class Snippet(models.Model):
+    """
+    Shared code. Identical code in the same language is stored once (looked up
+    by content_hash) and kept zlib-compressed; use the `code` property.
+    created_at is bumped whenever the same code is shared again, so retention
+    (SNIPPET_RETENTION_DAYS) counts from the last share.
+    """
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    code = models.TextField()
+    content_hash = models.CharField(max_length=64, db_index=True, editable=False)
+    compressed_code = models.BinaryField()
     language = models.CharField(max_length=50)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    @staticmethod
+    def hash_content(code, language):
+        return hashlib.sha256(f"{language}\0{code}".encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def page_cache_key(snippet_id):
+        """Cache key of the rendered share page (see views.get_snippet)."""
+        return f"snippet-page:{snippet_id}"
+
+    @property
+    def code(self):
+        return zlib.decompress(bytes(self.compressed_code)).decode('utf-8')
+
+    @code.setter
+    def code(self, value):
+        self.compressed_code = zlib.compress(value.encode('utf-8'), 6)
+
+    def save(self, *args, **kwargs):
+        if not self.content_hash:
+            self.content_hash = self.hash_content(self.code, self.language)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.language} snippet ({self.id})"
@@ -0,0 +1,146 @@
+"""
+Incremental capture of a program's stdout/stderr.
+
+Pipes are read in chunks while the program runs instead of buffering
+everything with communicate(). Only the first MAX_OUTPUT_SIZE bytes are kept
+for the response, and as soon as a stream goes past OUTPUT_LIMIT bytes the
+program is killed, so a print loop can't fill memory before the timeout
+fires. Kept chunks can also be forwarded to a callback to stream output to the
+client live, and all of stdout to a checker that judges it against an expected
+output (checker.py). The checker runs in a thread of its own, so the pipe is
+drained at full speed and checking doesn't hold the program back; close() the
+capture to wait for it once the stream has ended.
+"""
+import codecs
+import queue
+import threading
+
+from django.conf import settings
+
+# Max output size in bytes kept per stream to prevent memory overflow
+MAX_OUTPUT_SIZE = 50000  # 50KB
+
+# Bytes a stream may produce in total before the program is killed
+DEFAULT_OUTPUT_LIMIT = 1024 * 1024  # 1MB
+
+CHUNK_SIZE = 65536
+
+
+class OutputCapture:
+    """
+    on_limit() is called once the program should be stopped: when it goes past
+    OUTPUT_LIMIT, or at the first mismatch found by `checker` (see checker.py),
+    which is fed the whole stream rather than just the kept part (from its own
+    thread, on_limit() included).
+    """
+
+    def __init__(self, stream, truncated_notice, on_output=None, on_limit=None, checker=None):
+        self.stream = stream
+        self.truncated_notice = truncated_notice
+        self.on_output = on_output
+        self.on_limit = on_limit
+        self.checker = checker
+        self.keep = MAX_OUTPUT_SIZE
+        self.limit = max(getattr(settings, 'OUTPUT_LIMIT', DEFAULT_OUTPUT_LIMIT), self.keep)
+        self._check_thread = None
+        if checker is not None:
+            # Judged as it streams, so a long expected output is fine
+            self.limit = max(self.limit, 2 * checker.expected_size)
+            self._check_decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            self._check_queue = queue.SimpleQueue()
+            self._check_thread = threading.Thread(target=self._check, daemon=True)
+            self._check_thread.start()
+        self.total = 0
+        self.kept = 0
+        self.limit_exceeded = False
+        self.mismatch = False
+        self._chunks = []
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+    def wants_more(self):
+        """False once further output would neither be kept nor checked."""
+        if self.limit_exceeded or self.mismatch:
+            return False
+        return self.kept < self.keep or self.checker is not None
+
+    def feed(self, data):
+        """Accepts the next chunk of output (bytes)."""
+        if self.limit_exceeded or self.mismatch:
+            return  # Just draining the pipe until the killed program closes it
+        self.total += len(data)
+        if self.kept < self.keep:
+            part = data[:self.keep - self.kept]
+            self._chunks.append(part)
+            self.kept += len(part)
+            if self.on_output is not None:
+                text = self._decoder.decode(part)
+                if text:
+                    self.on_output(self.stream, text)
+        if self.checker is not None:
+            self._check_queue.put(data)
+        if self.total > self.limit:
+            self.limit_exceeded = True
+            if self.on_limit is not None:
+                self.on_limit()
+
+    def _check(self):
+        """Checker thread: judges the chunks queued by feed() until close()."""
+        while True:
+            data = self._check_queue.get()
+            if data is None:
+                return
+            if self.mismatch:
+                continue
+            if not self.checker.feed(self._check_decoder.decode(data)):
+                self.mismatch = True
+                if self.on_limit is not None:
+                    self.on_limit()
+
+    def close(self):
+        """Call once the stream has ended: waits until everything fed so far is checked."""
+        if self._check_thread is not None:
+            self._check_queue.put(None)
+            self._check_thread.join()
+            self._check_thread = None
+
+    def text(self):
+        """The kept output as text, with a notice if some of it was dropped."""
+        text = b"".join(self._chunks).decode('utf-8', errors='replace').replace('\r\n', '\n')
+        if self.total > self.kept:
+            text += self.truncated_notice
+        return text
+
+
+def stdout_capture(on_output=None, on_limit=None, checker=None):
+    return OutputCapture('stdout', "\n... [Output Truncated]", on_output, on_limit, checker)
+
+
+def stderr_capture(on_output=None, on_limit=None):
+    return OutputCapture('stderr', "\n... [Error Truncated]", on_output, on_limit)
+
+
+def pump(pipe, capture):
+    """Thread target: copies a pipe into `capture` until EOF."""
+    try:
+        while True:
+            data = pipe.read1(CHUNK_SIZE)
+            if not data:
+                break
+            capture.feed(data)
+    except (OSError, ValueError):
+        pass
+    finally:
+        pipe.close()
+
+
+def feed_stdin(pipe, data):
+    """Thread target: writes the program input and closes stdin."""
+    try:
+        pipe.write(data)
+    except (OSError, ValueError):
+        pass  # The program exited without reading all of its input
+    finally:
+        try:
+            pipe.close()
+        except OSError:
+            pass
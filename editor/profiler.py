@@ -0,0 +1,204 @@
+"""
+Profile run mode: where a program spends its time.
+
+A run sent with "profile": true is built and run differently, and its result
+gets a "profile" with the hottest functions (at most PROFILE_TOP of them):
+
+    python, pypy   cProfile, through runners/pyprofile.py. Calls, self and
+                   total seconds per function.
+    c, cpp         built with -pg (never from or into the compile cache) and
+                   read back with gprof's flat profile. Calls, self and total
+                   seconds; time is sampled every 10ms, so short programs may
+                   only show call counts.
+    java, kotlin   Java Flight Recorder's method sampler, read back with `jfr`.
+                   Samples per method: "self" counts samples where the method
+                   was running, "total" where it was on the stack.
+
+Every row has "name" and "percent" (of self time, or of samples); the other
+fields are null when the tool doesn't measure them.
+
+The profilers only write their data when the program ends normally, so a
+profiled program is stopped just before EXECUTION_TIMEOUT (at
+PROFILE_STOP_FRACTION of it) and reports what it did until then, which is
+what a program that times out needs. Profiled runs skip the result cache and
+the interpreter and JVM pools; normal runs are untouched by any of this.
+"""
+import collections
+import json
+import os
+import re
+import shutil
+import subprocess
+import time
+
+from django.conf import settings
+
+from .projects import is_project
+
+RUNNERS_DIR = os.path.join(os.path.dirname(__file__), 'runners')
+PYTHON_PROFILER = os.path.join(RUNNERS_DIR, 'pyprofile.py')
+TIMER_SOURCE = os.path.join(RUNNERS_DIR, 'profile_timer.c')
+
+PROFILED_LANGUAGES = ("python", "pypy", "c", "cpp", "java", "kotlin")
+
+DEFAULT_TOP = 15
+PROFILE_STOP_FRACTION = 0.9
+TOOL_TIMEOUT = 30  # Seconds for gprof / jfr to read a profile
+MAX_PROFILE_BYTES = 1024 * 1024  # Of the JSON pyprofile.py writes
+
+# Files the profile mode adds to the work directory
+PYTHON_OUTPUT = '.webide-profile.json'
+TIMER_NAME = 'webide_profile_timer.c'
+GMON = 'gmon.out'
+JFR_OUTPUT = 'profile.jfr'
+
+# A row of gprof's flat profile: % time, cumulative s, self s, [calls, self ms/call, total ms/call,] name
+GPROF_ROW = re.compile(
+    r'^\s*([\d.]+)\s+([\d.]+)\s+([\d.]+)(?:\s+(\d+)\s+([\d.]+)\s+([\d.]+))?\s+(\S.*)$'
+)
+
+
+def top():
+    return getattr(settings, 'PROFILE_TOP', DEFAULT_TOP)
+
+
+def _stop_ms(timeout):
+    return max(1, int(timeout * PROFILE_STOP_FRACTION * 1000))
+
+
+def prepare_profiled_run(code, language, temp_dir, extra, timeout):
+    """
+    prepare_run for the profile mode. Returns (filename, cmd, exclude, error);
+    exclude lists what to leave out of the created files.
+    """
+    from .utils import _run_compiler, _write_source, get_language_config, prepare_run  # utils imports this module
+    if language not in PROFILED_LANGUAGES:
+        return None, None, [], f"Profiling is not supported for {language}."
+
+    if language in ("c", "cpp"):
+        if is_project(code):
+            return None, None, [], "Profiling multi-file C/C++ projects is not supported."
+        filename, compile_cmd, cmd, artifacts = get_language_config(language, temp_dir)
+        flags = getattr(settings, 'COMPILER_FLAGS', {}).get(language, [])
+        _write_source(code, temp_dir, filename)
+        shutil.copy(TIMER_SOURCE, os.path.join(temp_dir, TIMER_NAME))
+        start_time = time.perf_counter()
+        error = _run_compiler([
+            compile_cmd[0], *flags, "-pg", "-no-pie", f"-DWEBIDE_PROFILE_MS={_stop_ms(timeout)}",
+            filename, TIMER_NAME, "-o", "main.exe",
+        ], temp_dir)
+        extra['compile'] = {'cached': False, 'time': round(time.perf_counter() - start_time, 3)}
+        return filename, cmd, [*artifacts, TIMER_NAME, GMON], error
+
+    filename, cmd, artifacts, error = prepare_run(code, language, temp_dir, extra)
+    if error:
+        return filename, cmd, artifacts, error
+    if language in ("python", "pypy"):
+        cmd = [cmd[0], PYTHON_PROFILER, PYTHON_OUTPUT, str(top()), str(_stop_ms(timeout)), *cmd[1:]]
+        return filename, cmd, [*artifacts, PYTHON_OUTPUT], None
+    # JVM: the recording is dumped when the program exits, or once it has run for `duration`
+    recording = (f"-XX:StartFlightRecording=filename={JFR_OUTPUT},settings=profile,"
+                 f"dumponexit=true,duration={_stop_ms(timeout)}ms")
+    return filename, [cmd[0], recording, *cmd[1:]], [*artifacts, JFR_OUTPUT], None
+
+
+def collect(language, temp_dir, cmd):
+    """The "profile" of a profiled run whose files are still in temp_dir."""
+    try:
+        if language in ("python", "pypy"):
+            profile = _read_python_profile(temp_dir)
+        elif language in ("c", "cpp"):
+            profile = _read_gprof(temp_dir)
+        else:
+            profile = _read_jfr(temp_dir, cmd[0])
+    except (OSError, ValueError, KeyError, TypeError, subprocess.SubprocessError) as e:
+        return {'error': f"Couldn't read the profile: {e}"}
+    if profile is None:
+        return {'error': "No profile was written (the program was killed, or exited abnormally)."}
+    return profile
+
+
+def _row(name, calls=None, self_time=None, total_time=None, percent=0.0):
+    return {'name': name, 'calls': calls, 'self': self_time, 'total': total_time, 'percent': percent}
+
+
+def _read_python_profile(temp_dir):
+    path = os.path.join(temp_dir, PYTHON_OUTPUT)
+    if not os.path.exists(path):
+        return None
+    # Written from inside the user's program: only trust its shape
+    with open(path, encoding='utf-8') as f:
+        data = json.loads(f.read(MAX_PROFILE_BYTES))
+    functions = [
+        _row(str(row['name'])[:200], int(row['calls']), float(row['self']), float(row['total']), float(row['percent']))
+        for row in data['functions'][:top()]
+    ]
+    return {'tool': 'cProfile', 'total_time': float(data['total_time']), 'functions': functions}
+
+
+def _read_gprof(temp_dir):
+    if not os.path.exists(os.path.join(temp_dir, GMON)):
+        return None
+    gprof = getattr(settings, 'COMPILER_PATHS', {}).get('gprof', 'gprof')
+    proc = subprocess.run(
+        [gprof, "-b", "-p", "main.exe", GMON],
+        cwd=temp_dir, capture_output=True, text=True, timeout=TOOL_TIMEOUT
+    )
+    if proc.returncode != 0:
+        raise ValueError(proc.stderr.strip() or f"gprof exited with {proc.returncode}")
+    functions = []
+    total = 0.0
+    for line in proc.stdout.splitlines():
+        match = GPROF_ROW.match(line)
+        if match is None:
+            continue
+        percent, _, self_time, calls, _, total_ms, name = match.groups()
+        if name.startswith('webide_profile_'):
+            continue
+        total += float(self_time)
+        calls = int(calls) if calls is not None else None
+        functions.append(_row(
+            name, calls, float(self_time),
+            round(float(total_ms) * calls / 1000, 6) if calls is not None else None,
+            float(percent),
+        ))
+    return {'tool': 'gprof', 'total_time': round(total, 6), 'functions': functions[:top()]}
+
+
+def _jfr_binary(java):
+    """`jfr` of the same JDK as `java`."""
+    java = shutil.which(java) or java
+    candidate = os.path.join(os.path.dirname(os.path.realpath(java)), 'jfr')
+    return candidate if os.path.exists(candidate) else 'jfr'
+
+
+def _frame_name(frame):
+    method = frame['method']
+    return f"{method['type']['name']}.{method['name']}"
+
+
+def _read_jfr(temp_dir, java):
+    if not os.path.exists(os.path.join(temp_dir, JFR_OUTPUT)):
+        return None
+    proc = subprocess.run(
+        [_jfr_binary(java), "print", "--json", "--events", "jdk.ExecutionSample", JFR_OUTPUT],
+        cwd=temp_dir, capture_output=True, text=True, timeout=TOOL_TIMEOUT
+    )
+    if proc.returncode != 0:
+        raise ValueError(proc.stderr.strip() or f"jfr exited with {proc.returncode}")
+    self_samples = collections.Counter()
+    total_samples = collections.Counter()
+    samples = 0
+    for event in json.loads(proc.stdout)['recording']['events']:
+        frames = (event['values'].get('stackTrace') or {}).get('frames') or []
+        if not frames:
+            continue
+        samples += 1
+        self_samples[_frame_name(frames[0])] += 1
+        for name in {_frame_name(frame) for frame in frames}:
+            total_samples[name] += 1
+    functions = [
+        _row(name, None, count, total_samples[name], round(100 * count / samples, 1))
+        for name, count in self_samples.most_common(top())
+    ]
+    return {'tool': 'jfr', 'samples': samples, 'functions': functions}
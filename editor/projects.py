@@ -0,0 +1,254 @@
+"""
+Multi-file projects.
+
+Instead of "code", a run may send "files": {path: source}. Interpreted
+languages get every file written into the work directory and run their usual
+entry point (main.py, main.js, ...), which can import the others.
+
+C and C++ projects are built incrementally. Each translation unit (.c, .cpp,
+...) is compiled on its own into an object file that goes into the compile
+cache, keyed by the unit's path and source, the project headers it includes
+(transitively, following `#include "..."`), the compiler, its version and the
+flags. Only units whose key isn't cached are compiled, in parallel
+(PROJECT_COMPILE_WORKERS at a time, default: one per CPU core). The link is
+cached too, keyed by the object keys, so an unchanged project builds nothing
+and a one-line edit recompiles one unit and relinks.
+
+A unit with a computed include (`#include SOME_MACRO`) depends on every
+header of the project, since which one it includes can't be known without
+running the preprocessor.
+"""
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from . import toolchains
+from .compile_cache import compile_cache, copy_artifacts, link_or_copy
+from .sandbox import sandbox_pool
+
+UNIT_EXTENSIONS = {
+    "c": (".c",),
+    "cpp": (".cpp", ".cc", ".cxx", ".c++"),
+}
+INTERPRETED_LANGUAGES = ("python", "pypy", "javascript", "dart")
+PROJECT_LANGUAGES = (*UNIT_EXTENSIONS, *INTERPRETED_LANGUAGES)
+
+DEFAULT_MAX_FILES = 50
+COMPILE_TIMEOUT = 10  # Seconds per unit, and for the link
+
+# Relative paths of plain names: no "..", no absolute paths, no hidden files
+PATH = re.compile(r'[A-Za-z0-9_+-][A-Za-z0-9_.+-]*(/[A-Za-z0-9_+-][A-Za-z0-9_.+-]*)*')
+INCLUDE = re.compile(r'^[ \t]*#[ \t]*include[ \t]*(?:"([^"\n]+)"|<[^>\n]+>|(\S+))', re.M)
+
+
+def is_project(code):
+    return isinstance(code, dict)
+
+
+def joined_source(code):
+    """All the source of a run, for checks that look at the code as text."""
+    if is_project(code):
+        return "\n".join(code[path] for path in sorted(code))
+    return code
+
+
+def project_hash(files):
+    return hashlib.sha256(json.dumps(files, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def validate(files, language, entry):
+    """Error message for an invalid project (entry: the language's main file), or None."""
+    if language not in PROJECT_LANGUAGES:
+        return f'Multi-file projects are not supported for "{language}".'
+    if not isinstance(files, dict) or not files:
+        return '"files" must be a non-empty object of {path: source}.'
+    max_files = getattr(settings, 'PROJECT_MAX_FILES', DEFAULT_MAX_FILES)
+    if len(files) > max_files:
+        return f'Too many files (maximum {max_files}).'
+    for path, source in files.items():
+        if not PATH.fullmatch(path) or len(path) > 255:
+            return f'Invalid file name "{path}".'
+        if not isinstance(source, str):
+            return f'The source of "{path}" must be a string.'
+    for path in files:
+        # "a" and "a/b" can't both be written: a would be a file and a directory
+        parts = path.split('/')
+        for depth in range(1, len(parts)):
+            directory = '/'.join(parts[:depth])
+            if directory in files:
+                return f'"{directory}" is both a file and a directory.'
+    if language in UNIT_EXTENSIONS:
+        if not _units(files, language):
+            return f'No {"/".join(UNIT_EXTENSIONS[language])} file to compile.'
+    elif entry not in files:
+        return f'Missing the entry point "{entry}".'
+    return None
+
+
+def write_files(files, directory):
+    for path, source in files.items():
+        target = os.path.join(directory, *path.split('/'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "w", encoding="utf-8") as f:
+            f.write(source)
+
+
+def top_level_names(files):
+    """Names the project occupies in the work directory (kept out of created files)."""
+    return sorted({path.split('/', 1)[0] for path in files})
+
+
+def _units(files, language):
+    return sorted(path for path in files if path.endswith(UNIT_EXTENSIONS[language]))
+
+
+def _includes(files, path):
+    """
+    Project files that `path` includes, directly or not; None if one of them
+    is a computed include. Quoted includes are looked up next to the including
+    file, then at the project root (which is on the -iquote path).
+    """
+    found = set()
+    pending = [path]
+    while pending:
+        current = pending.pop()
+        for quoted, computed in INCLUDE.findall(files[current]):
+            if computed:
+                return None
+            if not quoted:
+                continue  # <system header>
+            for candidate in (posixpath.join(posixpath.dirname(current), quoted), quoted):
+                candidate = posixpath.normpath(candidate)
+                if candidate in files:
+                    if candidate not in found:
+                        found.add(candidate)
+                        pending.append(candidate)
+                    break
+    return found
+
+
+def _unit_key(files, language, unit, toolchain):
+    headers = _includes(files, unit)
+    if headers is None:
+        headers = set(files) - set(_units(files, language))
+    parts = [*toolchain, "unit", unit, files[unit]]
+    for header in sorted(headers - {unit}):
+        parts += [header, files[header]]
+    return hashlib.sha256("\0\0".join(parts).encode('utf-8')).hexdigest()
+
+
+def _run(cmd, cwd):
+    """Runs a compiler step. Returns None on success, otherwise its output."""
+    try:
+        proc = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True, timeout=COMPILE_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        return "Timed out"
+    except OSError as e:
+        return str(e)
+    if proc.returncode != 0:
+        return f"{proc.stderr}\n{proc.stdout}".strip()
+    return None
+
+
+def _compile_unit(compile_prefix, unit, key, build_dir):
+    """
+    Puts the object of `unit` at build_dir/<key>.o, from the cache or by compiling it.
+    Returns (cached, error).
+    """
+    object_name = key + ".o"
+    target = os.path.join(build_dir, object_name)
+    with compile_cache.lock(key, timeout=COMPILE_TIMEOUT + 5):
+        entry = compile_cache.get(key)
+        if entry is not None:
+            try:
+                link_or_copy(os.path.join(entry, object_name), target)
+                return True, None
+            except (OSError, shutil.Error):
+                pass  # Evicted since the lookup
+        error = _run([*compile_prefix, "-c", unit, "-o", object_name], build_dir)
+        if error is None:
+            compile_cache.put(key, build_dir, [object_name])
+    return False, error
+
+
+def workers():
+    return getattr(settings, 'PROJECT_COMPILE_WORKERS', None) or os.cpu_count() or 1
+
+
+def build(files, language, compile_cmd, temp_dir):
+    """
+    Puts main.exe for a C/C++ project into temp_dir, reusing cached objects and
+    links. compile_cmd is the language's single-file command, for its compiler
+    and flags. Returns (error, compile_info); error is None on success.
+    """
+    start_time = time.perf_counter()
+    compiler = compile_cmd[0]
+    flags = getattr(settings, 'COMPILER_FLAGS', {}).get(language, [])
+    compile_prefix = [compiler, *flags, "-iquote", "."]
+    toolchain = [
+        language,
+        shutil.which(compiler) or compiler,
+        toolchains.get_version(language, compiler),
+        "\0".join(compile_prefix),
+    ]
+    units = _units(files, language)
+    keys = {unit: _unit_key(files, language, unit, toolchain) for unit in units}
+    link_cmd = [compiler, *[keys[unit] + ".o" for unit in units], *flags, "-o", "main.exe"]
+    link_key = hashlib.sha256("\0\0".join([*toolchain, "link", "\0".join(link_cmd)]).encode('utf-8')).hexdigest()
+    compile_info = {'cached': False, 'units': {}}
+
+    error = None
+    entry = compile_cache.get(link_key)
+    if entry is not None:
+        try:
+            copy_artifacts(entry, temp_dir, ["main.exe"])
+            compile_info['cached'] = True
+            compile_info['units'] = {unit: 'cached' for unit in units}
+        except (OSError, shutil.Error):
+            entry = None
+    if entry is None:
+        with sandbox_pool.workdir() as build_dir:
+            write_files(files, build_dir)
+            with ThreadPoolExecutor(max_workers=min(workers(), len(units))) as pool:
+                results = list(pool.map(
+                    lambda unit: _compile_unit(compile_prefix, unit, keys[unit], build_dir), units
+                ))
+            errors = []
+            for unit, (cached, unit_error) in zip(units, results):
+                compile_info['units'][unit] = 'cached' if cached else 'compiled'
+                if unit_error:
+                    errors.append(unit_error)
+            if errors:
+                error = "Compilation Error:\n" + "\n".join(errors)
+            else:
+                link_error = _run(link_cmd, build_dir)
+                if link_error is not None:
+                    error = f"Link Error:\n{link_error}"
+                else:
+                    compile_cache.put(link_key, build_dir, ["main.exe"])
+                    link_or_copy(os.path.join(build_dir, "main.exe"), os.path.join(temp_dir, "main.exe"))
+
+    compile_info['time'] = round(time.perf_counter() - start_time, 3)
+    return error, compile_info
+
+
+def prepare(files, language, temp_dir, extra, config):
+    """
+    prepare_run for a project: builds or writes it into temp_dir. config is
+    get_language_config's answer. Returns (filename, cmd, artifacts, error).
+    """
+    filename, compile_cmd, cmd, artifacts = config
+    if language in UNIT_EXTENSIONS:
+        error, extra['compile'] = build(files, language, compile_cmd, temp_dir)
+        return filename, cmd, artifacts, error
+    write_files(files, temp_dir)
+    # Reported as sources rather than created files, and copied for each batch case
+    return filename, cmd, top_level_names(files), None
@@ -0,0 +1,161 @@
+"""
+Opt-in memoization of run results (RESULT_CACHE_ENABLED).
+
+Running unchanged code on unchanged input gives the same result for most
+exercises, so execute_code can answer repeats from a cache keyed on
+get_code_hash(code, language), a hash of the input and the settings that
+affect a run. Entries live in a small per-process LRU (RESULT_CACHE_MEMORY_BYTES)
+in front of the "results" Django cache (CACHES), which by default is on disk,
+shared by all server processes, and expires entries after RESULT_CACHE_TTL.
+
+Not everything can be replayed. Code that looks like it reads the clock,
+randomness, the environment or files, or starts threads, is never cached
+(the check is deliberately broad, a false positive only costs a rerun).
+Neither are results of runs that timed out, hit the CPU limit or created
+files. Clients can also skip the cache per request with "no_cache".
+"""
+import collections
+import hashlib
+import json
+import pickle
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+
+from . import limits
+from .inputs import input_digest
+from .projects import joined_source
+
+DEFAULT_TTL = 300  # Seconds
+DEFAULT_MEMORY_BYTES = 16 * 1024 * 1024
+CACHE_ALIAS = 'results'
+
+# Results larger than this aren't worth keeping in memory
+MAX_ENTRY_BYTES = 512 * 1024
+
+NONDETERMINISTIC = re.compile(r"""
+    \b(?:random|Random|rand|srand|urandom|secrets|uuid|UUID|mt19937|random_device)\b   # randomness
+  | \b(?:time|ctime|clock|chrono|datetime|Date|now|performance|hrtime|nanoTime
+       |currentTimeMillis|Instant|LocalDateTime)\b                                     # clock
+  | \b(?:getenv|environ|getpid|argv)\b                                               # environment
+  | \b(?:open|fopen|ofstream|ifstream|fstream|File|Files|fs|os|Assign|Rewrite)\b     # files
+  | \b(?:thread|Thread|threading|pthread|goroutine|async|await|Promise)\b | \bgo\s+func\b  # scheduling
+""", re.VERBOSE)
+
+
+def is_enabled():
+    return getattr(settings, 'RESULT_CACHE_ENABLED', False)
+
+
+def looks_deterministic(code):
+    return NONDETERMINISTIC.search(joined_source(code)) is None
+
+
+def _settings_fingerprint(language):
+    """Settings that change what a run produces."""
+    return json.dumps([
+        getattr(settings, 'COMPILER_PATHS', {}).get(language),
+        getattr(settings, 'COMPILER_FLAGS', {}).get(language),
+        getattr(settings, 'EXECUTION_TIMEOUT', 5),
+        getattr(settings, 'EXECUTION_LIMITS', {}),
+        getattr(settings, 'OUTPUT_LIMIT', None),
+    ], sort_keys=True, default=str)
+
+
+def get_result_key(code, language, input_data, code_hash):
+    """Cache key for a run, or None if caching is off or the code isn't deterministic."""
+    if not is_enabled() or not looks_deterministic(code):
+        return None
+    digest = hashlib.sha256()
+    # Text and uploaded inputs with the same bytes share results
+    for part in (code_hash, input_digest(input_data), _settings_fingerprint(language)):
+        digest.update(part.encode('utf-8'))
+        digest.update(b"\0")
+    return "run:" + digest.hexdigest()
+
+
+def is_cacheable(returncode, result):
+    """
+    Whether an execute_code result may be replayed: it created no files and
+    didn't end on a timeout or CPU limit, which depend on the server's load.
+    """
+    if returncode is None or limits.limit_message(returncode):
+        return False
+    return not result[5]
+
+
+class ResultCache:
+    def __init__(self):
+        self._memory = collections.OrderedDict()  # key -> (expires, size, pickled result)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    def _backend(self):
+        try:
+            return caches[CACHE_ALIAS]
+        except InvalidCacheBackendError:
+            return None  # Memory only
+
+    def get(self, key):
+        """The cached execute_code result for `key`, marked with extra['cached'], or None."""
+        now = time.time()
+        data = None
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    data = entry[2]
+                else:
+                    self._drop(key)
+        if data is None:
+            backend = self._backend()
+            data = backend.get(key) if backend is not None else None
+            if data is None:
+                return None
+            self._remember(key, data, now + self._ttl())
+        result = pickle.loads(data)
+        result[6]['cached'] = True
+        return tuple(result)
+
+    def put(self, key, result):
+        data = pickle.dumps(list(result))
+        self._remember(key, data, time.time() + self._ttl())
+        backend = self._backend()
+        if backend is not None:
+            backend.set(key, data, self._ttl())
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        backend = self._backend()
+        if backend is not None:
+            backend.clear()
+
+    def _ttl(self):
+        return getattr(settings, 'RESULT_CACHE_TTL', DEFAULT_TTL)
+
+    def _remember(self, key, data, expires):
+        if len(data) > MAX_ENTRY_BYTES:
+            return
+        limit = getattr(settings, 'RESULT_CACHE_MEMORY_BYTES', DEFAULT_MEMORY_BYTES)
+        with self._lock:
+            self._drop(key)
+            self._memory[key] = (expires, len(data), data)
+            self._memory_bytes += len(data)
+            # Least recently used first
+            while self._memory_bytes > limit and self._memory:
+                self._drop(next(iter(self._memory)))
+
+    def _drop(self, key):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry[1]
+
+
+result_cache = ResultCache()
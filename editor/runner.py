@@ -0,0 +1,237 @@
+"""
+Runner daemon: executes runs on behalf of the web processes.
+
+With EXECUTION_BACKEND = 'remote' the web processes don't compile or run
+anything themselves. Each run is sent to one of RUNNER_NODES (see
+backends.py), each of them a `python manage.py runner <address>` process
+listening on a Unix socket ("unix:/path/to/socket") or on TCP ("host:port").
+Several runners can share a machine, each on its own address.
+
+Protocol: one request per connection. Every message is a frame made of a
+4-byte big-endian length followed by that many bytes of UTF-8 JSON. The client
+sends one of
+
+    {"op": "run", "code", "language", "input", "input_hash", "checker", "use_cache", "timings", "profile", "stream"}
+    {"op": "batch", "code", "language", "cases", "checker_options", "workers"}
+    {"op": "health"}
+
+("input_hash", if set, names a stored input that replaces "input", see
+inputs.py; "checker" is null or {"expected", "mode", "tolerance"}) and the runner
+answers with "output" frames ({"event": "output", "stream", "text"}, for runs
+with "stream" only), then a single {"event": "result", "result"},
+{"event": "health", ...} or {"event": "error", "error"} frame.
+
+A runner executes at most `workers` runs at a time, a batch counting as the
+cases it runs at once; the others wait for slots and count towards the load it
+reports. Runs go through execute_code on
+the runner, so the sandbox pool, compile cache and result cache are the
+runner's. Created files are stored in the runner's ARTIFACT_ROOT and uploaded
+inputs are read from its INPUT_ROOT: the web processes must see the same
+directories (runners on the same machine, or a shared filesystem).
+
+Runners don't authenticate their clients: bind TCP runners to a private
+network only.
+"""
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+
+from . import checker as checkers
+from . import toolchains
+from .batch import run_batch, worker_count as batch_worker_count
+from .inputs import input_store
+from .utils import execute_code
+
+FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME_SIZE = 256 * 1024 * 1024
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def send_message(sock, message):
+    data = json.dumps(message).encode('utf-8')
+    sock.sendall(FRAME_HEADER.pack(len(data)) + data)
+
+
+def _recv_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(min(size - len(data), 1024 * 1024))
+        if not chunk:
+            raise ConnectionError("Connection closed by peer")
+        data += chunk
+    return bytes(data)
+
+
+def recv_message(sock):
+    (size,) = FRAME_HEADER.unpack(_recv_exactly(sock, FRAME_HEADER.size))
+    if size > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {size} bytes is too large")
+    try:
+        message = json.loads(_recv_exactly(sock, size))
+    except ValueError as e:
+        raise ProtocolError(f"Invalid frame: {e}")
+    if not isinstance(message, dict):
+        raise ProtocolError(f"Invalid frame: expected an object, got {type(message).__name__}")
+    return message
+
+
+def parse_address(address):
+    """(socket family, address) of "unix:/path" or "host:port"."""
+    if address.startswith('unix:'):
+        return socket.AF_UNIX, address[len('unix:'):]
+    host, _, port = address.rpartition(':')
+    if not host or not port.isdigit():
+        raise ValueError(f'Invalid runner address "{address}", expected unix:/path or host:port')
+    host = host.strip('[]')
+    return (socket.AF_INET6 if ':' in host else socket.AF_INET), (host, int(port))
+
+
+def connect(address, timeout):
+    family, target = parse_address(address)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(target)
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+def checker_to_dict(checker):
+    if checker is None:
+        return None
+    return {'expected': checker.expected, 'mode': checker.mode, 'tolerance': checker.tolerance}
+
+
+class Runner:
+    def __init__(self, workers):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._freed = threading.Condition(self._lock)
+        self._busy = 0  # Slots taken by running requests
+        self.load = 0  # Requests running or waiting for slots
+
+    def handle(self, sock):
+        request = recv_message(sock)
+        op = request.get('op')
+        if op == 'health':
+            send_message(sock, self.health())
+            return
+        if op not in ('run', 'batch'):
+            send_message(sock, {'event': 'error', 'error': f'Unknown op "{op}"'})
+            return
+        slots = 1 if op == 'run' else self._batch_slots(request)
+        with self._lock:
+            self.load += 1
+        try:
+            with self._freed:
+                self._freed.wait_for(lambda: self._busy + slots <= self.workers)
+                self._busy += slots
+            try:
+                result = self._run(request, sock) if op == 'run' else self._batch(request, slots)
+            finally:
+                with self._freed:
+                    self._busy -= slots
+                    self._freed.notify_all()
+            reply = {'event': 'result', 'result': result}
+        except Exception as e:
+            reply = {'event': 'error', 'error': str(e) or type(e).__name__}
+        finally:
+            with self._lock:
+                self.load -= 1
+        send_message(sock, reply)
+
+    def health(self):
+        with self._lock:
+            load = self.load
+        return {
+            'event': 'health',
+            'pid': os.getpid(),
+            'workers': self.workers,
+            'load': load,
+            'languages': toolchains.available_languages(),
+        }
+
+    def _run(self, request, sock):
+        on_output = None
+        if request.get('stream'):
+            # Called from the output reader threads; a client that went away
+            # must not break the run, its result is simply dropped
+            send_lock = threading.Lock()
+            gone = threading.Event()
+
+            def on_output(stream, text):
+                if gone.is_set():
+                    return
+                try:
+                    with send_lock:
+                        send_message(sock, {'event': 'output', 'stream': stream, 'text': text})
+                except OSError:
+                    gone.set()
+
+        input_data = request.get('input', "")
+        if request.get('input_hash'):
+            input_data = input_store.get(request['input_hash'])
+            if input_data is None:
+                raise ValueError("Input not found on this runner, is INPUT_ROOT shared?")
+        checker = None
+        if request.get('checker') is not None:
+            checker = checkers.Checker(**request['checker'])
+        return execute_code(
+            request['code'], request['language'], input_data, on_output,
+            checker=checker,
+            use_cache=request.get('use_cache', True),
+            timings=request.get('timings', False),
+            profile=request.get('profile', False),
+        )
+
+    def _batch_slots(self, request):
+        """Cases a batch runs at once: what the client asked for, within this runner's workers."""
+        wanted = request.get('workers') or batch_worker_count()
+        return max(1, min(wanted, len(request.get('cases') or [None]), self.workers))
+
+    def _batch(self, request, workers):
+        return run_batch(
+            request['code'], request['language'], request['cases'], request.get('checker_options'), workers
+        )
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        try:
+            self.server.runner.handle(self.request)
+        except (OSError, ProtocolError):
+            pass  # Client went away or spoke nonsense; nothing to answer
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _TCP6Server(_TCPServer):
+    address_family = socket.AF_INET6
+
+
+def make_server(address, workers):
+    """A server for `address` handling requests with a Runner of `workers` slots."""
+    family, target = parse_address(address)
+    if family == socket.AF_UNIX:
+        if os.path.exists(target):
+            os.remove(target)  # Left behind by a runner that didn't shut down cleanly
+        server = _UnixServer(target, _Handler)
+    else:
+        server = (_TCP6Server if family == socket.AF_INET6 else _TCPServer)(target, _Handler)
+    server.runner = Runner(workers)
+    return server
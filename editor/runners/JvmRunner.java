@@ -0,0 +1,218 @@
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.BufferedReader;
+import java.io.File;
+import java.io.FileDescriptor;
+import java.io.FileInputStream;
+import java.io.FileOutputStream;
+import java.io.InputStream;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.charset.StandardCharsets;
+import java.util.Locale;
+import java.util.Properties;
+import java.util.TimeZone;
+import java.util.jar.JarFile;
+
+/**
+ * Long-lived JVM that runs one submission at a time, each in a fresh class
+ * loader with its own stdin/stdout/stderr files. Driven by editor/jvm_worker.py.
+ *
+ * Requests arrive on stdin, one per line, tab separated:
+ *   classpath  main class (empty: jar Main-Class)  stdin file  stdout file  stderr file  timeout ms  output limit bytes
+ * Each is answered on stdout with one line:
+ *   OK|EXCEPTION|TIMEOUT|DIRTY|LIMIT  exit code  elapsed ms
+ * After TIMEOUT, DIRTY (threads left running) or LIMIT (output limit hit,
+ * the JVM halts right after replying) the JVM must not be reused.
+ * A submission calling System.exit() ends the JVM; the caller sees EOF.
+ * System properties, standard streams, the default locales and the default
+ * time zone are restored after every submission.
+ */
+public class JvmRunner {
+    private static volatile PrintStream runOut;
+    private static volatile PrintStream runErr;
+    private static PrintStream reply;
+    private static long runStart;
+
+    /** Counts bytes written by the program and ends the JVM once it goes past the limit. */
+    private static class LimitedOutputStream extends OutputStream {
+        private final OutputStream target;
+        private final long limit;
+        private long written;
+
+        LimitedOutputStream(OutputStream target, long limit) {
+            this.target = target;
+            this.limit = limit;
+        }
+
+        private void count(long n) throws IOException {
+            written += n;
+            if (written > limit) {
+                target.flush();
+                reply.println("LIMIT\t137\t" + (System.nanoTime() - runStart) / 1_000_000L);
+                Runtime.getRuntime().halt(137);
+            }
+        }
+
+        @Override
+        public void write(int b) throws IOException {
+            count(1);
+            target.write(b);
+        }
+
+        @Override
+        public void write(byte[] b, int off, int len) throws IOException {
+            count(len);
+            target.write(b, off, len);
+        }
+
+        @Override
+        public void flush() throws IOException {
+            target.flush();
+        }
+
+        @Override
+        public void close() throws IOException {
+            target.close();
+        }
+    }
+
+    public static void main(String[] args) throws Exception {
+        BufferedReader control = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        reply = new PrintStream(new FileOutputStream(FileDescriptor.out), true, "UTF-8");
+        InputStream originalIn = System.in;
+        PrintStream originalOut = System.out;
+        PrintStream originalErr = System.err;
+
+        // Keep buffered program output if it calls System.exit()
+        Runtime.getRuntime().addShutdownHook(new Thread(() -> {
+            PrintStream out = runOut;
+            PrintStream err = runErr;
+            if (out != null) out.flush();
+            if (err != null) err.flush();
+        }));
+
+        String line;
+        while ((line = control.readLine()) != null) {
+            String[] fields = line.split("\t", -1);
+            Properties savedProperties = (Properties) System.getProperties().clone();
+            Locale savedLocale = Locale.getDefault();
+            Locale savedDisplayLocale = Locale.getDefault(Locale.Category.DISPLAY);
+            Locale savedFormatLocale = Locale.getDefault(Locale.Category.FORMAT);
+            TimeZone savedTimeZone = TimeZone.getDefault();
+            String result;
+            try {
+                result = run(fields[0], fields[1], fields[2], fields[3], fields[4],
+                             Long.parseLong(fields[5]), Long.parseLong(fields[6]));
+            } catch (Throwable t) {
+                result = "EXCEPTION\t1\t0";
+            } finally {
+                System.setIn(originalIn);
+                System.setOut(originalOut);
+                System.setErr(originalErr);
+                System.setProperties(savedProperties);
+                // setDefault(Locale) resets both categories, so it goes first
+                Locale.setDefault(savedLocale);
+                Locale.setDefault(Locale.Category.DISPLAY, savedDisplayLocale);
+                Locale.setDefault(Locale.Category.FORMAT, savedFormatLocale);
+                TimeZone.setDefault(savedTimeZone);
+            }
+            reply.println(result);
+            if (result.startsWith("TIMEOUT")) {
+                // The stuck thread can't be stopped safely, give up this JVM
+                Runtime.getRuntime().halt(1);
+            }
+        }
+    }
+
+    private static String run(String classpath, String mainClass, String stdinPath, String stdoutPath,
+                              String stderrPath, long timeoutMs, long outputLimit) throws Exception {
+        long start = System.nanoTime();
+        runStart = start;
+        if (mainClass.isEmpty()) {
+            try (JarFile jar = new JarFile(classpath)) {
+                mainClass = jar.getManifest().getMainAttributes().getValue("Main-Class");
+            }
+        }
+
+        // Parent is the platform loader: the submission sees the JDK but none of our classes
+        URLClassLoader loader = new URLClassLoader(
+            new URL[] { new File(classpath).toURI().toURL() },
+            ClassLoader.getPlatformClassLoader()
+        );
+        InputStream in = new BufferedInputStream(new FileInputStream(stdinPath));
+        PrintStream out = new PrintStream(new BufferedOutputStream(
+            new LimitedOutputStream(new FileOutputStream(stdoutPath), outputLimit), 1 << 16), false, "UTF-8");
+        PrintStream err = new PrintStream(
+            new LimitedOutputStream(new FileOutputStream(stderrPath), outputLimit), true, "UTF-8");
+        runOut = out;
+        runErr = err;
+        System.setIn(in);
+        System.setOut(out);
+        System.setErr(err);
+
+        final String target = mainClass;
+        final int[] exitCode = { 0 };
+        ThreadGroup group = new ThreadGroup("submission");
+        Thread main = new Thread(group, () -> {
+            try {
+                Class<?> cls = Class.forName(target, true, loader);
+                Method method = cls.getMethod("main", String[].class);
+                method.invoke(null, (Object) new String[0]);
+            } catch (InvocationTargetException e) {
+                exitCode[0] = 1;
+                err.print("Exception in thread \"main\" ");
+                e.getCause().printStackTrace(err);
+            } catch (Throwable e) {
+                exitCode[0] = 1;
+                e.printStackTrace(err);
+            }
+        }, "main");
+        main.setContextClassLoader(loader);
+        main.start();
+
+        long deadline = start + timeoutMs * 1_000_000L;
+        main.join(Math.max(1, timeoutMs));
+        // Like a plain `java Main`, wait for other non-daemon threads the program started
+        while (!main.isAlive() && hasLiveNonDaemon(group) && System.nanoTime() < deadline) {
+            Thread.sleep(5);
+        }
+        boolean timedOut = main.isAlive() || hasLiveNonDaemon(group);
+        out.flush();
+        err.flush();
+        long elapsedMs = (System.nanoTime() - start) / 1_000_000L;
+        if (timedOut) {
+            return "TIMEOUT\t-1\t" + elapsedMs;
+        }
+
+        runOut = null;
+        runErr = null;
+        out.close();
+        err.close();
+        in.close();
+        loader.close();
+        String status = exitCode[0] == 0 ? "OK" : "EXCEPTION";
+        if (group.activeCount() > 0) {
+            // Daemon threads still running, they could interfere with the next submission
+            status = "DIRTY";
+        }
+        return status + "\t" + exitCode[0] + "\t" + elapsedMs;
+    }
+
+    private static boolean hasLiveNonDaemon(ThreadGroup group) {
+        Thread[] threads = new Thread[group.activeCount() + 16];
+        int count = group.enumerate(threads, true);
+        for (int i = 0; i < count; i++) {
+            if (threads[i].isAlive() && !threads[i].isDaemon()) {
+                return true;
+            }
+        }
+        return false;
+    }
+}
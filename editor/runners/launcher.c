@@ -0,0 +1,171 @@
+/*
+ * Runs a submission under resource limits and reports its resource usage.
+ * Built on first use by editor/limits.py.
+ *
+ *   launcher REPORT_FD AS_BYTES CPU_SECONDS FSIZE_BYTES NPROC PROGRAM [ARGS...]
+ *
+ * Limits of 0 are not applied. The program runs in its own process group and
+ * SIGTERM to the launcher kills that whole group, as does the program's exit.
+ * On Linux the launcher is also a child subreaper, so descendants that left
+ * the group (setsid, setpgid) are handed to it when their parents die; it
+ * kills and reaps all of them before exiting, so nothing the program started
+ * outlives it.
+ * Once the program has exited, one line is written to REPORT_FD:
+ *   wait_status user_us sys_us maxrss
+ *
+ * ru_maxrss carries over across exec, so a program forked straight from the
+ * server would report at least the server's own RSS. Forking from this small
+ * process keeps the figure about the program.
+ */
+#include <dirent.h>
+#include <errno.h>
+#include <fcntl.h>
+#include <signal.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/resource.h>
+#include <sys/time.h>
+#include <sys/types.h>
+#include <sys/wait.h>
+#include <unistd.h>
+#ifdef __linux__
+#include <sys/prctl.h>
+#endif
+
+static volatile pid_t child = 0;
+
+static void on_term(int sig) {
+    (void)sig;
+    if (child > 0) {
+        kill(-child, SIGKILL);
+    }
+}
+
+static void set_limit(int resource, unsigned long long soft, unsigned long long hard) {
+    struct rlimit rl;
+    if (soft == 0) {
+        return;
+    }
+    rl.rlim_cur = soft;
+    rl.rlim_max = hard;
+    setrlimit(resource, &rl);  /* Can't go above an existing hard limit, keep that one */
+}
+
+static long long micros(struct timeval tv) {
+    return (long long)tv.tv_sec * 1000000LL + tv.tv_usec;
+}
+
+#ifdef __linux__
+/* SIGKILLs every process whose parent is this one. Returns -1 without /proc. */
+static int kill_children(void) {
+    DIR *proc = opendir("/proc");
+    struct dirent *entry;
+    pid_t self = getpid();
+    if (proc == NULL) {
+        return -1;
+    }
+    while ((entry = readdir(proc)) != NULL) {
+        char path[64], stat[512], *end;
+        long pid = strtol(entry->d_name, &end, 10);
+        if (*end != '\0' || pid <= 0) {
+            continue;
+        }
+        snprintf(path, sizeof(path), "/proc/%ld/stat", pid);
+        int fd = open(path, O_RDONLY);
+        if (fd < 0) {
+            continue;
+        }
+        ssize_t n = read(fd, stat, sizeof(stat) - 1);
+        close(fd);
+        if (n <= 0) {
+            continue;
+        }
+        stat[n] = '\0';
+        /* "pid (comm) state ppid ...", comm may itself contain ") " */
+        char *fields = strrchr(stat, ')');
+        char state;
+        int ppid;
+        if (fields != NULL && sscanf(fields + 1, " %c %d", &state, &ppid) == 2 && ppid == self) {
+            kill((pid_t)pid, SIGKILL);
+        }
+    }
+    closedir(proc);
+    return 0;
+}
+#endif
+
+int main(int argc, char **argv) {
+    if (argc < 7) {
+        fprintf(stderr, "usage: %s REPORT_FD AS_BYTES CPU_SECONDS FSIZE_BYTES NPROC PROGRAM [ARGS...]\n", argv[0]);
+        return 2;
+    }
+    int report_fd = atoi(argv[1]);
+    unsigned long long as = strtoull(argv[2], NULL, 10);
+    unsigned long long cpu = strtoull(argv[3], NULL, 10);
+    unsigned long long fsize = strtoull(argv[4], NULL, 10);
+    unsigned long long nproc = strtoull(argv[5], NULL, 10);
+    fcntl(report_fd, F_SETFD, FD_CLOEXEC);
+
+#ifdef __linux__
+    prctl(PR_SET_CHILD_SUBREAPER, 1);
+#endif
+
+    struct sigaction sa;
+    memset(&sa, 0, sizeof(sa));
+    sa.sa_handler = on_term;
+    sigaction(SIGTERM, &sa, NULL);
+
+    /* Hold SIGTERM until the child's pid is known, so an early kill isn't lost */
+    sigset_t term, old;
+    sigemptyset(&term);
+    sigaddset(&term, SIGTERM);
+    sigprocmask(SIG_BLOCK, &term, &old);
+
+    pid_t pid = fork();
+    if (pid < 0) {
+        perror("fork");
+        return 2;
+    }
+    if (pid == 0) {
+        signal(SIGTERM, SIG_DFL);
+        sigprocmask(SIG_SETMASK, &old, NULL);
+        setpgid(0, 0);
+        set_limit(RLIMIT_AS, as, as);
+        /* SIGXCPU at the soft limit, SIGKILL a second later if it's ignored */
+        set_limit(RLIMIT_CPU, cpu, cpu + 1);
+        set_limit(RLIMIT_FSIZE, fsize, fsize);
+#ifdef RLIMIT_NPROC
+        set_limit(RLIMIT_NPROC, nproc, nproc);
+#endif
+        execvp(argv[6], argv + 6);
+        fprintf(stderr, "%s: %s\n", argv[6], strerror(errno));
+        _exit(127);
+    }
+    setpgid(pid, pid);  /* Also here, in case the child hasn't got to it yet */
+    child = pid;
+    sigprocmask(SIG_SETMASK, &old, NULL);
+
+    int status;
+    struct rusage ru;
+    while (wait4(pid, &status, 0, &ru) < 0) {
+        if (errno != EINTR) {
+            perror("wait4");
+            return 2;
+        }
+    }
+    /* Leftover background processes would keep using a work directory that
+       is about to be reused */
+    kill(-pid, SIGKILL);
+#ifdef __linux__
+    /* Those that left the group are ours now, or will be once their parents
+       are killed: kill and reap until there are none */
+    while (kill_children() == 0) {
+        if (waitpid(-1, NULL, 0) < 0 && errno == ECHILD) {
+            break;
+        }
+    }
+#endif
+    dprintf(report_fd, "%d %lld %lld %ld\n", status, micros(ru.ru_utime), micros(ru.ru_stime), ru.ru_maxrss);
+    return WIFEXITED(status) ? WEXITSTATUS(status) : 128 + WTERMSIG(status);
+}
@@ -0,0 +1,86 @@
+"""
+Runs a Python submission under cProfile for the profile run mode (see
+editor/profiler.py) and writes its hottest functions as JSON.
+
+    python pyprofile.py OUTPUT TOP STOP_MS SCRIPT
+
+After STOP_MS milliseconds of wall time, just under the time limit, the
+program is stopped with the profile gathered so far, and exits with status
+124 instead of being killed by the server, which would lose the profile.
+"""
+import cProfile
+import json
+import os
+import pstats
+import runpy
+import signal
+import sys
+import traceback
+
+output, top, stop_ms, script = sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), sys.argv[4]
+sys.argv = [script]
+# As when the script is run directly, not this wrapper
+sys.path[0] = os.path.dirname(os.path.abspath(script))
+
+SKIPPED_FILES = {os.path.abspath(__file__), runpy.__file__, '<frozen runpy>', cProfile.__file__}
+
+
+class TimeLimit(BaseException):
+    pass
+
+
+def stop(signum, frame):
+    raise TimeLimit()
+
+
+def name_of(filename, line, function):
+    if filename == '~':
+        return function  # Built-in, already "<built-in method ...>"
+    return f"{os.path.basename(filename)}:{line}({function})"
+
+
+def write_profile(profiler):
+    stats = pstats.Stats(profiler).stats
+    rows = [
+        (key, calls, self_time, total_time)
+        for key, (primitive_calls, calls, self_time, total_time, callers) in stats.items()
+        if key[0] not in SKIPPED_FILES and not (key[0] == '~' and 'lsprof' in key[2])
+    ]
+    total = sum(row[2] for row in rows)
+    rows.sort(key=lambda row: row[2], reverse=True)
+    functions = [{
+        'name': name_of(*key),
+        'calls': calls,
+        'self': round(self_time, 6),
+        'total': round(total_time, 6),
+        'percent': round(100 * self_time / total, 1) if total else 0,
+    } for key, calls, self_time, total_time in rows[:top]]
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'total_time': round(total, 6), 'functions': functions}, f)
+
+
+signal.signal(signal.SIGALRM, stop)
+signal.setitimer(signal.ITIMER_REAL, stop_ms / 1000)
+profiler = cProfile.Profile()
+status = 0
+try:
+    profiler.runcall(runpy.run_path, script, run_name='__main__')
+except TimeLimit:
+    status = 124
+except SystemExit as e:
+    status = e.code
+except BaseException as e:
+    # Like an uncaught exception, without this wrapper's frames
+    report = traceback.TracebackException.from_exception(e)
+    report.stack = traceback.StackSummary.from_list(
+        [frame for frame in report.stack if frame.filename not in SKIPPED_FILES]
+    )
+    sys.stderr.write("".join(report.format()))
+    status = 1
+finally:
+    signal.setitimer(signal.ITIMER_REAL, 0)
+    write_profile(profiler)
+if status == 124:
+    sys.stdout.flush()
+    sys.stderr.write("\nExecution Timed Out (profiled until the time limit)\n")
+sys.exit(status)
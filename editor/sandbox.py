@@ -0,0 +1,113 @@
+"""
+Reusable work directories for runs.
+
+Creating a fresh temporary directory per run, then listing and deleting it
+afterwards, is a noticeable part of the latency of tiny programs on a
+disk-backed temp dir. Instead every process keeps a few empty directories
+under SANDBOX_ROOT (point it at a RAM-backed location such as /dev/shm) and
+hands them out one run at a time. A released directory is emptied and goes
+back to the pool; one that can't be emptied (say, the program made a
+subdirectory unwritable) is deleted and replaced instead. Processes a program
+leaves running are killed when it exits (see limits.LimitedPopen), so none of
+them is around to see the next run in the same directory.
+
+Build artifacts are hard-linked into a directory rather than copied where
+possible (see compile_cache.link_or_copy). That needs the compile cache and
+SANDBOX_ROOT on the same filesystem; otherwise they are copied as before.
+"""
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+DEFAULT_POOL_SIZE = 8
+
+
+def get_root():
+    return getattr(settings, 'SANDBOX_ROOT', None) or tempfile.gettempdir()
+
+
+def _remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.unlink(path)
+
+
+def reset(path):
+    """Empties the directory `path`. Returns False if something couldn't be removed."""
+    try:
+        with os.scandir(path) as entries:
+            names = [entry.name for entry in entries]
+        for name in names:
+            _remove(os.path.join(path, name))
+    except OSError:
+        return False
+    return True
+
+
+class SandboxPool:
+    def __init__(self, root=None, size=None):
+        self._root = root
+        self._size = size
+        self._idle = []
+        self._created = set()
+        self._lock = threading.Lock()
+
+    @property
+    def root(self):
+        return self._root or get_root()
+
+    @property
+    def size(self):
+        if self._size is not None:
+            return self._size
+        return getattr(settings, 'SANDBOX_POOL_SIZE', DEFAULT_POOL_SIZE)
+
+    def acquire(self):
+        """Returns the path of an empty directory owned by the caller until release()."""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        os.makedirs(self.root, exist_ok=True)
+        path = tempfile.mkdtemp(prefix='webide-', dir=self.root)
+        with self._lock:
+            self._created.add(path)
+        return path
+
+    def release(self, path):
+        """Empties `path` and keeps it for the next run, or deletes it when the pool is full."""
+        with self._lock:
+            keep = len(self._idle) < self.size
+        if keep and reset(path):
+            with self._lock:
+                self._idle.append(path)
+            return
+        shutil.rmtree(path, ignore_errors=True)
+        with self._lock:
+            self._created.discard(path)
+
+    @contextmanager
+    def workdir(self):
+        path = self.acquire()
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def clear(self):
+        """Deletes every directory this pool has created, including ones in use."""
+        with self._lock:
+            paths = list(self._created)
+            self._idle.clear()
+            self._created.clear()
+        for path in paths:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+sandbox_pool = SandboxPool()
+atexit.register(sandbox_pool.clear)
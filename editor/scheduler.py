@@ -0,0 +1,201 @@
+"""
+Fair-share admission for runs.
+
+Every run is charged to the client that asked for it: its session and its IP
+address. For each of them RUN_LIMITS sets a token bucket (a sustained number
+of runs per second plus a burst) and a cap on runs in progress at once.
+
+- A submission that finds a bucket empty is refused: the views answer 429 with
+  a Retry-After telling when the next token is due.
+- A submission that would go over a concurrency cap is accepted but waits in
+  the run queue until one of the client's runs finishes. The queue serves
+  waiting sessions round-robin (see jobs.py), so a session with fifty queued
+  runs doesn't delay another session's single run by fifty.
+
+Buckets and runs in progress are kept in a small SQLite database
+(SCHEDULER_DB) so that the limits hold across all the server processes on the
+host. A slot is tied to the process holding it: slots of processes that died
+are reclaimed the next time the cap is checked.
+"""
+import asyncio
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+import psutil
+from django.conf import settings
+
+from . import metrics
+from .compile_cache import CACHE_DIR
+
+DEFAULT_LIMITS = {
+    'session': {'rate': 1, 'burst': 10, 'concurrency': 2},
+    'ip': {'rate': 10, 'burst': 100, 'concurrency': 4},
+}
+RETRY_INTERVAL = 0.25  # Seconds between checks of a concurrency cap held by another process
+
+SCHEMA_VERSION = 1
+
+
+class RateLimited(Exception):
+    def __init__(self, limit, retry_after):
+        super().__init__(f"Too many runs, retry in {retry_after:.1f}s")
+        self.limit = limit  # "session" or "ip"
+        self.retry_after = retry_after  # Seconds until a run would be admitted
+
+
+def client_keys(session_key=None, ip=None):
+    """Scheduler keys of a client, most specific first (the first one orders the run queue)."""
+    keys = []
+    if session_key:
+        keys.append(f"session:{session_key}")
+    if ip:
+        keys.append(f"ip:{ip}")
+    return keys
+
+
+def get_limits():
+    """RUN_LIMITS merged over the defaults; a kind set to None isn't limited."""
+    configured = getattr(settings, 'RUN_LIMITS', DEFAULT_LIMITS)
+    limits = {}
+    for kind, defaults in DEFAULT_LIMITS.items():
+        if kind in configured and configured[kind] is None:
+            continue
+        limits[kind] = {**defaults, **configured.get(kind, {})}
+    return limits
+
+
+def _kind(key):
+    return key.split(':', 1)[0]
+
+
+class Scheduler:
+    def __init__(self, db_path=None):
+        self.db_path = db_path or getattr(settings, 'SCHEDULER_DB', None) \
+            or os.path.join(CACHE_DIR, 'scheduler.sqlite3')
+        self._ready = False
+
+    @contextmanager
+    def _connect(self):
+        if not self._ready:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if not self._ready:
+                self._ensure_schema(conn)
+                self._ready = True
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _ensure_schema(self, conn):
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version == SCHEMA_VERSION:
+            return
+        conn.execute("DROP TABLE IF EXISTS buckets")
+        conn.execute("DROP TABLE IF EXISTS slots")
+        conn.execute(
+            "CREATE TABLE buckets ("
+            " key TEXT PRIMARY KEY,"
+            " tokens REAL NOT NULL,"
+            " updated REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX buckets_updated ON buckets (updated)")
+        conn.execute(
+            "CREATE TABLE slots ("
+            " job TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " pid INTEGER NOT NULL,"
+            " started REAL NOT NULL,"
+            " PRIMARY KEY (job, key))"
+        )
+        conn.execute("CREATE INDEX slots_key ON slots (key)")
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def admit(self, keys, cost=1):
+        """
+        Takes `cost` tokens from the bucket of each of `keys`, or none of them
+        if one is short. Raises RateLimited in that case.
+        """
+        limits = get_limits()
+        buckets = [(key, limits[_kind(key)]) for key in keys
+                   if limits.get(_kind(key), {}).get('rate')]
+        if not buckets:
+            return
+        now = time.time()
+        with self._connect() as conn:
+            refilled = []
+            short = None
+            for key, limit in buckets:
+                row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens = limit['burst']
+                if row is not None:
+                    tokens = min(limit['burst'], row[0] + (now - row[1]) * limit['rate'])
+                if tokens < cost:
+                    wait = (cost - tokens) / limit['rate']
+                    if short is None or wait > short[1]:
+                        short = (_kind(key), wait)
+                refilled.append((key, tokens))
+            if short is None:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                    [(key, tokens - cost, now) for key, tokens in refilled]
+                )
+            # A bucket left alone for burst / rate seconds is full again: same as no row
+            for kind, limit in limits.items():
+                if limit.get('rate'):
+                    conn.execute(
+                        "DELETE FROM buckets WHERE key LIKE ? AND updated < ?",
+                        (f"{kind}:%", now - limit['burst'] / limit['rate'])
+                    )
+        if short is not None:
+            metrics.RUNS_THROTTLED.inc(limit=short[0])
+            raise RateLimited(*short)
+
+    def try_acquire(self, job_id, keys):
+        """
+        Takes a run slot for `job_id` under each of `keys` that has a
+        concurrency cap. Returns False (and takes nothing) if one is at its cap.
+        """
+        limits = get_limits()
+        capped = [(key, limits[_kind(key)]['concurrency']) for key in keys
+                  if limits.get(_kind(key), {}).get('concurrency')]
+        if not capped:
+            return True
+        with self._connect() as conn:
+            for key, cap in capped:
+                holders = conn.execute("SELECT job, pid FROM slots WHERE key = ?", (key,)).fetchall()
+                if len(holders) < cap:
+                    continue
+                dead = [(job, key) for job, pid in holders if not psutil.pid_exists(pid)]
+                conn.executemany("DELETE FROM slots WHERE job = ? AND key = ?", dead)
+                if len(holders) - len(dead) >= cap:
+                    return False
+            now = time.time()
+            conn.executemany(
+                "INSERT OR REPLACE INTO slots (job, key, pid, started) VALUES (?, ?, ?, ?)",
+                [(job_id, key, os.getpid(), now) for key, _ in capped]
+            )
+        return True
+
+    async def acquire_async(self, job_id, keys):
+        """Waits on the event loop until try_acquire succeeds."""
+        while not await asyncio.to_thread(self.try_acquire, job_id, keys):
+            await asyncio.sleep(RETRY_INTERVAL)
+
+    def release(self, job_id):
+        """Frees the slots taken by try_acquire for `job_id`."""
+        if not any(limit.get('concurrency') for limit in get_limits().values()):
+            return
+        with self._connect() as conn:
+            conn.execute("DELETE FROM slots WHERE job = ?", (job_id,))
+
+
+scheduler = Scheduler()
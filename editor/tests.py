@@ -1,3 +1,1022 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import io
+import json
+import os
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
 
-# Create your tests here.
+import psutil
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from . import limits, metrics, pch, profiler, sandbox, toolchains, utils
+from .apps import is_management_command
+from .async_executor import execute_code_async
+from .backends import RemoteBackend
+from .batch import run_batch
+from .checker import Checker
+from .compile_cache import CompileCache, copy_artifacts
+from .inputs import input_digest
+from .interpreter_pool import InterpreterPool
+from .jobs import JobQueue, QueueFull
+from .jvm_worker import JvmWorker
+from .limits import limit_cpu, resource
+from .management.commands.bench import percentile
+from .models import Snippet
+from .output import MAX_OUTPUT_SIZE, stdout_capture
+from .projects import validate
+from .result_cache import ResultCache, is_cacheable
+from .runner import connect, make_server, recv_message, send_message
+from .sandbox import SandboxPool
+from .scheduler import RateLimited, Scheduler
+from .utils import compile_code, execute_code, get_build_key, get_language_config
+
+
+def _pid_gone(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    return False
+
+
+class AsyncExecutorTests(SimpleTestCase):
+    def test_cancelled_run_kills_the_program(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            pid_file = os.path.join(tmp, 'pid')
+            code = (
+                "import os, time\n"
+                f"open({pid_file!r}, 'w').write(str(os.getpid()))\n"
+                "time.sleep(60)\n"
+            )
+
+            async def run():
+                task = asyncio.ensure_future(execute_code_async(code, 'python', use_cache=False))
+                while not os.path.exists(pid_file) or not os.path.getsize(pid_file):
+                    await asyncio.sleep(0.05)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+
+            asyncio.run(asyncio.wait_for(run(), 10))
+            with open(pid_file) as f:
+                pid = int(f.read())
+        deadline = time.monotonic() + 2
+        while not _pid_gone(pid) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertTrue(_pid_gone(pid))
+
+
+    def test_same_results_as_execute_code(self):
+        runs = (
+            ("print(input())", 'python', "hi", Checker("hi")),
+            ("print('no')", 'python', "", Checker("yes")),
+            ("int main( {", 'c', "", None),
+        )
+        for code, language, input_data, checker in runs:
+            expected = execute_code(code, language, input_data, checker=checker, use_cache=False)
+            if checker is not None:
+                checker = Checker(checker.expected)
+            got = asyncio.run(execute_code_async(code, language, input_data, checker=checker, use_cache=False))
+            self.assertEqual(got[:3], expected[:3], code)
+            self.assertEqual(got[6].get('check'), expected[6].get('check'), code)
+
+
+class LimitsTests(SimpleTestCase):
+    @unittest.skipUnless(hasattr(resource, 'prlimit'), "needs prlimit")
+    def test_limit_cpu_moves_the_soft_limit_past_the_time_used(self):
+        proc = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+        try:
+            limit_cpu(proc.pid, "java", 3, used=10.2)
+            soft, _ = resource.prlimit(proc.pid, resource.RLIMIT_CPU)
+            self.assertEqual(soft, 11 + 3)
+        finally:
+            proc.kill()
+            proc.wait()
+
+
+@unittest.skipUnless(hasattr(os, 'wait4'), "needs wait4")
+class AccountingTests(SimpleTestCase):
+    def run_python(self, code):
+        return execute_code(code, 'python', use_cache=False)
+
+    def test_peak_memory_of_a_short_allocation(self):
+        small = self.run_python("pass")[4]
+        big = self.run_python("x = bytearray(100 * 1024 * 1024)\nx[::4096] = b'1' * len(x[::4096])")[4]
+        self.assertGreater(big, small + 90 * 1024)
+
+    def test_cpu_time_counts_computing_not_sleeping(self):
+        sleeping = self.run_python("import time\ntime.sleep(0.5)")[6]['cpu_time']
+        busy = self.run_python("import time\nend = time.process_time() + 0.5\nwhile time.process_time() < end: pass")[6]
+        self.assertLess(sleeping, 0.3)
+        self.assertGreaterEqual(busy['cpu_time'], 0.45)
+
+
+@override_settings(RESULT_CACHE_ENABLED=True)
+class ResultCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache = ResultCache()
+        patchers = [mock.patch.object(cache, '_backend', return_value=None),
+                    mock.patch('editor.utils.result_cache', cache)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_repeated_run_is_answered_from_the_cache(self):
+        code = "print(int(input()) * 2)"
+        first = execute_code(code, 'python', "21")
+        self.assertNotIn('cached', first[6])
+        again = execute_code(code, 'python', "21")
+        self.assertTrue(again[6].get('cached'))
+        self.assertEqual(again[:3], first[:3])
+        self.assertNotIn('cached', execute_code(code, 'python', "22")[6])
+        self.assertNotIn('cached', execute_code(code, 'python', "21", use_cache=False)[6])
+
+    def test_nondeterministic_code_is_rerun(self):
+        code = "import random\nprint(random.random())"
+        execute_code(code, 'python')
+        self.assertNotIn('cached', execute_code(code, 'python')[6])
+
+    def test_timeouts_and_created_files_arent_kept(self):
+        ok = ("1\n", "", True, 0.1, 100, [], {})
+        self.assertTrue(is_cacheable(0, ok))
+        self.assertFalse(is_cacheable(None, ok))
+        self.assertFalse(is_cacheable(0, ok[:5] + ([{'name': "out.txt"}], {})))
+
+
+class _SilentJvmWorker(JvmWorker):
+    """A worker whose "JVM" takes a request and never answers it."""
+
+    def command(self, runner_dir):
+        return [sys.executable, "-c", "import sys, time\nsys.stdin.readline()\ntime.sleep(60)"]
+
+
+class _GarbledJvmWorker(JvmWorker):
+    """A worker whose "JVM" answers every request with nonsense."""
+
+    def command(self, runner_dir):
+        return [sys.executable, "-c", "import sys\nfor line in sys.stdin:\n    print('OK\\tnot-a-number', flush=True)"]
+
+
+class JvmWorkerTests(SimpleTestCase):
+    def test_unanswered_run_is_a_timeout(self):
+        worker = _SilentJvmWorker("")
+        try:
+            with tempfile.TemporaryDirectory() as run_dir:
+                stdout, stderr, returncode, duration, memory = worker.run(
+                    "classes", "Main", run_dir, "", 0.2, {}
+                )
+            self.assertIsNone(returncode)
+            self.assertFalse(worker.reusable)
+        finally:
+            worker.close()
+
+    def test_garbled_reply_fails_the_run_instead_of_falling_back(self):
+        worker = _GarbledJvmWorker("")
+        try:
+            with tempfile.TemporaryDirectory() as run_dir:
+                stdout, stderr, returncode, duration, memory = worker.run(
+                    "classes", "Main", run_dir, "", 2, {}
+                )
+            self.assertEqual(returncode, 1)
+            self.assertIn("Internal error", stderr)
+            self.assertFalse(worker.reusable)
+        finally:
+            worker.close()
+
+
+class SnippetTests(TestCase):
+    def share(self, code, language='python'):
+        response = self.client.post('/share/', json.dumps({'code': code, 'language': language}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['id']
+
+    def test_same_code_is_stored_once(self):
+        first = self.share("print(1)")
+        self.assertEqual(self.share("print(1)"), first)
+        self.assertNotEqual(self.share("print(1)", 'pypy'), first)
+        self.assertEqual(Snippet.objects.count(), 2)
+        self.assertEqual(Snippet.objects.get(id=first).code, "print(1)")
+
+    def test_cached_page_doesnt_ask_the_backend(self):
+        snippet_id = self.share("print(7)")
+        etag = self.client.get(f'/share/{snippet_id}/')['ETag']
+        with mock.patch('editor.views.get_backend') as get_backend:
+            self.assertEqual(self.client.get(f'/share/{snippet_id}/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            response = self.client.get(f'/share/{snippet_id}/')
+        self.assertEqual(response['ETag'], etag)
+        self.assertIn("print(7)", response.content.decode())
+        get_backend.assert_not_called()
+
+    def test_revisit_gets_304_until_the_snippet_is_deleted(self):
+        snippet_id = self.share("print(42)")
+        response = self.client.get(f'/share/{snippet_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("print(42)", response.content.decode())
+        etag = response['ETag']
+
+        response = self.client.get(f'/share/{snippet_id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Snippet.objects.filter(id=snippet_id).delete()
+        response = self.client.get(f'/share/{snippet_id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 404)
+
+
+def _check(expected, output, mode='whitespace', chunk=3, **options):
+    checker = Checker(expected, mode, **options)
+    for start in range(0, len(output), chunk):
+        if not checker.feed(output[start:start + chunk]):
+            break
+    checker.finish()
+    return checker
+
+
+class CheckerTests(SimpleTestCase):
+    def test_exact(self):
+        self.assertTrue(_check("1 2\n3\n", "1 2\n3\n", 'exact').passed)
+        checker = _check("1 2\n3\n", "1 2\n4\n", 'exact')
+        self.assertFalse(checker.passed)
+        self.assertEqual(checker.message, "Differs at line 2, column 1")
+        self.assertEqual(_check("1\n", "1\n2", 'exact').message, "Extra output after line 1")
+        self.assertEqual(_check("1\n2\n", "1\n", 'exact').message, "Output ended early at line 2")
+
+    def test_whitespace_ignores_spacing_across_chunks(self):
+        expected = "10 200\n3000\n"
+        self.assertTrue(_check(expected, "10   200 3000", chunk=1).passed)
+        self.assertTrue(_check(expected, "10\n200\n\n3000\n\n", chunk=4).passed)
+        self.assertEqual(_check(expected, "10 2000 3000").message, "Token 2: expected '200', got '2000'")
+        self.assertEqual(_check(expected, "10 200").message, "Output ended early: expected '3000' as token 3")
+        self.assertEqual(_check(expected, "10 200 3000 4").message, "Extra output: '4' as token 4")
+
+    def test_whitespace_long_output(self):
+        expected = "".join(f"{i}\n" for i in range(100000))
+        self.assertTrue(_check(expected, expected, chunk=65536).passed)
+        wrong = expected.replace("\n54321\n", "\n54322\n")
+        self.assertEqual(_check(expected, wrong, chunk=65536).message, "Token 54322: expected '54321', got '54322'")
+
+    def test_float_tolerance(self):
+        self.assertTrue(_check("0.333333 1e9\n", "0.3333334 1000000000.5", 'float').passed)
+        self.assertFalse(_check("0.5\n", "0.51", 'float').passed)
+        self.assertTrue(_check("0.5\n", "0.51", 'float', tolerance=0.1).passed)
+        self.assertTrue(_check("nan inf\n", "nan inf", 'float').passed)
+        self.assertFalse(_check("YES\n", "yes", 'float').passed)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            Checker("", 'fuzzy')
+
+    def test_capture_reports_a_mismatch_from_its_checker_thread(self):
+        stopped = []
+        checker = Checker("1 2 3")
+        capture = stdout_capture(on_limit=lambda: stopped.append(True), checker=checker)
+        capture.feed(b"1 9 ")
+        capture.close()
+        self.assertTrue(capture.mismatch)
+        self.assertEqual(stopped, [True])
+        self.assertFalse(checker.finish())
+        self.assertTrue(checker.stopped_early)
+
+    def test_wrong_answer_is_never_a_success(self):
+        for _ in range(3):
+            stdout, stderr, success, *_, extra = execute_code("print('no')", 'python', checker=Checker("yes"))
+            self.assertFalse(extra['check']['passed'])
+            self.assertFalse(success)
+
+
+class OutputCapTests(SimpleTestCase):
+    @override_settings(OUTPUT_LIMIT=200000)
+    def test_capture_keeps_the_head_and_stops_at_the_limit(self):
+        stopped = []
+        streamed = []
+        capture = stdout_capture(on_output=lambda stream, text: streamed.append(text), on_limit=lambda: stopped.append(1))
+        for _ in range(3):
+            capture.feed(b"x" * 65536)
+        self.assertEqual(stopped, [])
+        self.assertFalse(capture.wants_more())
+        capture.feed(b"x" * 65536)
+        self.assertEqual(stopped, [1])
+        self.assertTrue(capture.limit_exceeded)
+        self.assertEqual(capture.text(), "x" * MAX_OUTPUT_SIZE + "\n... [Output Truncated]")
+        self.assertEqual("".join(streamed), "x" * MAX_OUTPUT_SIZE)
+
+    @override_settings(OUTPUT_LIMIT=100000, EXECUTION_TIMEOUT=20)
+    def test_print_loop_is_killed_at_the_limit(self):
+        start = time.monotonic()
+        stdout, stderr, success, duration, memory, files, extra = execute_code(
+            "while True:\n    print('spam' * 100)\n", 'python', use_cache=False
+        )
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertTrue(extra.get('output_limit_exceeded'))
+        self.assertIn("Output Limit Exceeded", stderr)
+        self.assertFalse(success)
+        self.assertTrue(stdout.endswith("... [Output Truncated]"))
+        self.assertLessEqual(len(stdout), MAX_OUTPUT_SIZE + len("\n... [Output Truncated]"))
+
+
+class ToolchainTests(SimpleTestCase):
+    def test_available_languages_doesnt_wait_for_the_probe(self):
+        with mock.patch.object(toolchains, '_probed', threading.Event()), \
+                mock.patch.object(toolchains, 'start_probe', lambda: None):
+            start = time.monotonic()
+            languages = toolchains.available_languages()
+            self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(languages, toolchains.configured_languages())
+
+    def test_only_servers_probe_at_startup(self):
+        for argv, expected in (
+            (['manage.py', 'migrate'], True),
+            (['manage.py', 'cleanup_snippets', '--days', '3'], True),
+            (['manage.py', 'runserver'], False),
+            (['manage.py', 'runner', 'unix:/tmp/runner.sock'], False),
+            (['/usr/bin/gunicorn', 'webide.wsgi'], False),
+        ):
+            with mock.patch('sys.argv', argv):
+                self.assertEqual(is_management_command(), expected, argv)
+
+
+class BatchTests(SimpleTestCase):
+    def test_verdicts(self):
+        code = "n = int(input())\nprint(n * 2)\n"
+        result = run_batch(code, 'python', [
+            {'input': "2", 'expected': "4"},
+            {'input': "3", 'expected': "7"},
+            {'input': "x"},
+            {'input': "5"},
+        ])
+        self.assertEqual([case['verdict'] for case in result['cases']], ["AC", "WA", "RE", "OK"])
+        self.assertEqual(result['summary']['passed'], 2)
+
+    def test_cases_cant_change_the_source_for_each_other(self):
+        code = (
+            "import sys\n"
+            "print('original')\n"
+            "open(sys.argv[0], 'w').write('print(\"rewritten\")')\n"
+        )
+        result = run_batch(code, 'python', [{'expected': "original"}] * 3, workers=1)
+        self.assertEqual([case['verdict'] for case in result['cases']], ["AC"] * 3)
+
+    @unittest.skipUnless(hasattr(resource, 'RLIMIT_CPU'), "needs RLIMIT_CPU")
+    @override_settings(EXECUTION_LIMITS={'cpu_seconds': 1}, EXECUTION_TIMEOUT=20)
+    def test_ignoring_sigxcpu_is_still_a_cpu_limit(self):
+        code = "import signal\nsignal.signal(signal.SIGXCPU, signal.SIG_IGN)\nwhile True:\n    pass\n"
+        case, = run_batch(code, 'python', [{}])['cases']
+        self.assertEqual(case['verdict'], "TLE")
+        self.assertIn("CPU Time Limit Exceeded", case['stderr'])
+
+
+class JobQueueTests(SimpleTestCase):
+    def test_batch_waits_for_all_of_its_workers(self):
+        queue = JobQueue()
+        release = threading.Event()
+        with override_settings(RUN_WORKERS=2, BATCH_WORKERS=2), \
+                mock.patch('editor.jobs.get_backend') as get_backend:
+            get_backend.return_value.execute.side_effect = \
+                lambda *args, **kwargs: release.wait(10) and ("", "", True, 0, 0, [], {})
+            get_backend.return_value.run_batch.return_value = {}
+            single = queue.submit("print(1)", 'python')
+            batch = queue.submit_batch("print(1)", 'python', [{}, {}, {}])
+            self.assertEqual(batch.slots, 2)
+            time.sleep(0.3)
+            self.assertEqual(batch.status, 'queued')
+            release.set()
+            self.assertTrue(batch._done.wait(10))
+            self.assertEqual(single.status, 'done')
+        _, kwargs = get_backend.return_value.run_batch.call_args
+        self.assertEqual(kwargs['workers'], 2)
+
+
+class ProjectTests(SimpleTestCase):
+    def test_validate(self):
+        self.assertIsNone(validate({'main.py': "import lib.util", 'lib/util.py': ""}, 'python', 'main.py'))
+        self.assertIsNone(validate({'main.c': "", 'inc/a.h': ""}, 'c', 'main.c'))
+        for files, language, message in (
+            ({'main.py': ""}, 'ruby', 'Multi-file projects are not supported for "ruby".'),
+            ({}, 'python', '"files" must be a non-empty object of {path: source}.'),
+            ({'../main.py': ""}, 'python', 'Invalid file name "../main.py".'),
+            ({'main.py': 1}, 'python', 'The source of "main.py" must be a string.'),
+            ({'util.py': ""}, 'python', 'Missing the entry point "main.py".'),
+            ({'main.h': ""}, 'c', 'No .c file to compile.'),
+            ({'main.py': "", 'lib': "", 'lib/util.py': ""}, 'python', '"lib" is both a file and a directory.'),
+        ):
+            self.assertEqual(validate(files, language, 'main.py'), message, files)
+
+    def test_conflicting_paths_are_a_bad_request(self):
+        response = self.client.post('/run/', json.dumps({
+            'files': {'main.py': "print(1)", 'a': "", 'a/b.py': ""}, 'language': 'python'
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class CompileCacheTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = os.path.join(tmp.name, 'cache')
+        self.src = os.path.join(tmp.name, 'src')
+        os.makedirs(self.root)
+        os.makedirs(self.src)
+        with open(os.path.join(self.src, 'main.exe'), 'wb') as f:
+            f.write(b"x" * 100)
+
+    def test_hit_and_miss(self):
+        cache = CompileCache(self.root)
+        self.assertIsNone(cache.get('ab' * 32))
+        path = cache.put('ab' * 32, self.src, ['main.exe'])
+        self.assertEqual(cache.get('ab' * 32), path)
+        self.assertFalse(os.stat(os.path.join(path, 'main.exe')).st_mode & 0o222)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_evicts_the_least_recently_hit(self):
+        cache = CompileCache(self.root, max_entries=2)
+        cache.put('aa' * 32, self.src, ['main.exe'])
+        time.sleep(0.01)
+        cache.put('bb' * 32, self.src, ['main.exe'])
+        time.sleep(0.01)
+        cache.get('aa' * 32)  # Only kept in memory until the next write
+        cache.put('cc' * 32, self.src, ['main.exe'])
+        self.assertEqual({entry['key'] for entry in cache.entries()}, {'aa' * 32, 'cc' * 32})
+        self.assertIsNone(cache.get('bb' * 32))
+
+    def test_hit_doesnt_wait_for_the_index(self):
+        cache = CompileCache(self.root)
+        cache.put('ab' * 32, self.src, ['main.exe'])
+        conn = sqlite3.connect(cache.index_path, isolation_level=None)
+        conn.execute("BEGIN EXCLUSIVE")
+        try:
+            start = time.monotonic()
+            self.assertIsNotNone(cache.get('ab' * 32))
+            self.assertLess(time.monotonic() - start, 1)
+        finally:
+            conn.execute("ROLLBACK")
+            conn.close()
+
+    def test_compile_code_rebuilds_an_entry_lost_while_copying(self):
+        code = "int main() { return 0; }"
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            filename, compile_cmd, cmd, artifacts = get_language_config('c', first)
+            error, info = compile_code(code, 'c', first, compile_cmd, artifacts, filename)
+            self.assertIsNone(error)
+            with mock.patch('editor.utils.copy_artifacts', side_effect=PermissionError), \
+                    mock.patch.object(utils.compile_cache, 'put', wraps=utils.compile_cache.put) as put:
+                error, info = compile_code(code, 'c', second, compile_cmd, artifacts, filename)
+            self.assertIsNone(error)
+            self.assertFalse(info['cached'])
+            self.assertTrue(os.path.exists(os.path.join(second, 'main.exe')))
+            put.assert_called_once()  # Published again
+
+        with tempfile.TemporaryDirectory() as third:
+            # A compiler that exits 0 without writing the binary is a failed build here too
+            with mock.patch('editor.utils.copy_artifacts', side_effect=PermissionError), \
+                    mock.patch('editor.utils._run_compiler', return_value=None):
+                error, info = compile_code(code, 'c', third, compile_cmd, artifacts, filename)
+            self.assertEqual(error, "Compilation Failed: compiler produced no output")
+
+
+class SandboxTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+
+    def test_released_directories_are_emptied_and_reused(self):
+        pool = SandboxPool(os.path.join(self.tmp, 'sandboxes'), size=1)
+        first = pool.acquire()
+        os.makedirs(os.path.join(first, 'sub'))
+        with open(os.path.join(first, 'sub', 'out.txt'), 'w') as f:
+            f.write("x")
+        second = pool.acquire()
+        pool.release(first)
+        pool.release(second)  # Over the pool size
+        self.assertFalse(os.path.exists(second))
+        self.assertEqual(pool.acquire(), first)
+        self.assertEqual(os.listdir(first), [])
+        pool.clear()
+        self.assertFalse(os.path.exists(first))
+
+    def test_cached_binaries_are_linked_not_copied(self):
+        cache = CompileCache(os.path.join(self.tmp, 'cache'))
+        os.makedirs(os.path.join(self.tmp, 'build'))
+        with open(os.path.join(self.tmp, 'build', 'main.exe'), 'wb') as f:
+            f.write(b"binary")
+        entry = cache.put('ab' * 32, os.path.join(self.tmp, 'build'), ['main.exe'])
+        pool = SandboxPool(os.path.join(self.tmp, 'sandboxes'))
+        with pool.workdir() as path:
+            copy_artifacts(entry, path, ['main.exe'])
+            self.assertTrue(os.path.samefile(os.path.join(path, 'main.exe'), os.path.join(entry, 'main.exe')))
+
+    def test_background_processes_die_with_the_run(self):
+        code = (
+            "import subprocess\n"
+            "group = subprocess.Popen(['sleep', '30'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)\n"
+            "session = subprocess.Popen(['sleep', '30'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,"
+            " start_new_session=True)\n"
+            "print(group.pid, session.pid)"
+        )
+        for launcher in (True, False):
+            fallback = mock.patch.object(limits, 'get_launcher', return_value=None)
+            with self.subTest(launcher=launcher), (contextlib.nullcontext() if launcher else fallback):
+                stdout, stderr, success, *_ = execute_code(code, 'python', use_cache=False)
+                self.assertTrue(success, stderr)
+                group, session = map(int, stdout.split())
+                # Left with the session in the fallback: only the launcher follows processes out of the group
+                for pid in ((group, session) if launcher else (group,)):
+                    deadline = time.monotonic() + 5
+                    while self._alive(pid) and time.monotonic() < deadline:
+                        time.sleep(0.05)
+                    self.assertFalse(self._alive(pid), pid)
+                if not launcher:
+                    os.kill(session, signal.SIGKILL)
+
+    @staticmethod
+    def _alive(pid):
+        try:
+            return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+        except psutil.NoSuchProcess:
+            return False
+
+
+@override_settings(ARTIFACT_LIMITS={'max_files': 2, 'max_file_bytes': 10, 'max_total_bytes': 100})
+class CreatedFilesTests(SimpleTestCase):
+    def test_manifest_limits_and_download(self):
+        code = (
+            "open('a.txt', 'w').write('0123456789abcdef')\n"
+            "open('b.bin', 'wb').write(bytes(5))\n"
+            "open('c.txt', 'w').write('left out')\n"
+        )
+        stdout, stderr, success, duration, memory, files, extra = execute_code(code, 'python', use_cache=False)
+        self.assertTrue(success, stderr)
+        self.assertEqual([(f['name'], f['size'], f['stored'], f['truncated'], f['binary']) for f in files], [
+            ('a.txt', 16, 10, True, False),
+            ('b.bin', 5, 5, False, True),
+        ])
+        self.assertEqual(extra['files_omitted'], 1)
+
+        response = self.client.get(files[0]['url'])
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+        self.assertEqual(response['ETag'], f'"{files[0]["sha256"]}"')
+        response = self.client.get(files[0]['url'], HTTP_RANGE="bytes=2-4")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, b"234")
+        self.assertEqual(response['Content-Range'], "bytes 2-4/10")
+        self.assertEqual(self.client.get(files[0]['url'], HTTP_RANGE="bytes=20-").status_code, 416)
+        self.assertEqual(self.client.get(files[0]['url'].replace('a.txt', 'c.txt')).status_code, 404)
+
+
+def _sample(text, name):
+    for line in text.splitlines():
+        if line.startswith(name + " "):
+            return float(line.split()[-1])
+    return 0
+
+
+class MetricsTests(SimpleTestCase):
+    def test_histogram_rendering(self):
+        with mock.patch.object(metrics, '_registry', []):
+            histogram = metrics.Histogram('test_seconds', "Test.", ['language'], buckets=(0.1, 1))
+            histogram.observe(0.05, language="c")
+            histogram.observe(0.5, language="c")
+            histogram.observe(7, language="c")
+            self.assertEqual(metrics.render().splitlines()[2:], [
+                'test_seconds_bucket{language="c",le="0.1"} 1',
+                'test_seconds_bucket{language="c",le="1"} 2',
+                'test_seconds_bucket{language="c",le="+Inf"} 3',
+                'test_seconds_sum{language="c"} 7.55',
+                'test_seconds_count{language="c"} 3',
+            ])
+
+    def test_runs_and_phases_are_counted(self):
+        runs = 'webide_runs_total{language="python",outcome="runtime_error"}'
+        phases = 'webide_phase_seconds_count{language="python",phase="execute"}'
+        before = self.client.get('/metrics').content.decode()
+        extra = execute_code("raise SystemExit(3)", 'python', use_cache=False, timings=True)[6]
+        after = self.client.get('/metrics').content.decode()
+        self.assertEqual(_sample(after, runs), _sample(before, runs) + 1)
+        self.assertEqual(_sample(after, phases), _sample(before, phases) + 1)
+        self.assertEqual(set(extra['timings']), {'sandbox', 'prepare', 'execute', 'collect', 'cleanup'})
+
+
+class BenchTests(SimpleTestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3], 95), 3)
+        self.assertIsNone(percentile([], 50))
+
+    def test_results_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'bench.json')
+            call_command('bench', languages=['python'], programs=['hello'], cache=['miss'], requests=2,
+                         concurrency=2, output=output, stdout=io.StringIO())
+            with open(output) as f:
+                report = json.load(f)
+        result, = report['results']
+        self.assertEqual((result['language'], result['program'], result['cache']), ('python', 'hello', 'miss'))
+        self.assertEqual((result['requests'], result['errors']), (2, 0))
+        self.assertEqual(report['meta']['concurrency'], 2)
+
+    def test_http_rate_limit_stops_the_benchmark(self):
+        import urllib.error
+        from django.core.management.base import CommandError
+        from .management.commands.bench import HttpRunner
+        runner = HttpRunner.__new__(HttpRunner)
+        runner.base_url, runner.csrf_token = 'http://server', ''
+        runner.opener = mock.Mock()
+        runner.opener.open.side_effect = urllib.error.HTTPError(
+            'http://server/run/', 429, "Too Many Requests", {'Retry-After': '3'}, None
+        )
+        with self.assertRaisesMessage(CommandError, "RUN_LIMITS"):
+            runner("print(1)", 'python')
+        runner.opener.open.side_effect = urllib.error.HTTPError('http://server/run/', 500, "Error", {}, None)
+        self.assertEqual(runner("print(1)", 'python'), {'error': "HTTP 500"})
+
+
+@unittest.skipUnless(shutil.which('gcc'), "needs gcc")
+class SingleFlightCompileTests(SimpleTestCase):
+    def test_identical_submissions_compile_once(self):
+        code = f"int main() {{ return {time.time_ns() % 100}; }} /* {time.time_ns()} */"
+        results = []
+
+        def compile_in(temp_dir):
+            filename, compile_cmd, cmd, artifacts = get_language_config('c', temp_dir)
+            results.append(compile_code(code, 'c', temp_dir, compile_cmd, artifacts, filename))
+
+        with mock.patch.object(utils, '_run_compiler', wraps=utils._run_compiler) as run_compiler, \
+                tempfile.TemporaryDirectory() as tmp:
+            dirs = [os.path.join(tmp, str(i)) for i in range(4)]
+            for path in dirs:
+                os.makedirs(path)
+            threads = [threading.Thread(target=compile_in, args=(path,)) for path in dirs]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertTrue(all(os.path.exists(os.path.join(path, 'main.exe')) for path in dirs))
+        self.assertEqual(run_compiler.call_count, 1)
+        self.assertEqual([error for error, info in results], [None] * 4)
+        self.assertEqual(sorted(info['cached'] for error, info in results), [False, True, True, True])
+
+
+class BuildKeyTests(SimpleTestCase):
+    def test_key_covers_the_toolchain(self):
+        cmd = ["javac", "-d", "classes", "Main.java"]
+        with mock.patch.object(toolchains, 'get_version', return_value="javac 17"):
+            key = get_build_key("class Main {}", 'java', cmd)
+            self.assertEqual(get_build_key("class Main {}", 'java', cmd), key)
+            self.assertNotEqual(get_build_key("class Main {} ", 'java', cmd), key)
+            self.assertNotEqual(get_build_key("class Main {}", 'java', [*cmd[:1], "-g", *cmd[1:]]), key)
+        with mock.patch.object(toolchains, 'get_version', return_value="javac 21"):
+            self.assertNotEqual(get_build_key("class Main {}", 'java', cmd), key)
+
+    def test_artifacts_of_the_jvm_and_pascal_builds(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertEqual(get_language_config('java', tmp)[3], ["classes"])
+            self.assertEqual(get_language_config('kotlin', tmp)[3], ["main.jar"])
+            self.assertEqual(get_language_config('pascal', tmp)[3], ["main.exe"])
+
+
+NO_RUN_LIMITS = {'session': None, 'ip': None}
+
+
+class SchedulerTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.scheduler = Scheduler(os.path.join(tmp.name, 'scheduler.sqlite3'))
+
+    @override_settings(RUN_LIMITS={'session': {'rate': 1, 'burst': 2, 'concurrency': None}, 'ip': None})
+    def test_token_bucket(self):
+        self.scheduler.admit(['session:a'])
+        self.scheduler.admit(['session:a'])
+        with self.assertRaises(RateLimited) as raised:
+            self.scheduler.admit(['session:a'])
+        self.assertEqual(raised.exception.limit, 'session')
+        self.assertTrue(0 < raised.exception.retry_after <= 1)
+        self.scheduler.admit(['session:b'])  # Buckets are per client
+
+    @override_settings(RUN_LIMITS={'session': {'rate': None, 'concurrency': 1}, 'ip': None})
+    def test_concurrency_cap(self):
+        self.assertTrue(self.scheduler.try_acquire('job1', ['session:a']))
+        self.assertFalse(self.scheduler.try_acquire('job2', ['session:a']))
+        self.assertTrue(self.scheduler.try_acquire('job3', ['session:b']))
+        self.scheduler.release('job1')
+        self.assertTrue(self.scheduler.try_acquire('job2', ['session:a']))
+
+
+@override_settings(RUN_LIMITS=NO_RUN_LIMITS)
+class JobApiTests(TestCase):
+    def test_submit_and_poll(self):
+        response = self.client.post('/jobs/', json.dumps({'code': "print(input())", 'language': 'python', 'input': "hi"}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()['id']
+        deadline = time.monotonic() + 20
+        while True:
+            status = self.client.get(f'/jobs/{job_id}/').json()
+            if status['status'] in ('done', 'failed') or time.monotonic() > deadline:
+                break
+            time.sleep(0.05)
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual(status['position'], 0)
+        self.assertEqual(status['result']['stdout'], "hi\n")
+        self.assertEqual(self.client.get('/jobs/nope/').status_code, 404)
+
+    def test_runs_without_a_session_are_charged_to_the_ip(self):
+        from django.contrib.sessions.models import Session
+        from .views import _client
+        request = self.client.post('/jobs/', json.dumps({'code': "print(1)", 'language': 'python'}),
+                                   content_type='application/json').wsgi_request
+        self.assertEqual(_client(request), ["ip:127.0.0.1"])
+        self.assertEqual(Session.objects.count(), 0)
+
+        self.client.get('/')
+        self.assertEqual(Session.objects.count(), 1)
+        request = self.client.post('/jobs/', json.dumps({'code': "print(2)", 'language': 'python'}),
+                                   content_type='application/json').wsgi_request
+        self.assertEqual(_client(request), [f"session:{Session.objects.get().session_key}", "ip:127.0.0.1"])
+
+        self.client.cookies['sessionid'] = "made-up"
+        request = self.client.post('/jobs/', json.dumps({'code': "print(3)", 'language': 'python'}),
+                                   content_type='application/json').wsgi_request
+        self.assertEqual(_client(request), ["ip:127.0.0.1"])
+
+    @override_settings(RUN_WORKERS=1, RUN_QUEUE_SIZE=1)
+    def test_full_queue_refuses_runs(self):
+        queue = JobQueue()
+        release = threading.Event()
+        self.addCleanup(release.set)
+        with mock.patch('editor.jobs.get_backend') as get_backend:
+            get_backend.return_value.execute.side_effect = \
+                lambda *args, **kwargs: release.wait(10) and ("", "", True, 0, 0, [], {})
+            running = queue.submit("1", 'python')
+            while running.status != 'running':
+                time.sleep(0.01)
+            waiting = queue.submit("2", 'python')
+            self.assertEqual(queue.position(waiting), 1)
+            with self.assertRaises(QueueFull):
+                queue.submit("3", 'python')
+            release.set()
+            self.assertTrue(waiting.wait(10))
+
+
+@override_settings(RUN_WORKERS=1, RUN_LIMITS=NO_RUN_LIMITS)
+class JobQueueOrderTests(SimpleTestCase):
+    def setUp(self):
+        self.queue = JobQueue()
+        self.started = []
+        self.release = threading.Event()
+        patcher = mock.patch('editor.jobs.get_backend')
+        backend = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.release.set)
+
+        def execute(code, *args, **kwargs):
+            self.started.append(code)
+            if code == "block":
+                self.release.wait(10)
+            return "", "", True, 0, 0, [], {}
+        backend.execute.side_effect = execute
+
+    def test_clients_are_served_in_turn(self):
+        blocker = self.queue.submit("block", 'python', client=['session:a'])
+        while blocker.status != 'running':
+            time.sleep(0.01)
+        jobs = [self.queue.submit(code, 'python', client=[client]) for code, client in (
+            ("a1", 'session:a'), ("a2", 'session:a'), ("a3", 'session:a'), ("b1", 'session:b'),
+        )]
+        self.assertEqual(self.queue.position(jobs[3]), 2)
+        self.release.set()
+        for job in jobs:
+            self.assertTrue(job.wait(10))
+        self.assertEqual(self.started, ["block", "a1", "b1", "a2", "a3"])
+
+    def test_caps_are_checked_outside_the_queue_lock(self):
+        answers = iter([False, True])
+        checks = []
+
+        def try_acquire(job_id, keys):
+            checks.append(self.queue._cond._is_owned())
+            return next(answers)
+        with mock.patch('editor.jobs.scheduler.try_acquire', side_effect=try_acquire):
+            job = self.queue.submit("a1", 'python', client=['session:a'])
+            self.assertTrue(job.wait(10))
+        self.assertEqual(checks, [False, False])  # Refused once, started on the retry
+
+
+class PchTests(SimpleTestCase):
+    @unittest.skipUnless(shutil.which('gcc'), "needs gcc")
+    def test_meta_records_build_and_compile_times(self):
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(pch, 'PCH_DIR', tmp):
+            meta = pch.build_pch('c', 'gcc', [], 'stdio.h', 'test')
+        self.assertEqual(meta['header'], 'stdio.h')
+        self.assertGreater(meta['build_time'], 0)
+        self.assertGreater(meta['compile_time'], 0)
+        # Each figure is rounded on its own
+        self.assertAlmostEqual(meta['saved'], max(0.0, meta['compile_time'] - meta['compile_time_pch']), delta=0.002)
+
+
+@override_settings(INTERPRETER_POOL_SIZE={'python': 1})
+class InterpreterPoolTests(SimpleTestCase):
+    def test_pooled_run_looks_like_a_normal_run(self):
+        pool = InterpreterPool()
+        self.addCleanup(pool.shutdown)
+        self.assertIsNone(pool.acquire('python'))  # Empty at first, starts filling
+        deadline = time.monotonic() + 10
+        while not pool._idle['python'] and time.monotonic() < deadline:
+            time.sleep(0.05)
+        code = "import os, sys\nprint(__name__, os.path.basename(sys.argv[0]), input())\n"
+        with mock.patch('editor.utils.interpreter_pool', pool):
+            stdout, stderr, success, duration, memory, files, extra = execute_code(code, 'python', "hi", use_cache=False)
+        self.assertTrue(extra.get('pooled'))
+        self.assertEqual(stdout, "__main__ main.py hi\n")
+        self.assertTrue(success)
+
+
+class RunnerTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        self.address = f"unix:{tmp.name}/runner.sock"
+        self.server = make_server(self.address, 2)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def request(self, message):
+        with connect(self.address, 5) as sock:
+            send_message(sock, message)
+            return recv_message(sock)
+
+    def test_health_and_unknown_op(self):
+        health = self.request({'op': 'health'})
+        self.assertEqual((health['event'], health['workers'], health['load']), ('health', 2, 0))
+        self.assertEqual(self.request({'op': 'nope'}), {'event': 'error', 'error': 'Unknown op "nope"'})
+
+    def test_run_streams_output_then_the_result(self):
+        streamed = []
+        backend = RemoteBackend([f"unix:{self.tmp}/missing.sock", self.address])
+        stdout, stderr, success, *_, extra = backend.execute(
+            "print(input())", 'python', "hi", on_output=lambda stream, text: streamed.append((stream, text)),
+            checker=Checker("hi"), use_cache=False
+        )
+        self.assertEqual((stdout, success, extra['check']['passed']), ("hi\n", True, True))
+        self.assertEqual("".join(text for stream, text in streamed if stream == 'stdout'), "hi\n")
+        # The dead runner was tried and put aside
+        self.assertEqual([node.healthy for node in backend.nodes], [False, True])
+
+    def test_batch(self):
+        backend = RemoteBackend([self.address])
+        result = backend.run_batch("print(int(input()) + 1)", 'python',
+                                   [{'input': "1", 'expected': "2"}, {'input': "2", 'expected': "4"}], workers=4)
+        self.assertEqual([case['verdict'] for case in result['cases']], ["AC", "WA"])
+
+    def test_frames_are_length_prefixed_json(self):
+        with connect(self.address, 5) as sock:
+            data = json.dumps({'op': 'health'}).encode()
+            sock.sendall(len(data).to_bytes(4, 'big') + data)
+            size = int.from_bytes(sock.recv(4), 'big')
+            reply = b""
+            while len(reply) < size:
+                reply += sock.recv(size - len(reply))
+        self.assertEqual(json.loads(reply)['event'], 'health')
+
+    def test_health_reply_that_isnt_an_object_marks_the_runner_down(self):
+        address = f"unix:{self.tmp}/odd.sock"
+        listener = socket.socket(socket.AF_UNIX)
+        listener.bind(address[len('unix:'):])
+        listener.listen()
+        self.addCleanup(listener.close)
+
+        def answer():
+            conn, _ = listener.accept()
+            with conn:
+                recv_message(conn)
+                conn.sendall(len(b"[1]").to_bytes(4, 'big') + b"[1]")
+        threading.Thread(target=answer, daemon=True).start()
+        backend = RemoteBackend([address])
+        backend.check(backend.nodes[0])
+        self.assertFalse(backend.nodes[0].healthy)
+        self.assertIn("expected an object", backend.nodes[0].error)
+
+
+class InputStoreTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings_override = override_settings(INPUT_ROOT=tmp.name, INPUT_MAX_BYTES=1000)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, data):
+        return self.client.post('/inputs/', data, content_type='application/octet-stream')
+
+    def test_upload_then_run_with_the_hash(self):
+        response = self.upload(b"3\n4\n")
+        self.assertEqual(response.status_code, 201)
+        input_hash = response.json()['input_hash']
+        self.assertEqual(input_hash, input_digest("3\n4\n"))
+        self.assertEqual(self.client.get(f'/inputs/{input_hash}/').json()['size'], 4)
+        response = self.client.post('/run/', json.dumps({
+            'code': "import sys\nprint(sum(map(int, sys.stdin.read().split())))",
+            'language': 'python', 'input_hash': input_hash,
+        }), content_type='application/json')
+        self.assertEqual(response.json()['stdout'], "7\n")
+
+    def test_multipart_run_with_an_input_file(self):
+        response = self.client.post('/run/', {
+            'code': "print(input()[::-1])", 'language': 'python',
+            'input': SimpleUploadedFile('input.txt', b"abc\n"),
+        })
+        self.assertEqual(response.json()['stdout'], "cba\n")
+
+    def test_stored_inputs_are_private(self):
+        from .inputs import InputStore, get_root
+        root = os.path.join(settings.INPUT_ROOT, 'store')
+        stored = InputStore(root).put([b"secret"])
+        self.assertEqual(os.stat(root).st_mode & 0o777, 0o700)
+        self.assertEqual(os.stat(os.path.dirname(stored.path)).st_mode & 0o777, 0o700)
+        self.assertEqual(os.stat(stored.path).st_mode & 0o777, 0o400)
+        with override_settings(INPUT_ROOT=None):
+            self.assertFalse(get_root().startswith(sandbox.get_root()))
+
+    def test_async_run_stores_the_upload_off_the_event_loop(self):
+        from .inputs import input_store
+        loops = []
+
+        def put(chunks):
+            loops.append(asyncio._get_running_loop())
+            return store(chunks)
+        store = input_store.put
+        with mock.patch.object(input_store, 'put', side_effect=put):
+            response = self.client.post('/run/async/', {
+                'code': "print(input()[::-1])", 'language': 'python',
+                'input': SimpleUploadedFile('input.txt', b"abc\n"),
+            })
+        self.assertEqual(response.json()['stdout'], "cba\n")
+        self.assertEqual(loops, [None])
+
+    def test_limits_and_unknown_inputs(self):
+        self.assertEqual(self.upload(b"x" * 1001).status_code, 413)
+        self.assertEqual(self.client.get(f'/inputs/{"0" * 64}/').status_code, 404)
+        response = self.client.post('/run/', json.dumps({'code': "print(1)", 'language': 'python', 'input_hash': "0" * 64}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
+
+class ProfilerTests(SimpleTestCase):
+    def test_python_profile_names_the_hot_function(self):
+        code = "def hot():\n    return sum(i * i for i in range(200000))\nfor _ in range(5):\n    hot()\nprint('done')"
+        stdout, _, success, _, _, _, extra = execute_code(code, 'python', profile=True)
+        self.assertTrue(success)
+        self.assertEqual(stdout, "done\n")
+        self.assertEqual(extra['profile']['tool'], 'cProfile')
+        names = [row['name'] for row in extra['profile']['functions']]
+        self.assertTrue(any('hot' in name for name in names), names)
+        self.assertLessEqual(len(names), profiler.top())
+
+    @unittest.skipUnless(shutil.which('gcc') and shutil.which('gprof'), "gcc and gprof are needed")
+    def test_c_profile_with_gprof(self):
+        code = (
+            "#include <stdio.h>\n"
+            "__attribute__((noinline)) long hot(long n) { long s = 0; for (long i = 0; i < n; i++) s += i % 7; return s; }\n"
+            "int main(void) { long s = 0; for (int i = 0; i < 20; i++) s += hot(5000000); printf(\"%ld\\n\", s); }\n"
+        )
+        stdout, _, success, _, _, files, extra = execute_code(code, 'c', profile=True)
+        self.assertTrue(success)
+        self.assertTrue(stdout.strip())
+        self.assertEqual(extra['profile']['tool'], 'gprof')
+        names = [row['name'] for row in extra['profile']['functions']]
+        self.assertIn('hot', names)
+        self.assertFalse(any(name.startswith('webide_profile_') for name in names))
+        self.assertNotIn(profiler.GMON, [f['name'] for f in files])
+
+    def test_gprof_rows(self):
+        match = profiler.GPROF_ROW.match(" 87.50      0.07     0.07       20     3.50     3.50  hot")
+        self.assertEqual(match.groups(), ('87.50', '0.07', '0.07', '20', '3.50', '3.50', 'hot'))
+        # Functions gprof saw in samples but never counted calls of
+        match = profiler.GPROF_ROW.match(" 12.50      0.08     0.01                             frame_dummy")
+        self.assertEqual(match.group(4), None)
+        self.assertEqual(match.group(7), 'frame_dummy')
+        self.assertIsNone(profiler.GPROF_ROW.match("  %   cumulative   self              self     total"))
+
+    def test_unsupported_language_and_missing_profile(self):
+        _, stderr, success, _, _, _, _ = execute_code("console.log(1)", 'javascript', profile=True)
+        self.assertFalse(success)
+        self.assertIn("not supported", stderr)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.assertIn('error', profiler.collect('python', temp_dir, ['python3']))
@@ -0,0 +1,240 @@
+"""
+Toolchain discovery.
+
+When a server starts (EditorConfig.ready; other management commands skip it
+and probe on first use) every language in COMPILER_PATHS is probed in
+parallel, in a background thread: its compiler and runtime binaries are
+resolved on PATH, asked for their version, and the wall time of that call is
+kept as a rough measure of the binary's start-up cost. The results feed the
+language dropdown (languages whose binaries are missing are left out), the
+compile cache keys (get_version) and /health/.
+
+Probes are saved to TOOLCHAIN_CACHE_FILE keyed by binary path, mtime and
+size, so a restart only needs a stat() per binary, and an upgraded compiler is
+noticed (and probed again) without clearing anything.
+"""
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .compile_cache import CACHE_DIR
+
+# Arguments that make each compiler print its version (part of the cache key)
+VERSION_ARGS = {
+    "c": ["--version"],
+    "cpp": ["--version"],
+    "asm": ["--version"],
+    "pascal": ["-iV"],
+    "go": ["version"],
+    "java": ["-version"],
+    "kotlin": ["-version"],
+}
+# The `java` launcher runs Java and Kotlin programs
+RUNTIME_VERSION_ARGS = {
+    "java": ["-version"],
+    "kotlin": ["-version"],
+}
+
+PROBE_TIMEOUT = 10  # Seconds
+
+# Bumped when the cache file format changes
+CACHE_FORMAT = 1
+
+_binaries = {}  # resolved path -> probe, see _probe_binary
+_languages = {}  # language -> probe, see probe_language
+_lock = threading.Lock()
+_loaded = False
+_probe_started = False
+_probed = threading.Event()
+
+
+def get_cache_file():
+    return getattr(settings, 'TOOLCHAIN_CACHE_FILE', None) or os.path.join(CACHE_DIR, 'toolchains.json')
+
+
+def _signature(path):
+    st = os.stat(path)
+    return [st.st_mtime, st.st_size]
+
+
+def _load():
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    try:
+        with open(get_cache_file(), encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return
+    if data.get('format') == CACHE_FORMAT:
+        _binaries.update(data.get('binaries', {}))
+
+
+def _save():
+    path = get_cache_file()
+    with _lock:
+        data = json.dumps({'format': CACHE_FORMAT, 'binaries': _binaries}, indent=1)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass  # Only a speed-up for the next start
+
+
+def _probe_binary(binary, version_args):
+    """
+    Version and start-up time of `binary`, from the cache when the file is
+    unchanged. Returns a dict with path (None if not found), version, startup
+    and error.
+    """
+    resolved = shutil.which(binary)
+    if resolved is None:
+        return {'path': None, 'version': "", 'startup': None, 'error': f"{binary} not found"}
+    try:
+        signature = _signature(resolved)
+    except OSError as e:
+        return {'path': resolved, 'version': "", 'startup': None, 'error': str(e)}
+    with _lock:
+        _load()
+        cached = _binaries.get(resolved)
+        if cached is not None and cached['signature'] == signature and cached['args'] == version_args:
+            return cached
+
+    start = time.perf_counter()
+    try:
+        proc = subprocess.run(
+            [resolved] + version_args,
+            capture_output=True,
+            text=True,
+            timeout=PROBE_TIMEOUT
+        )
+        # javac prints its version on stderr
+        version = (proc.stdout or proc.stderr).strip()
+        error = None
+    except (OSError, subprocess.SubprocessError) as e:
+        version = ""
+        error = str(e) or type(e).__name__
+    probe = {
+        'path': resolved,
+        'signature': signature,
+        'args': version_args,
+        'version': version,
+        'startup': round(time.perf_counter() - start, 3),
+        'error': error,
+    }
+    with _lock:
+        _binaries[resolved] = probe
+    if _probed.is_set():
+        _save()  # Changed since the startup probe, which saves its own results
+    return probe
+
+
+def get_version(language, compiler):
+    """
+    Version banner of `compiler`, the one recorded by the startup probe unless
+    the binary has changed since. Empty if it can't be run.
+    """
+    return _probe_binary(compiler, VERSION_ARGS.get(language, ["--version"]))['version']
+
+
+def language_binaries(language):
+    """{role: binary} for `language` ("compiler" and/or "runtime"), None if unsupported."""
+    from .utils import get_language_config  # utils imports this module
+
+    config = get_language_config(language, "")
+    if config is None:
+        return None
+    _, compile_cmd, cmd, _ = config
+    binaries = {}
+    if compile_cmd:
+        binaries['compiler'] = compile_cmd[0]
+    if cmd[0] != "main.exe":  # Not a native binary built from the submission
+        binaries['runtime'] = cmd[0]
+    return binaries
+
+
+def probe_language(language):
+    binaries = language_binaries(language)
+    if binaries is None:
+        return {'available': False, 'error': "Unsupported language", 'binaries': {}}
+    probes = {}
+    for role, binary in binaries.items():
+        if role == 'runtime':
+            args = RUNTIME_VERSION_ARGS.get(language, ["--version"])
+        else:
+            args = VERSION_ARGS.get(language, ["--version"])
+        probe = _probe_binary(binary, args)
+        probes[role] = {
+            'path': probe['path'],
+            'version': probe['version'].splitlines()[0] if probe['version'] else "",
+            'startup': probe['startup'],
+            'error': probe['error'],
+        }
+    errors = [probe['error'] for probe in probes.values() if probe['error']]
+    return {
+        'available': not errors,
+        'error': "; ".join(errors) or None,
+        'binaries': probes,
+    }
+
+
+def configured_languages():
+    return [lang for lang in getattr(settings, 'COMPILER_PATHS', {}) if lang != "java_run"]
+
+
+def probe_all():
+    """Probes every configured language in parallel. Returns {language: probe}."""
+    languages = configured_languages()
+    results = {}
+    if languages:
+        with ThreadPoolExecutor(max_workers=len(languages)) as pool:
+            results = dict(zip(languages, pool.map(probe_language, languages)))
+    with _lock:
+        _languages.clear()
+        _languages.update(results)
+    _save()
+    _probed.set()
+    return results
+
+
+def start_probe():
+    """Starts probe_all in the background, once per process."""
+    global _probe_started
+    with _lock:
+        if _probe_started:
+            return
+        _probe_started = True
+    threading.Thread(target=probe_all, daemon=True).start()
+
+
+def get_toolchains(timeout=None):
+    """
+    {language: probe} from the startup probe, waiting for it if it's still
+    running (and starting it if it never was). None if it doesn't finish in time.
+    """
+    start_probe()
+    if not _probed.wait(timeout):
+        return None
+    with _lock:
+        return dict(_languages)
+
+
+def available_languages():
+    """
+    Configured languages whose toolchain was found, in COMPILER_PATHS order.
+    Never waits for the probe: pages and runner health checks are answered
+    right away, with every configured language until the probe is done.
+    """
+    toolchains = get_toolchains(timeout=0)
+    if toolchains is None:
+        return configured_languages()  # Still probing: don't hide anything
+    return [lang for lang in configured_languages() if toolchains.get(lang, {}).get('available')]
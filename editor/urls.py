@@ -4,6 +4,16 @@ from . import views
 urlpatterns = [
     path('', views.index, name='index'),
     path('run/', views.run_code, name='run_code'),
+    path('run/async/', views.run_code_async, name='run_code_async'),
+    path('run/stream/', views.run_code_stream, name='run_code_stream'),
+    path('run/batch/', views.run_batch, name='run_batch'),
+    path('jobs/', views.submit_job, name='submit_job'),
+    path('jobs/<str:job_id>/', views.job_status, name='job_status'),
+    path('files/<str:run_id>/<str:name>', views.download_file, name='download_file'),
+    path('inputs/', views.upload_input, name='upload_input'),
+    path('inputs/<str:input_hash>/', views.input_status, name='input_status'),
+    path('health/', views.health, name='health'),
+    path('metrics', views.metrics_view, name='metrics'),
     path('share/', views.save_snippet, name='save_snippet'),
     path('share/<uuid:snippet_id>/', views.get_snippet, name='get_snippet'),
 ]
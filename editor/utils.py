@@ -7,235 +7,565 @@ import threading
 import hashlib
 import shutil
 from django.conf import settings
+from .compile_cache import compile_cache, copy_artifacts
+from . import limits, metrics, pch, profiler, projects, toolchains
+from .artifacts import artifact_store
+from .inputs import StoredInput
+from .interpreter_pool import interpreter_pool, make_header
+from .jvm_worker import JVM_LANGUAGES, jvm_pool
+from .result_cache import get_result_key, is_cacheable, result_cache
+from .sandbox import sandbox_pool
+from .output import feed_stdin, pump, stderr_capture, stdout_capture
 
-CACHE_DIR = os.path.join(settings.BASE_DIR, 'compilation_cache')
-if not os.path.exists(CACHE_DIR):
-    os.makedirs(CACHE_DIR)
+# Languages whose build artifacts can be stored in the compile cache
+CACHEABLE_LANGUAGES = ["c", "cpp", "pascal", "java", "go", "kotlin", "asm"]
 
-# Max output size in characters (approx bytes) to prevent memory overflow
-MAX_OUTPUT_SIZE = 50000  # 50KB
+COMPILE_TIMEOUT = 10  # Seconds
 
 def get_code_hash(code, language):
-    """Returns SHA256 hash of code + language."""
+    """Returns SHA256 hash of code (a source, or a project's files) + language."""
+    if projects.is_project(code):
+        return hashlib.sha256(f"{language}::project::{projects.project_hash(code)}".encode('utf-8')).hexdigest()
     return hashlib.sha256(f"{language}::{code}".encode('utf-8')).hexdigest()
 
-def execute_code(code, language, input_data=""):
+def get_build_key(code, language, compile_cmd):
     """
-    Executes code in a temporary directory and returns:
-    stdout, stderr, success, duration (s), memory (KB), created_files (dict)
+    Cache key for a build: the code plus everything that affects the output,
+    i.e. the compiler binary, its version and the full command line (flags).
+    compile_cmd must only reference paths relative to the build directory.
+    """
+    compiler = compile_cmd[0]
+    parts = [
+        language,
+        shutil.which(compiler) or compiler,
+        toolchains.get_version(language, compiler),
+        "\0".join(compile_cmd),
+        code,
+    ]
+    return hashlib.sha256("\0\0".join(parts).encode('utf-8')).hexdigest()
+
+def get_language_config(language, temp_dir):
+    """
+    Returns (filename, compile_cmd, cmd, artifacts) describing how to build and
+    run `language` inside temp_dir, or None if the language is unsupported.
+    compile_cmd runs with cwd=temp_dir and uses relative paths only; artifacts
+    lists the files/directories it produces that are needed to run.
+    compile_cmd is None and artifacts empty for interpreted languages.
     """
     compiler_paths = getattr(settings, 'COMPILER_PATHS', {})
-    timeout = getattr(settings, 'EXECUTION_TIMEOUT', 5)
+    compiler_flags = getattr(settings, 'COMPILER_FLAGS', {}).get(language, [])
+    compile_cmd = None
+    artifacts = []
+    exe = os.path.join(temp_dir, "main.exe")
+
+    # File extensions and run commands
+    if language == "python":
+        filename = "main.py"
+        cmd = [compiler_paths.get("python", "python"), filename]
+    elif language == "c":
+        filename = "main.c"
+        compile_cmd = [compiler_paths.get("c", "gcc"), *compiler_flags, filename, "-o", "main.exe"]
+        artifacts = ["main.exe"]
+        cmd = [exe]
+    elif language == "cpp":
+        filename = "main.cpp"
+        compile_cmd = [compiler_paths.get("cpp", "g++"), *compiler_flags, filename, "-o", "main.exe"]
+        artifacts = ["main.exe"]
+        cmd = [exe]
+    elif language == "pascal":
+        filename = "main.pas"
+        # fpc names the binary after the source (no .exe outside Windows) unless told otherwise
+        compile_cmd = [compiler_paths.get("pascal", "fpc"), *compiler_flags, filename, "-omain.exe"]
+        artifacts = ["main.exe"]
+        cmd = [exe]
+    elif language == "javascript":
+        filename = "main.js"
+        cmd = [compiler_paths.get("javascript", "node"), filename]
+    elif language == "java":
+        filename = "Main.java"
+        # Compile to a tree of .class files (inner/extra classes included)
+        compile_cmd = [compiler_paths.get("java", "javac"), *compiler_flags, "-d", "classes", filename]
+        artifacts = ["classes"]
+        # Run the compiled class
+        cmd = [compiler_paths.get("java_run", "java"), "-cp", os.path.join(temp_dir, "classes"), "Main"]
+    elif language == "dart":
+        filename = "main.dart"
+        cmd = [compiler_paths.get("dart", "dart"), "run", filename]
+    elif language == "pypy":
+        filename = "main.py"
+        cmd = [compiler_paths.get("pypy", "pypy"), filename]
+    elif language == "go":
+        filename = "main.go"
+        compile_cmd = [compiler_paths.get("go", "go"), "build", *compiler_flags, "-o", "main.exe", filename]
+        artifacts = ["main.exe"]
+        cmd = [exe]
+    elif language == "kotlin":
+        filename = "Main.kt"
+        compile_cmd = [compiler_paths.get("kotlin", "kotlinc"), *compiler_flags, filename, "-include-runtime", "-d", "main.jar"]
+        artifacts = ["main.jar"]
+        cmd = [compiler_paths.get("java_run", "java"), "-jar", os.path.join(temp_dir, "main.jar")]
+    elif language == "asm":
+        filename = "main.asm"
+         # Assuming NASM for x86/x64 and MinGW GCC for linking
+        # nasm -f win64 main.asm -o main.obj
+        # gcc main.obj -o main.exe
+        # For simplicity, we assume one compile step if using a driver or script,
+        # but usually it's two. We'll handle 2-step in the compile logic below if needed.
+        # But wait, our compile logic below assumes 1 executeable command.
+        # We will use a small workaround or assume a custom script or just simplified flow.
+        # Let's try to do it in one pass if possible, or adapt the generic logic.
+        # For now, let's treat it as "nasm" producing object, and we need to link.
+        # The current structure supports ONE compile_cmd.
+        # We can chain commands using shell=True but that's unsafe.
+        # Workaround: "gcc -x assembler" handles AT&T syntax.
+        # If user wants NASM, we need nasm + gcc.
+        # Let's stick to GCC for "asm" as it can compile .s (assembly) directly.
+        filename = "main.s"
+        compile_cmd = [compiler_paths.get("c", "gcc"), *compiler_flags, filename, "-o", "main.exe"]
+        artifacts = ["main.exe"]
+        cmd = [exe]
+    else:
+        return None
 
-    code_hash = get_code_hash(code, language)
-    cached_exe = None
-    
-    # Check if we can use cache (only for compiled languages)
-    use_cache = language in ["c", "cpp", "pascal", "go", "asm"]
-    
-    # Define cache path
-    if use_cache:
-        cached_exe_name = f"{code_hash}.exe"
-        cached_exe_path = os.path.join(CACHE_DIR, cached_exe_name)
-        if os.path.exists(cached_exe_path):
-            cached_exe = cached_exe_path
+    return filename, compile_cmd, cmd, artifacts
+
+def _run_compiler(compile_cmd, temp_dir):
+    """Runs the compiler in temp_dir. Returns None on success, otherwise an error message."""
+    try:
+        compile_proc = subprocess.run(
+            compile_cmd,
+            cwd=temp_dir,
+            capture_output=True,
+            text=True,
+            timeout=COMPILE_TIMEOUT
+        )
+        if compile_proc.returncode != 0:
+            return f"Compilation Error:\n{compile_proc.stderr}\n{compile_proc.stdout}"
+    except subprocess.TimeoutExpired:
+        return "Compilation Timed Out"
+    except Exception as e:
+        return f"Compilation Failed: {str(e)}"
+    return None
+
+def _with_pch(language, compile_cmd, code):
+    """Returns (compile_cmd, pch_used) with ready precompiled headers on the include path."""
+    compiler = compile_cmd[0]
+    flags = getattr(settings, 'COMPILER_FLAGS', {}).get(language, [])
+    pch_args, pch_used = pch.prepare(
+        language, compiler, flags, code, toolchains.get_version(language, compiler)
+    )
+    if pch_args:
+        compile_cmd = [compiler, *pch_args, *compile_cmd[1:]]
+    return compile_cmd, pch_used
+
+def _write_source(code, temp_dir, filename):
+    with open(os.path.join(temp_dir, filename), "w", encoding="utf-8") as f:
+        f.write(code)
+
+def _use_cached(entry, temp_dir, artifacts):
+    """
+    Links (or copies) a cache entry's artifacts into temp_dir. False if there
+    is no entry or it was evicted meanwhile, with nothing left in temp_dir.
+    """
+    if entry is None:
+        return False
+    try:
+        copy_artifacts(entry, temp_dir, artifacts)
+        return True
+    except (OSError, shutil.Error):
+        # Partly copied: cached files are read-only and mustn't be built over
+        for name in artifacts:
+            path = os.path.join(temp_dir, name)
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.lexists(path):
+                os.remove(path)
+        return False
+
+def compile_code(code, language, temp_dir, compile_cmd, artifacts, filename):
+    """
+    Puts the build artifacts for code into temp_dir, from the cache when possible.
+    The source is only written to temp_dir/filename when the compiler has to run.
+
+    Compilation is single-flight across worker processes: identical submissions
+    arriving together wait on the same lock, and all but the first find the
+    freshly published artifacts instead of running the compiler again.
+    Returns (error, compile_info); error is None on success.
+    """
+    start_time = time.perf_counter()
+    compile_info = {'cached': False}
+    build_key = get_build_key(code, language, compile_cmd)
+
+    error = None
+    if _use_cached(compile_cache.get(build_key), temp_dir, artifacts):
+        compile_info['cached'] = True
+    else:
+        with compile_cache.lock(build_key, timeout=COMPILE_TIMEOUT + 5):
+            # Someone else may have compiled it while we were waiting
+            if _use_cached(compile_cache.get(build_key), temp_dir, artifacts):
+                compile_info['cached'] = True
+            else:
+                # PCH flags don't change the output, so they stay out of build_key
+                compile_cmd, pch_used = _with_pch(language, compile_cmd, code)
+                _write_source(code, temp_dir, filename)
+                error = _run_compiler(compile_cmd, temp_dir)
+                if error is None:
+                    if not all(os.path.exists(os.path.join(temp_dir, name)) for name in artifacts):
+                        error = "Compilation Failed: compiler produced no output"
+                    else:
+                        compile_cache.put(build_key, temp_dir, artifacts)
+                if pch_used:
+                    compile_info['pch'] = [meta['header'] for meta in pch_used]
+                    compile_info['pch_saved'] = round(sum(meta['saved'] for meta in pch_used), 3)
+
+    compile_info['time'] = round(time.perf_counter() - start_time, 3)
+    return error, compile_info
+
+def compile_to_cache(code, language):
+    """
+    Compiles code without running it and stores the artifacts in the compile cache.
+    Returns (success, message). Used to warm the cache ahead of time.
+    """
+    if language not in CACHEABLE_LANGUAGES:
+        return False, f"{language} builds are not cached"
 
     with tempfile.TemporaryDirectory() as temp_dir:
-        # File extensions and run commands
-        if language == "python":
-            filename = "main.py"
-            cmd = [compiler_paths.get("python", "python"), filename]
-        elif language == "c":
-            filename = "main.c"
-            exe = os.path.join(temp_dir, "main.exe")
-            compile_cmd = [compiler_paths.get("c", "gcc"), filename, "-o", exe]
-            cmd = [exe]
-        elif language == "cpp":
-            filename = "main.cpp"
-            exe = os.path.join(temp_dir, "main.exe")
-            compile_cmd = [compiler_paths.get("cpp", "g++"), filename, "-o", exe]
-            cmd = [exe]
-        elif language == "pascal":
-            filename = "main.pas"
-            exe = os.path.join(temp_dir, "main.exe")
-            compile_cmd = [compiler_paths.get("pascal", "fpc"), filename]
-            cmd = [exe]
-        elif language == "javascript":
-            filename = "main.js"
-            cmd = [compiler_paths.get("javascript", "node"), filename]
-        elif language == "java":
-            filename = "Main.java"
-            # Compile to .class
-            compile_cmd = [compiler_paths.get("java", "javac"), filename]
-            # Run the compiled class (cp . Main)
-            cmd = [compiler_paths.get("java_run", "java"), "-cp", temp_dir, "Main"]
-        elif language == "dart":
-            filename = "main.dart"
-            cmd = [compiler_paths.get("dart", "dart"), "run", filename]
-        elif language == "pypy":
-            filename = "main.py"
-            cmd = [compiler_paths.get("pypy", "pypy"), filename]
-        elif language == "go":
-            filename = "main.go"
-            exe = os.path.join(temp_dir, "main.exe")
-            compile_cmd = [compiler_paths.get("go", "go"), "build", "-o", exe, filename]
-            cmd = [exe]
-        elif language == "kotlin":
-            filename = "Main.kt"
-            jar = os.path.join(temp_dir, "main.jar")
-            compile_cmd = [compiler_paths.get("kotlin", "kotlinc"), filename, "-include-runtime", "-d", jar]
-            cmd = [compiler_paths.get("java_run", "java"), "-jar", jar]
-        elif language == "asm":
-            filename = "main.asm"
-             # Assuming NASM for x86/x64 and MinGW GCC for linking
-            obj = os.path.join(temp_dir, "main.obj")
-            exe = os.path.join(temp_dir, "main.exe")
-            # nasm -f win64 main.asm -o main.obj
-            # gcc main.obj -o main.exe
-            # For simplicity, we assume one compile step if using a driver or script,
-            # but usually it's two. We'll handle 2-step in the compile logic below if needed.
-            # But wait, our compile logic below assumes 1 executeable command.
-            # We will use a small workaround or assume a custom script or just simplified flow.
-            # Let's try to do it in one pass if possible, or adapt the generic logic.
-            # For now, let's treat it as "nasm" producing object, and we need to link.
-            # The current structure supports ONE compile_cmd.
-            # We can chain commands using shell=True but that's unsafe.
-            # Workaround: "gcc -x assembler" handles AT&T syntax.
-            # If user wants NASM, we need nasm + gcc.
-            # Let's stick to GCC for "asm" as it can compile .s (assembly) directly.
-            filename = "main.s"
-            exe = os.path.join(temp_dir, "main.exe")
-            compile_cmd = [compiler_paths.get("c", "gcc"), filename, "-o", exe]
-            cmd = [exe]
+        filename, compile_cmd, cmd, artifacts = get_language_config(language, temp_dir)
+        if compile_cache.get(get_build_key(code, language, compile_cmd)):
+            return True, "already cached"
+        error, compile_info = compile_code(code, language, temp_dir, compile_cmd, artifacts, filename)
+        if error:
+            return False, error
+    return True, "compiled"
+
+def build_precompiled_headers():
+    """
+    Builds the configured precompiled headers for every enabled C/C++ compiler
+    right away. Returns a list of (language, header, meta or None).
+    """
+    compiler_paths = getattr(settings, 'COMPILER_PATHS', {})
+    results = []
+    for language in pch.HEADER_LANGUAGES:
+        if language not in compiler_paths:
+            continue
+        compile_cmd = get_language_config(language, "")[1]
+        compiler = compile_cmd[0]
+        flags = getattr(settings, 'COMPILER_FLAGS', {}).get(language, [])
+        version = toolchains.get_version(language, compiler)
+        for header in pch.get_headers(language):
+            results.append((language, header, pch.build_pch(language, compiler, flags, header, version)))
+    return results
+
+def prepare_run(code, language, temp_dir, extra):
+    """
+    Puts what's needed to run code into temp_dir: the source for interpreted
+    languages, the build artifacts (compiled or from the cache) otherwise.
+    code may also be a multi-file project, {path: source} (see projects.py).
+    Returns (filename, cmd, artifacts, error); error is None when ready to run.
+    """
+    config = get_language_config(language, temp_dir)
+    if config is None:
+        return None, None, [], "Unsupported language"
+    if projects.is_project(code):
+        return projects.prepare(code, language, temp_dir, extra, config)
+    filename, compile_cmd, cmd, artifacts = config
+
+    # Compilation Logic
+    if compile_cmd:
+        error, extra['compile'] = compile_code(code, language, temp_dir, compile_cmd, artifacts, filename)
+        if error:
+            return filename, cmd, artifacts, error
+    else:
+        _write_source(code, temp_dir, filename)
+
+    return filename, cmd, artifacts, None
+
+def finish_run(result, temp_dir, filename, artifacts, timeout, extra):
+    """
+    Turns a run result (stdout, stderr, returncode, duration, peak_memory_kb)
+    into execute_code's return value, moving created files from temp_dir
+    into the artifact store.
+    """
+    stdout, stderr, returncode, duration, peak_memory_kb = result
+    if returncode is None:
+        return "", "Execution Timed Out", False, timeout, peak_memory_kb, [], extra
+
+    if extra.get('output_limit_exceeded'):
+        stderr += "\nOutput Limit Exceeded"
+    elif limits.limit_message(returncode):
+        stderr += "\n" + limits.limit_message(returncode)
+    wrong_answer = extra.get('check', {}).get('passed') is False
+    if wrong_answer:
+        stderr += "\nWrong Answer: " + extra['check']['message']
+
+    # Whether the checker killed the program or it exited first is a race, the answer is wrong either way
+    success = returncode == 0 and not wrong_answer
+    created_files, omitted = artifact_store.collect(temp_dir, {filename, *artifacts})
+    if omitted:
+        extra['files_omitted'] = omitted
+    return stdout, stderr, success, round(duration, 3), round(peak_memory_kb, 0), created_files, extra
+
+def result_cache_key(code, language, input_data, checker=None, use_cache=True, profile=False):
+    """Result cache key of a run, or None if it mustn't be answered from the result cache."""
+    if not use_cache or checker is not None or profile:
+        return None
+    return get_result_key(code, language, input_data, get_code_hash(code, language))
+
+def cached_result(cache_key, language, timer, timings=False, on_output=None):
+    """Looks a run up in the result cache. Returns execute_code's return value, or None on a miss."""
+    with timer.phase('cache_lookup'):
+        cached = result_cache.get(cache_key)
+    metrics.RESULT_CACHE.inc(language=language, result='miss' if cached is None else 'hit')
+    if cached is None:
+        return None
+    metrics.RUNS.inc(language=language, outcome='cached')
+    if on_output is not None:
+        for stream, text in (('stdout', cached[0]), ('stderr', cached[1])):
+            if text:
+                on_output(stream, text)
+    if timings:
+        cached[6]['timings'] = timer.timings
+    return cached
+
+def prepare_execution(code, language, temp_dir, extra, timeout, timer, profile=False):
+    """prepare_run, or with profile its profiler variant (see profiler.py)."""
+    with timer.phase('prepare'):
+        if profile:
+            return profiler.prepare_profiled_run(code, language, temp_dir, extra, timeout)
+        return prepare_run(code, language, temp_dir, extra)
+
+def failed_run(message, extra):
+    """execute_code's return value for a run that couldn't start or complete."""
+    return "", message, False, 0, 0, [], extra
+
+def collect_run(result, language, temp_dir, filename, cmd, artifacts, timeout, extra, timer, profile=False):
+    """
+    After run_prepared: the profile (with profile), then execute_code's return
+    value (see finish_run). Returns (that value, metrics outcome).
+    """
+    if profile:
+        with timer.phase('profile'):
+            extra['profile'] = profiler.collect(language, temp_dir, cmd)
+    with timer.phase('collect'):
+        final = finish_run(result, temp_dir, filename, artifacts, timeout, extra)
+    return final, metrics.outcome(result[2], extra)
+
+def store_result(cache_key, result, final):
+    """Puts a completed run into the result cache, if it may be reused."""
+    if cache_key is not None and result is not None and is_cacheable(result[2], final):
+        result_cache.put(cache_key, final)
+
+def execute_code(code, language, input_data="", on_output=None, checker=None, use_cache=True, timings=False,
+                 profile=False):
+    """
+    Executes code in a work directory from the sandbox pool and returns:
+    stdout, stderr, success, duration (wall clock s), memory (KB),
+    created_files (manifest list, see artifacts.py),
+    extra (dict of additional response fields, e.g. compile info, cpu_time)
+
+    input_data is a string, or a StoredInput (see inputs.py) that becomes the
+    program's stdin as is.
+    on_output(stream, text), if given, is called with output chunks as the
+    program produces them ("stdout" or "stderr"). A checker (checker.Checker)
+    judges stdout as it streams; its result goes into extra['check'].
+    With RESULT_CACHE_ENABLED, repeated runs may be answered from the result
+    cache (extra['cached'] is then True), unless use_cache is False.
+    With timings, extra['timings'] holds the seconds spent in each phase.
+    With profile, the program runs under a profiler and extra['profile'] holds
+    its hottest functions (see profiler.py); such runs are never cached.
+    """
+    timer = metrics.RunTimer(language)
+    cache_key = result_cache_key(code, language, input_data, checker, use_cache, profile)
+    if cache_key is not None:
+        cached = cached_result(cache_key, language, timer, timings, on_output)
+        if cached is not None:
+            return cached
+
+    timeout = getattr(settings, 'EXECUTION_TIMEOUT', 5)
+    extra = {}
+    result = None
+
+    with timer.phase('sandbox'):
+        temp_dir = sandbox_pool.acquire()
+    try:
+        filename, cmd, artifacts, error = prepare_execution(code, language, temp_dir, extra, timeout, timer, profile)
+        if error:
+            final, outcome = failed_run(error, extra), 'compile_error'
         else:
-            return "", "Unsupported language", False, 0, 0, {}
-
-        # Write code to file (always needed for Python or fresh compile)
-        file_path = os.path.join(temp_dir, filename)
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(code)
-
-        # Compilation Logic
-        if language in ["c", "cpp", "pascal", "java", "go", "kotlin", "asm"]:
-            if cached_exe:
-                # COPY cached exe to temp dir to run it
-                shutil.copy(cached_exe, exe)
+            try:
+                with timer.phase('execute'):
+                    result = run_prepared(language, temp_dir, filename, cmd, input_data, timeout, extra, on_output, checker,
+                                          pooled=not profile)
+            except Exception as e:
+                final, outcome = failed_run(f"Execution Error: {str(e)}", extra), 'internal_error'
             else:
-                # COMPILE
-                try:
-                    compile_proc = subprocess.run(
-                        compile_cmd,
-                        cwd=temp_dir,
-                        capture_output=True,
-                        text=True,
-                        timeout=10
-                    )
-                    if compile_proc.returncode != 0:
-                        return "", f"Compilation Error:\n{compile_proc.stderr}\n{compile_proc.stdout}", False, 0, 0, {}
-                    
-                    # Cache the successful binary
-                    if os.path.exists(exe):
-                        shutil.copy(exe, cached_exe_path)
-                        
-                except subprocess.TimeoutExpired:
-                    return "", "Compilation Timed Out", False, 0, 0, {}
-                except Exception as e:
-                    return "", f"Compilation Failed: {str(e)}", False, 0, 0, {}
-
-        # Execution with monitoring
-        start_time = time.perf_counter()
-        peak_memory_kb = 0
-        
+                final, outcome = collect_run(result, language, temp_dir, filename, cmd, artifacts, timeout, extra,
+                                             timer, profile)
+    finally:
+        with timer.phase('cleanup'):
+            sandbox_pool.release(temp_dir)
+    metrics.record_run(language, outcome, extra)
+
+    store_result(cache_key, result, final)
+    if timings:
+        extra['timings'] = timer.timings
+    return final
+
+def run_prepared(language, temp_dir, filename, cmd, input_data, timeout, extra, on_output=None, checker=None,
+                 pooled=True):
+    """
+    Runs a program that prepare_run has set up in temp_dir. Without pooled, it
+    runs as a process of its own even if a pooled interpreter or JVM is free.
+    Returns (stdout, stderr, returncode, duration, peak_memory_kb); returncode is None on timeout.
+    """
+    result = None
+    if pooled and language in JVM_LANGUAGES:
+        # Long-lived JVM, if enabled and one is free
+        result = jvm_pool.run(language, temp_dir, input_data, timeout, extra, checker)
+        if result is not None:
+            extra['pooled'] = True
+            if on_output is not None:
+                # Output only comes back once the JVM is done with it
+                on_output('stdout', result[0])
+                on_output('stderr', result[1])
+    if result is None:
+        result = _run_process(cmd, temp_dir, filename, language, input_data, timeout, extra, on_output, checker,
+                              pooled)
+    finish_check(checker, result, extra)
+    return result
+
+def finish_check(checker, result, extra):
+    """Once the program has ended (but not timed out), puts the checker's verdict into extra['check']."""
+    if checker is not None and result[2] is not None:
+        checker.finish()
+        extra['check'] = checker.result()
+
+def result_to_dict(result):
+    """Converts execute_code's return value into the /run/ JSON payload."""
+    stdout, stderr, success, duration, memory, files, extra = result
+    return {
+        'stdout': stdout,
+        'stderr': stderr,
+        'success': success,
+        'duration': duration,
+        'memory': memory,
+        'files': files,
+        **extra
+    }
+
+def monitor_memory(proc, usage):
+    """
+    Polls the RSS of `proc` until it exits, keeping the peak (KB) in usage['peak'].
+    Only used where wait4 isn't available (see limits.py).
+    """
+    try:
+        p = psutil.Process(proc.pid)
+        while proc.poll() is None:
+            try:
+                # Handling fast execution where process dies before we check
+                mem = p.memory_info().rss / 1024  # KB
+                if mem > usage['peak']:
+                    usage['peak'] = mem
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                break
+            time.sleep(0.1)  # OPTIMIZED: Reduced polling frequency
+    except:
+        pass
+
+def _run_process(cmd, temp_dir, filename, language, input_data, timeout, extra, on_output=None, checker=None,
+                 pooled=True):
+    """
+    Runs the program with monitoring, reading its output as it is produced.
+    Returns (stdout, stderr, returncode, duration, peak_memory_kb); returncode is None on timeout.
+    CPU time, when it can be measured, is stored in extra['cpu_time'].
+    """
+    start_time = time.perf_counter()
+    usage = {'peak': 0}
+    stdin_file = None
+    stdin_data = None
+    process = None
+
+    if isinstance(input_data, StoredInput):
+        # The program reads the stored file directly (see inputs.py)
+        stdin_file = input_data.open()
+    else:
+        stdin_data = input_data.encode('utf-8')
+        # Prefer an already started interpreter, it only needs to be told what to run
+        process = interpreter_pool.acquire(language) if pooled else None
+        if process is not None:
+            stdin_data = make_header(temp_dir, filename).encode('utf-8') + stdin_data
+            extra['pooled'] = True
+    if process is None:
         try:
-            process = subprocess.Popen(
+            process = limits.LimitedPopen(
                 cmd,
+                language,
+                timeout,
                 cwd=temp_dir,
-                stdin=subprocess.PIPE,
+                stdin=stdin_file or subprocess.PIPE,
                 stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
+                stderr=subprocess.PIPE
             )
+        finally:
+            if stdin_file is not None:
+                stdin_file.close()  # The child has its own descriptor
 
-            # Thread to poll memory usage
-            def monitor_memory(proc):
-                nonlocal peak_memory_kb
-                try:
-                    p = psutil.Process(proc.pid)
-                    while proc.poll() is None:
-                        try:
-                            # Handling fast execution where process dies before we check
-                            mem = p.memory_info().rss / 1024  # KB
-                            if mem > peak_memory_kb:
-                                peak_memory_kb = mem
-                        except (psutil.NoSuchProcess, psutil.AccessDenied):
-                            break
-                        time.sleep(0.1)  # OPTIMIZED: Reduced polling frequency
-                except:
-                    pass
-
-            monitor_thread = threading.Thread(target=monitor_memory, args=(process,))
-            monitor_thread.start()
+    def kill():
+        try:
+            process.kill()
+        except OSError:
+            pass
 
-            try:
-                stdout_data = []
-                stderr_data = []
-                total_out = 0
-                total_err = 0
-                
-                # We use communicate with a timeout, but if we want to limit size we should ideally read streams.
-                # However, for simplicity and stability with the current threading model, we will use communicate 
-                # but we rely on the OS pipe buffer and the timeout to save us from infinite loops.
-                # To be safer against strictly large output, we'd need a select loop, but that's complex on Windows.
-                # Let's stick to communicate but TRUNCATE the result immediately to release memory if possible, 
-                # although Python's strings are immutable so we might spike.
-                
-                # A better approach for "Low Memory" without complex async code:
-                # We can't easily limit communicate's buffer.
-                # But we can limit what we store.
-                
-                stdout, stderr = process.communicate(input=input_data, timeout=timeout)
-                
-                if len(stdout) > MAX_OUTPUT_SIZE:
-                    stdout = stdout[:MAX_OUTPUT_SIZE] + "\n... [Output Truncated]"
-                
-                if len(stderr) > MAX_OUTPUT_SIZE:
-                    stderr = stderr[:MAX_OUTPUT_SIZE] + "\n... [Error Truncated]"
-                    
-            except subprocess.TimeoutExpired:
-                process.kill()
-                return "", "Execution Timed Out", False, timeout, peak_memory_kb, {}
-            monitor_thread.join(timeout=1)
-            
-            duration = time.perf_counter() - start_time
-            success = (process.returncode == 0)
-            
-            # Capture created files before temp_dir is deleted
-            created_files = {}
-            try:
-                for item in os.listdir(temp_dir):
-                    item_path = os.path.join(temp_dir, item)
-                    # Skip source file, executables, and directories
-                    if os.path.isfile(item_path) and item != filename:
-                        # Skip compiled artifacts
-                        if item in ['main.exe', 'main.jar', 'main.obj', 'Main.class']:
-                            continue
-                        try:
-                            # Try to read as text
-                            with open(item_path, 'r', encoding='utf-8', errors='ignore') as f:
-                                content = f.read(MAX_OUTPUT_SIZE)
-                                if len(content) > MAX_OUTPUT_SIZE:
-                                    content = content[:MAX_OUTPUT_SIZE] + "\n... [File Truncated]"
-                                created_files[item] = content
-                        except:
-                            pass  # Skip unreadable files
-            except:
-                pass  # If we can't list files, just continue
-            
-            return stdout, stderr, success, round(duration, 3), round(peak_memory_kb, 0), created_files
+    # Kill the program as soon as it writes more than OUTPUT_LIMIT, instead of
+    # letting it fill memory until the timeout
+    stdout = stdout_capture(on_output, on_limit=kill, checker=checker)
+    stderr = stderr_capture(on_output, on_limit=kill)
+    io_threads = [
+        threading.Thread(target=pump, args=(process.stdout, stdout), daemon=True),
+        threading.Thread(target=pump, args=(process.stderr, stderr), daemon=True),
+    ]
+    if process.stdin is not None:
+        io_threads.append(threading.Thread(target=feed_stdin, args=(process.stdin, stdin_data), daemon=True))
+    for thread in io_threads:
+        thread.start()
+
+    timed_out = False
+    if limits.HAS_RLIMITS:
+        # Reaped with wait4 for its rusage: exact peak RSS and CPU time
+        state = {'timed_out': False}
 
+        def on_timeout():
+            state['timed_out'] = True
+            kill()
+
+        timer = threading.Timer(timeout, on_timeout)
+        timer.start()
+        try:
+            usage['peak'], cpu_time = process.reap()
+        finally:
+            timer.cancel()
+        timed_out = state['timed_out']
+        extra['cpu_time'] = round(cpu_time, 3)
+    else:
+        monitor_thread = threading.Thread(target=monitor_memory, args=(process, usage))
+        monitor_thread.start()
+        try:
+            process.wait(timeout=timeout)
         except subprocess.TimeoutExpired:
-            process.kill()
-            return "", "Execution Timed Out", False, timeout, peak_memory_kb, {}
-        except Exception as e:
-            return "", f"Execution Error: {str(e)}", False, 0, 0, {}
+            kill()
+            process.wait()
+            timed_out = True
+        monitor_thread.join(timeout=1)
+    # Pipes stay open only if the program left children behind, don't wait for those
+    for thread in io_threads:
+        thread.join(timeout=1)
 
+    duration = time.perf_counter() - start_time
+    stdout.close()  # Checking may still be catching up, not counted in the duration
+    metrics.OUTPUT_BYTES.inc(stdout.total, language=language, stream='stdout')
+    metrics.OUTPUT_BYTES.inc(stderr.total, language=language, stream='stderr')
+    if timed_out:
+        return "", "", None, timeout, usage['peak']
+    if stdout.limit_exceeded or stderr.limit_exceeded:
+        extra['output_limit_exceeded'] = True
+    return stdout.text(), stderr.text(), process.returncode, duration, usage['peak']
@@ -1,17 +1,39 @@
+import asyncio
+import hashlib
 import json
+import math
+import queue
+import re
+import uuid
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import ensure_csrf_cookie
 from .models import Snippet
-from .utils import execute_code
+from .utils import get_language_config, result_to_dict
+from .jobs import QueueFull, job_queue
+from .batch import max_cases
+from . import checker as checkers
+from . import inputs, metrics, projects
+from .backends import get_backend
+from .artifacts import artifact_store
+from .inputs import InputTooLarge, input_store
+from .scheduler import RateLimited, client_keys, scheduler
 
 from django.conf import settings
 
-@ensure_csrf_cookie
-def index(request):
-    # Get available languages from compiler settings
-    compiler_paths = getattr(settings, 'COMPILER_PATHS', {})
+# Seconds the share page reuses the editor context, whose languages come from the backend
+EDITOR_CONTEXT_TTL = 10
+
+def _editor_context():
+    """Template context of the editor page, without any snippet."""
+    # Configured languages whose compilers/runtimes were found at startup
+    languages = get_backend().available_languages()
     
     # Get snippets from settings or use defaults
     snippets = getattr(settings, 'CODE_SNIPPETS', {})
@@ -23,10 +45,7 @@ def index(request):
     
     # Format the languages for the dropdown
     formatted_languages = []
-    for lang, compiler_path in compiler_paths.items():
-        # Exclude internal keys like "java_run"
-        if lang == "java_run":
-            continue
+    for lang in languages:
         # Special display names
         if lang == "cpp":
             display_name = "C++"
@@ -44,15 +63,143 @@ def index(request):
     if not formatted_languages:
         formatted_languages = [{'value': 'python', 'display': 'Python'}]
     
-    return render(request, 'editor/index.html', {
+    return {
         'available_languages': formatted_languages,
         'initial_snippets': json.dumps(snippets),
         'site_branding': site_branding,
         'admin_name': admin_name,
         'admin_email': admin_email
-    })
+    }
+
+def _cached_editor_context():
+    """(_editor_context(), its fingerprint), computed at most once per EDITOR_CONTEXT_TTL."""
+    cached = cache.get('editor-context')
+    if cached is None:
+        context = _editor_context()
+        fingerprint = hashlib.sha256(json.dumps(context, sort_keys=True).encode('utf-8')).hexdigest()
+        cached = (context, fingerprint)
+        cache.set('editor-context', cached, EDITOR_CONTEXT_TTL)
+    return cached
+
+@ensure_csrf_cookie
+def index(request):
+    # The session runs from this browser are charged to (see _client)
+    request.session.setdefault('started', timezone.now().isoformat())
+    return render(request, 'editor/index.html', _editor_context())
+
+
+
+def _run_data(request):
+    """
+    Fields of a run request: its JSON body or, for a multipart form, the form
+    fields, with an "input" file streamed into the input store and replaced by
+    its "input_hash" (see inputs.py). Parsed once per request.
+    Raises InputTooLarge when the uploaded input is over INPUT_MAX_BYTES.
+    """
+    if not hasattr(request, '_run_data'):
+        if request.content_type == 'multipart/form-data':
+            data = request.POST.dict()
+            upload = request.FILES.get('input')
+            if upload is not None:
+                data['input_hash'] = input_store.put(upload.chunks()).digest
+        else:
+            data = json.loads(request.body)
+        request._run_data = data
+    return request._run_data
+
+def _flag(value):
+    """A boolean field, which multipart forms send as text."""
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'on', 'yes')
+    return bool(value)
+
+def _input_too_large(e):
+    return JsonResponse({'error': str(e)}, status=413)
+
+def _parse_run_request(request):
+    """
+    Reads and validates a run request. The program is the "code" string, or
+    the "files" of a project; its input is the "input" string, or the stored
+    input named by "input_hash".
+    Returns (code, language, input_data, None), or (None, None, None, error_response).
+    """
+    try:
+        data = _run_data(request)
+    except InputTooLarge as e:
+        return None, None, None, _input_too_large(e)
+    code = data.get('code', '')
+    language = data.get('language', 'python')
+    input_data = data.get('input', '')
+    if data.get('input_hash'):
+        input_data = input_store.get(data['input_hash'])
+        if input_data is None:
+            return None, None, None, JsonResponse(
+                {'error': 'Unknown input_hash, upload the input to /inputs/ first.'}, status=404)
+
+    # Validate language
+    compiler_paths = getattr(settings, 'COMPILER_PATHS', {})
+    if language not in compiler_paths:
+        return None, None, None, JsonResponse({'error': f'Language "{language}" is not supported or disabled.'}, status=400)
+
+    # A multi-file project replaces the single source (see projects.py)
+    if 'files' in data:
+        config = get_language_config(language, "")
+        error = projects.validate(data['files'], language, config[0] if config else None)
+        if error:
+            return None, None, None, JsonResponse({'error': error}, status=400)
+        code = data['files']
+
+    if not code:
+        return None, None, None, JsonResponse({'error': 'No code provided'}, status=400)
+
+    return code, language, input_data, None
+
+def _parse_run_options(request):
+    """
+    Reads the optional run fields: "expected", "checker" and "tolerance" (a
+    checker, see checker.py), "no_cache" (skip the result cache), "timings"
+    (add a per-phase timing breakdown to the result) and "profile" (run under a
+    profiler and add the hottest functions, see profiler.py).
+    Returns (execute_code keyword arguments, None), or (None, error_response).
+    """
+    data = _run_data(request)
+    try:
+        checker = checkers.from_request(data, data.get('expected'))
+    except ValueError as e:
+        return None, JsonResponse({'error': str(e)}, status=400)
+    return {
+        'checker': checker,
+        'use_cache': not _flag(data.get('no_cache', False)),
+        'timings': _flag(data.get('timings', False)),
+        'profile': _flag(data.get('profile', False)),
+    }, None
+
+def _client(request):
+    """
+    Scheduler keys a run is charged to: the session the editor page started,
+    if the request comes with one, and the IP address. Runs without a session
+    (scripts that don't keep cookies) are charged to the IP alone instead of
+    getting a new session each time.
+    """
+    session_key = request.session.session_key
+    if session_key is not None and not request.session.exists(session_key):
+        session_key = None  # Expired, or made up
+    return client_keys(session_key, request.META.get('REMOTE_ADDR'))
 
+def _rate_limited(e):
+    response = JsonResponse({'error': f'Too many runs, please wait {math.ceil(e.retry_after)}s.'}, status=429)
+    response['Retry-After'] = str(math.ceil(e.retry_after))
+    return response
 
+def _job_status(job):
+    status = {
+        'id': job.id,
+        'status': job.status,
+        'position': job_queue.position(job),
+    }
+    if job.result is not None:
+        status['result'] = job.result
+    return status
 
 @require_http_methods(["POST"])
 def run_code(request):
@@ -61,42 +208,297 @@ def run_code(request):
     ...
     """
     try:
-        data = json.loads(request.body)
-        code = data.get('code', '')
-        language = data.get('language', 'python')
-        input_data = data.get('input', '')
+        code, language, input_data, error_response = _parse_run_request(request)
+        if error_response:
+            return error_response
 
-        # Validate language
-        compiler_paths = getattr(settings, 'COMPILER_PATHS', {})
-        if language not in compiler_paths:
-             return JsonResponse({'error': f'Language "{language}" is not supported or disabled.'}, status=400)
+        options, error_response = _parse_run_options(request)
+        if error_response:
+            return error_response
 
-        if not code:
-            return JsonResponse({'error': 'No code provided'}, status=400)
+        # Same queue as /jobs/, this request just waits for its turn and the result
+        try:
+            job = job_queue.submit(code, language, input_data, client=_client(request), **options)
+        except QueueFull:
+            return JsonResponse({'error': 'Server is busy, please try again shortly.'}, status=429)
+        except RateLimited as e:
+            return _rate_limited(e)
+        job.wait()
+        return JsonResponse(job.result, status=500 if job.status == 'failed' else 200)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
 
-        stdout, stderr, success, duration, memory, files = execute_code(code, language, input_data)
-        
-        return JsonResponse({
-            'stdout': stdout,
-            'stderr': stderr,
-            'success': success,
-            'duration': duration,
-            'memory': memory,
-            'files': files
-        })
+@require_http_methods(["POST"])
+def run_batch(request):
+    """
+    Run one program against many inputs: {"code", "language", "cases": [{"input", "expected"}]}.
+    A case may name a stored input with "input_hash" instead of "input".
+    Compiles once and returns a verdict, time and memory per case (see batch.py).
+    """
+    try:
+        code, language, _, error_response = _parse_run_request(request)
+        if error_response:
+            return error_response
+
+        data = _run_data(request)
+        checker_options = {key: data[key] for key in ('checker', 'tolerance') if key in data}
+        try:
+            checkers.from_request(checker_options, "")
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        cases = data.get('cases')
+        if not isinstance(cases, list) or not cases:
+            return JsonResponse({'error': 'No test cases provided'}, status=400)
+        if len(cases) > max_cases():
+            return JsonResponse({'error': f'Too many test cases (maximum {max_cases()}).'}, status=400)
+        for case in cases:
+            if not isinstance(case, dict) or not isinstance(case.get('input', ''), str) \
+                    or not isinstance(case.get('expected', ''), str):
+                return JsonResponse({'error': 'Each case must be {"input": str, "expected": str (optional)}'}, status=400)
+            if case.get('input_hash') and input_store.get(case['input_hash']) is None:
+                return JsonResponse({'error': f'Unknown input_hash {case["input_hash"]}, upload it to /inputs/ first.'}, status=404)
+
+        try:
+            job = job_queue.submit_batch(code, language, cases, checker_options, client=_client(request))
+        except QueueFull:
+            return JsonResponse({'error': 'Server is busy, please try again shortly.'}, status=429)
+        except RateLimited as e:
+            return _rate_limited(e)
+        job.wait()
+        return JsonResponse(job.result, status=500 if job.status == 'failed' else 200)
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON'}, status=400)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @require_http_methods(["POST"])
-def save_snippet(request):
+def run_code_stream(request):
+    """
+    Same as run_code, but answers with a text/event-stream: a "queued" event,
+    then "stdout"/"stderr" events as the program prints, then a "result" event
+    with the usual /run/ payload.
+    """
     try:
-        # Rate limit check (Session based)
-        share_count = request.session.get('share_count', 0)
-        if share_count >= 3:
-            return JsonResponse({'error': 'Share limit reached (Maximum 3 shares per session).'}, status=403)
+        code, language, input_data, error_response = _parse_run_request(request)
+        if error_response:
+            return error_response
 
+        options, error_response = _parse_run_options(request)
+        if error_response:
+            return error_response
+
+        events = queue.Queue()
+        try:
+            job = job_queue.submit(code, language, input_data,
+                                   on_output=lambda stream, text: events.put((stream, text)),
+                                   client=_client(request), **options)
+        except QueueFull:
+            return JsonResponse({'error': 'Server is busy, please try again shortly.'}, status=429)
+        except RateLimited as e:
+            return _rate_limited(e)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+    def event_stream():
+        yield _sse('queued', {'id': job.id, 'position': job_queue.position(job)})
+        while True:
+            try:
+                stream, text = events.get(timeout=0.1)
+            except queue.Empty:
+                # Output is queued before the job is marked done, so nothing is lost here
+                if job.wait(0) and events.empty():
+                    break
+                continue
+            yield _sse(stream, {'text': text})
+        yield _sse('result', job.result)
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Keep nginx from buffering the events
+    return response
+
+@require_http_methods(["POST"])
+async def run_code_async(request):
+    """
+    Same as run_code, but waits on the program on the event loop instead of
+    holding a worker thread. Serve the app through webide/asgi.py to benefit.
+    Rate limits and concurrency caps are the same as for the queue; a run over
+    a cap waits on the event loop (in no particular order) for a slot.
+    """
+    try:
+        # Parsing may hash and store an uploaded input (see inputs.py), off the event loop
+        code, language, input_data, error_response = await asyncio.to_thread(_parse_run_request, request)
+        if error_response:
+            return error_response
+
+        options, error_response = _parse_run_options(request)
+        if error_response:
+            return error_response
+
+        client = await sync_to_async(_client)(request)
+        run_id = uuid.uuid4().hex
+        await asyncio.to_thread(scheduler.admit, client)
+        await scheduler.acquire_async(run_id, client)
+        try:
+            result = await get_backend().execute_async(code, language, input_data, **options)
+        finally:
+            await asyncio.to_thread(scheduler.release, run_id)
+        return JsonResponse(result_to_dict(result))
+    except RateLimited as e:
+        return _rate_limited(e)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@require_http_methods(["POST"])
+def submit_job(request):
+    """
+    Queue a run and return immediately with its id and queue position.
+    Poll job_status for the result.
+    """
+    try:
+        code, language, input_data, error_response = _parse_run_request(request)
+        if error_response:
+            return error_response
+
+        options, error_response = _parse_run_options(request)
+        if error_response:
+            return error_response
+
+        try:
+            job = job_queue.submit(code, language, input_data, client=_client(request), **options)
+        except QueueFull:
+            return JsonResponse({'error': 'Server is busy, please try again shortly.'}, status=429)
+        except RateLimited as e:
+            return _rate_limited(e)
+        return JsonResponse(_job_status(job), status=202)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@require_http_methods(["GET"])
+def job_status(request, job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return JsonResponse({'error': 'Unknown or expired job'}, status=404)
+    return JsonResponse(_job_status(job))
+
+@require_http_methods(["POST"])
+def upload_input(request):
+    """
+    Store a program input, sent as the raw request body or as the "input"
+    file of a multipart form, and return its "input_hash" for runs (see
+    inputs.py). The body is streamed to disk, never read into memory whole.
+    """
+    try:
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        content_length = 0
+    if content_length > inputs.max_bytes():
+        return _input_too_large(InputTooLarge(f"Input is larger than {inputs.max_bytes()} bytes"))
+    try:
+        if request.content_type == 'multipart/form-data':
+            upload = request.FILES.get('input')
+            if upload is None:
+                return JsonResponse({'error': 'No "input" file provided'}, status=400)
+            stored = input_store.put(upload.chunks())
+        else:
+            stored = input_store.put(iter(lambda: request.read(inputs.CHUNK_SIZE), b''))
+    except InputTooLarge as e:
+        return _input_too_large(e)
+    return JsonResponse({'input_hash': stored.digest, 'size': stored.size}, status=201)
+
+@require_http_methods(["GET", "HEAD"])
+def input_status(request, input_hash):
+    """Whether an input is stored, so clients can skip uploading it again."""
+    stored = input_store.get(input_hash)
+    if stored is None:
+        return JsonResponse({'error': 'Unknown or expired input'}, status=404)
+    return JsonResponse({'input_hash': stored.digest, 'size': stored.size})
+
+def _byte_range(header, size):
+    """
+    Parses a single-range "Range: bytes=..." header into inclusive (start, end).
+    Returns None to send the whole file instead, or False if it can't be satisfied.
+    """
+    match = re.fullmatch(r'bytes=(\d*)-(\d*)', header.strip())
+    if not match or match.groups() == ('', ''):
+        return None  # Absent, malformed or multiple ranges
+    start, end = match.groups()
+    if start == '':
+        start, end = max(size - int(end), 0), size - 1  # Suffix: the last N bytes
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+@require_http_methods(["GET"])
+def download_file(request, run_id, name):
+    """
+    Serves a file a run created (see artifacts.py). Supports single byte ranges;
+    ?download=1 asks the browser to save it rather than show it.
+    """
+    stored = artifact_store.open(run_id, name)
+    if stored is None:
+        return JsonResponse({'error': 'Unknown or expired file'}, status=404)
+    f, entry = stored
+    content_type = 'application/octet-stream' if entry['binary'] else 'text/plain; charset=utf-8'
+    as_attachment = entry['binary'] or request.GET.get('download') == '1'
+
+    byte_range = _byte_range(request.headers.get('Range', ''), entry['stored'])
+    if byte_range is False:
+        f.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f"bytes */{entry['stored']}"
+        return response
+    if byte_range is None:
+        response = FileResponse(f, content_type=content_type, as_attachment=as_attachment, filename=name)
+    else:
+        start, end = byte_range
+        with f:
+            f.seek(start)
+            response = HttpResponse(f.read(end - start + 1), status=206, content_type=content_type)
+        response['Content-Range'] = f"bytes {start}-{end}/{entry['stored']}"
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = f'"{entry["sha256"]}"'
+    return response
+
+@require_http_methods(["GET"])
+def health(request):
+    """
+    Health of the execution backend (toolchain probe results per configured
+    language, see toolchains.py, or the runners, see backends.py) and the run
+    queue. 503 when no language can run at all.
+    """
+    health = get_backend().health()
+    if health is None:
+        return JsonResponse({'status': 'starting', 'queue': job_queue.stats()}, status=503)
+    return JsonResponse(
+        {**health, 'queue': job_queue.stats()},
+        status=503 if health['status'] == 'down' else 200
+    )
+
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """Run metrics of this server process in the Prometheus text format (see metrics.py)."""
+    if not getattr(settings, 'METRICS_ENABLED', True):
+        return JsonResponse({'error': 'Metrics are disabled'}, status=404)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@require_http_methods(["POST"])
+def save_snippet(request):
+    try:
         data = json.loads(request.body)
         code = data.get('code', '')
         language = data.get('language', 'python')
@@ -104,7 +506,20 @@ def save_snippet(request):
         if not code:
             return JsonResponse({'error': 'No code provided'}, status=400)
 
-        snippet = Snippet.objects.create(code=code, language=language)
+        # Sharing the same code again gives the same link (and doesn't count
+        # against the limit); its retention period starts over
+        content_hash = Snippet.hash_content(code, language)
+        existing = Snippet.objects.filter(content_hash=content_hash).only('id').first()
+        if existing is not None:
+            Snippet.objects.filter(pk=existing.pk).update(created_at=timezone.now())
+            return JsonResponse({'id': str(existing.id)})
+
+        # Rate limit check (Session based)
+        share_count = request.session.get('share_count', 0)
+        if share_count >= 3:
+            return JsonResponse({'error': 'Share limit reached (Maximum 3 shares per session).'}, status=403)
+
+        snippet = Snippet.objects.create(code=code, language=language, content_hash=content_hash)
         
         # Increment count
         request.session['share_count'] = share_count + 1
@@ -114,10 +529,41 @@ def save_snippet(request):
         return JsonResponse({'error': str(e)}, status=500)
 
 @require_http_methods(["GET"])
+@ensure_csrf_cookie
 def get_snippet(request, snippet_id):
-    snippet = get_object_or_404(Snippet, id=snippet_id)
-    # Render the IDE directly with the snippet data
-    return render(request, 'editor/index.html', {
-        'initial_code': snippet.code,
-        'initial_language': snippet.language
-    })
+    """
+    The editor with a shared snippet loaded. A snippet's code never changes,
+    so the page only depends on the snippet's version (created_at, bumped when
+    it is shared again) and the editor context, which is cached for
+    EDITOR_CONTEXT_TTL seconds as its languages come from the execution
+    backend. The ETag is computed from those with a primary key lookup of
+    created_at alone: repeat visits get 304, deleted snippets 404, and
+    rendered pages are cached per snippet (SNIPPET_PAGE_CACHE_TTL) so a
+    popular link is read and rendered once. A
+    cached page is only used while its ETag is current, so the cache doesn't
+    need to be shared by the server processes or invalidated on deletion.
+    """
+    created_at = get_object_or_404(Snippet.objects.values_list('created_at', flat=True), id=snippet_id)
+    context, fingerprint = _cached_editor_context()
+    version = f"{snippet_id}\0{created_at.isoformat()}\0{fingerprint}"
+    etag = '"%s"' % hashlib.sha256(version.encode('utf-8')).hexdigest()[:32]
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        cached = cache.get(Snippet.page_cache_key(snippet_id))
+        if cached is not None and cached[0] == etag:
+            html = cached[1]
+        else:
+            snippet = get_object_or_404(Snippet, id=snippet_id)
+            # Rendered without the request: the page is shared by all visitors and
+            # must not embed anyone's CSRF token (the editor reads the cookie instead)
+            html = render_to_string('editor/index.html', {
+                **context,
+                'initial_code': snippet.code,
+                'initial_language': snippet.language
+            })
+            cache.set(Snippet.page_cache_key(snippet_id), (etag, html),
+                      getattr(settings, 'SNIPPET_PAGE_CACHE_TTL', 3600))
+        response = HttpResponse(html)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'  # Revalidate, a 304 is cheap
+    return response
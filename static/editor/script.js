@@ -221,6 +221,61 @@ document.addEventListener('DOMContentLoaded', () => {
         return cookieValue;
     }
 
+    // Reads a text/event-stream response, calling onEvent(event, data) per event
+    async function readEvents(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        for (;;) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const block = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let event = 'message';
+                let data = '';
+                for (const line of block.split('\n')) {
+                    if (line.startsWith('event: ')) event = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                }
+                onEvent(event, JSON.parse(data));
+            }
+        }
+    }
+
+    // Text shown for the files a run created; text files are fetched from the
+    // download endpoint, only their first part (like stdout)
+    const FILE_PREVIEW_BYTES = 50000;
+
+    async function describeFiles(files, omitted) {
+        let text = '';
+        for (const file of files) {
+            if (file.binary) {
+                text += `\n=== ${file.name} (binary, ${file.size} bytes) ===\n${file.url}\n`;
+                continue;
+            }
+            let content;
+            try {
+                const response = await fetch(file.url, {
+                    headers: { 'Range': `bytes=0-${FILE_PREVIEW_BYTES - 1}` }
+                });
+                content = response.ok ? await response.text() : `[Unavailable: HTTP ${response.status}]`;
+            } catch (error) {
+                content = `[Unavailable: ${error.message}]`;
+            }
+            if (file.size > FILE_PREVIEW_BYTES || file.truncated) {
+                content += `\n... [File Truncated, ${file.size} bytes: ${file.url}]`;
+            }
+            text += `\n=== ${file.name} ===\n${content}\n`;
+        }
+        if (omitted) {
+            text += `\n... ${omitted} more file(s) not kept\n`;
+        }
+        return text;
+    }
+
     // Run Code
     runBtn.addEventListener('click', async () => {
         outputArea.textContent = 'Running...';
@@ -232,7 +287,7 @@ document.addEventListener('DOMContentLoaded', () => {
         const input = inputArea.value;
 
         try {
-            const response = await fetch('/run/', {
+            const response = await fetch('/run/stream/', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -241,7 +296,28 @@ document.addEventListener('DOMContentLoaded', () => {
                 body: JSON.stringify({ code, language, input })
             });
 
-            const data = await response.json();
+            let data;
+            if (response.ok && response.body) {
+                // Show output live as the program prints, the last event carries the result
+                let liveOutput = '';
+                outputArea.style.color = '#cccccc';
+                await readEvents(response, (event, payload) => {
+                    if (event === 'queued' && payload.position > 0) {
+                        outputArea.textContent = `Queued (position ${payload.position})...`;
+                    } else if (event === 'stdout' || event === 'stderr') {
+                        liveOutput += payload.text;
+                        outputArea.textContent = liveOutput;
+                    } else if (event === 'result') {
+                        data = payload;
+                    }
+                });
+                if (!data) {
+                    throw new Error('Connection closed before the run finished');
+                }
+            } else {
+                // Validation errors and 429 come back as plain JSON
+                data = await response.json();
+            }
 
             if (data.error) {
                 outputArea.textContent = `Error: ${data.error}`;
@@ -259,11 +335,8 @@ document.addEventListener('DOMContentLoaded', () => {
                 }
 
                 // Append created files if any
-                if (data.files && Object.keys(data.files).length > 0) {
-                    outputText += '\n\n';
-                    for (const [filename, content] of Object.entries(data.files)) {
-                        outputText += `\n=== ${filename} ===\n${content}\n`;
-                    }
+                if (data.files && data.files.length > 0) {
+                    outputText += '\n\n' + await describeFiles(data.files, data.files_omitted);
                 }
 
                 outputArea.textContent = outputText;
@@ -278,6 +351,15 @@ document.addEventListener('DOMContentLoaded', () => {
                     runMemory.textContent = data.memory + 'KB';
                     statsDisplay.style.display = 'inline';
                 }
+
+                // CPU time is only measured on some platforms
+                const cpuItem = document.getElementById('run-cpu-item');
+                if (data.cpu_time !== undefined) {
+                    document.getElementById('run-cpu').textContent = data.cpu_time + 's CPU';
+                    cpuItem.style.display = 'inline';
+                } else {
+                    cpuItem.style.display = 'none';
+                }
             }
         } catch (error) {
             outputArea.textContent = `Network Error: ${error.message}`;
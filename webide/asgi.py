@@ -3,6 +3,9 @@ ASGI config for webide project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server (e.g. ``uvicorn webide.asgi:application``) so the
+async /run/async/ endpoint can keep many runs in flight in a single process.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -0,0 +1 @@
+COMPILER_PATHS = {"python": "python3", "c": "gcc", "cpp": "g++", "javascript": "node", "go": "go", "asm": "gcc"}
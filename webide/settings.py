@@ -34,12 +34,157 @@ INSTALLED_APPS = [
 #     # "python": "python"  <-- This would disable Python
 # }
 
+# Compilers are probed at startup (in parallel, results cached in this file,
+# default: compilation_cache/toolchains.json). Languages whose binaries are
+# missing are left out of the editor; see /health/.
+TOOLCHAIN_CACHE_FILE = None
+
+# Extra compiler flags per language, e.g. {"cpp": ["-O2", "-std=c++17"]}.
+# Flags (and the compiler version) are part of the compile cache key.
+COMPILER_FLAGS = {}
+
+# Headers to precompile per language (per compiler version and flag set).
+# Built in the background on first use, or up front with `compile_cache warm`.
+PRECOMPILED_HEADERS = {
+    "cpp": ["bits/stdc++.h"],
+}
+
+# Pre-started interpreters per language ("python", "pypy", "javascript") that
+# skip the interpreter cold start. Each one runs a single submission and is then
+# replaced. 0 or missing disables the pool for that language.
+INTERPRETER_POOL_SIZE = {}
+
+# Long-lived JVMs that run Java/Kotlin submissions in fresh class loaders,
+# avoiding JVM startup per run. 0 disables them. A JVM is replaced after a
+# timeout, System.exit(), leftover threads, or JVM_WORKER_MAX_RUNS runs.
+JVM_WORKERS = 0
+JVM_WORKER_MAX_RUNS = 100
+JVM_WORKER_OPTIONS = []  # Extra `java` options, e.g. ["-Xss64m", "-XX:+UseSerialGC"]
+
 # APP CONFIGURATION
 # -----------------
 SITE_BRANDING = "Codeon"  # App name displayed in header
 
 # EXECUTION SETTINGS
 EXECUTION_TIMEOUT = 5  # Seconds to wait before killing a process
+OUTPUT_LIMIT = 1024 * 1024  # Bytes of stdout/stderr a program may write before it is killed
+DATA_UPLOAD_MAX_MEMORY_SIZE = 16 * 1024 * 1024  # Largest request body, room for big expected outputs
+# Resource limits for programs, applied with setrlimit (ignored on Windows). None disables one.
+EXECUTION_LIMITS = {
+    'memory_mb': 512,  # Address space; not applied to Java, Kotlin, Go, JavaScript and Dart
+    'cpu_seconds': None,  # None = EXECUTION_TIMEOUT rounded up
+    'file_size_mb': 16,  # Largest file a program may write
+    'processes': None,  # Counts all processes/threads of the server's user, only set it if programs run as their own user
+}
+
+# Runs use reusable work directories under SANDBOX_ROOT (None = the system temp
+# dir). A RAM-backed location such as "/dev/shm" avoids disk I/O; cached binaries
+# are hard-linked in when it shares a filesystem with the compilation cache.
+SANDBOX_ROOT = None
+SANDBOX_POOL_SIZE = 8  # Idle work directories kept per server process
+
+# Files created by a run are kept for ARTIFACT_TTL seconds under ARTIFACT_ROOT
+# (None = next to the work directories) and served from /files/<run>/<name>;
+# responses only list them.
+ARTIFACT_ROOT = None
+ARTIFACT_TTL = 300
+ARTIFACT_LIMITS = {
+    'max_files': 20,  # Files kept per run
+    'max_file_bytes': 1024 * 1024,  # Bytes kept per file
+    'max_total_bytes': 4 * 1024 * 1024,  # Bytes kept per run
+}
+
+# UPLOADED INPUTS
+# Big program inputs can be uploaded once (POST /inputs/, or an "input" file
+# in a multipart /run/ request) and referred to by "input_hash"; programs read
+# the stored file directly as their stdin.
+INPUT_ROOT = None  # None = inputs/ in the compilation cache directory; readable by the server's user only
+INPUT_MAX_BYTES = 64 * 1024 * 1024
+INPUT_TTL = 3600  # Seconds since an input was last uploaded or used
+
+# RUN QUEUE
+# Runs are executed by a fixed pool of workers; extra submissions wait in a
+# bounded queue and get HTTP 429 once it is full.
+RUN_WORKERS = None  # None = one per CPU core
+RUN_QUEUE_SIZE = 100
+RUN_RESULT_TTL = 300  # Seconds a finished job's result stays available at /jobs/<id>/
+BATCH_WORKERS = None  # Test cases of one /run/batch/ request run in parallel; None = one per CPU core
+BATCH_MAX_CASES = 100  # Most test cases accepted in one batch
+
+# RUN LIMITS
+# Runs are charged to the session and the IP address that submitted them; the
+# session is started by the editor page, runs without one (scripts that don't
+# keep cookies) are charged to the IP alone. Each gets a token bucket ("rate"
+# runs per second, up to "burst" at once; HTTP 429 with Retry-After when
+# empty) and a cap on runs in progress ("concurrency", extra runs wait in the
+# queue, which serves sessions round-robin). None turns a limit off. The IP is
+# REMOTE_ADDR: behind a proxy, or for a classroom behind one NAT address, raise
+# the IP limits. The state is shared by all server processes through SCHEDULER_DB.
+RUN_LIMITS = {
+    'session': {'rate': 1, 'burst': 10, 'concurrency': 2},
+    'ip': {'rate': 10, 'burst': 100, 'concurrency': 4},
+}
+SCHEDULER_DB = None  # None = scheduler.sqlite3 in the compilation cache directory
+
+# EXECUTION BACKEND
+# 'local' compiles and runs in the web process. 'remote' sends runs to runner
+# daemons (`python manage.py runner unix:/run/webide/runner1.sock` or
+# `python manage.py runner 10.0.0.5:7000`), least loaded healthy runner first,
+# failing over to the next one when a runner can't be reached. Created files
+# are stored by the runners: share ARTIFACT_ROOT with them.
+EXECUTION_BACKEND = 'local'
+RUNNER_NODES = []  # e.g. ['unix:/run/webide/runner1.sock', '10.0.0.5:7000']
+RUNNER_WORKERS = None  # Runs a runner executes at once; None = one per CPU core
+RUNNER_HEALTH_INTERVAL = 5  # Seconds between health checks of the runners
+RUNNER_TIMEOUT = 120  # Seconds a runner may take to answer one run or batch
+
+# METRICS
+# Per-phase timings, cache hits and outcomes of runs, served at /metrics in the
+# Prometheus text format (per server process).
+METRICS_ENABLED = True
+
+# MULTI-FILE PROJECTS
+# Runs may send "files" ({path: source}) instead of "code". C/C++ units are
+# compiled separately, in parallel, with objects and links cached.
+PROJECT_MAX_FILES = 50
+PROJECT_COMPILE_WORKERS = None  # Units compiled at once; None = one per CPU core
+
+# PROFILING
+# Runs with "profile": true run under a profiler (cProfile, gprof, JFR) and
+# report their hottest functions.
+PROFILE_TOP = 15  # Functions reported
+
+# COMPILATION CACHE
+# Compiled binaries are reused for identical submissions. Least recently used
+# entries are evicted once either budget is exceeded.
+# Inspect or maintain it with `python manage.py compile_cache [stats|list|prune|clear|rebuild|warm]`.
+COMPILE_CACHE_MAX_BYTES = 1024 * 1024 * 1024  # 1GB
+COMPILE_CACHE_MAX_ENTRIES = 5000
+
+# SHARED SNIPPETS
+SNIPPET_RETENTION_DAYS = None  # Days since the last share; None keeps snippets. Applied by `cleanup_snippets`.
+SNIPPET_PAGE_CACHE_TTL = 3600  # Seconds a rendered share page stays in the default cache
+
+# RESULT CACHE
+# Results of deterministic runs (same code, language, input and settings) are
+# replayed instead of rerun. Code that looks like it uses time, randomness,
+# files or threads is never cached; clients can opt out with "no_cache".
+RESULT_CACHE_ENABLED = False
+RESULT_CACHE_TTL = 300  # Seconds
+RESULT_CACHE_MEMORY_BYTES = 16 * 1024 * 1024  # Per-process LRU in front of the "results" cache
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Shared by all server processes
+    'results': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'result_cache',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',